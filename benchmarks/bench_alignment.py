@@ -0,0 +1,52 @@
+"""Compare the alignment strategies of mt eval on synthetic lines with many NEs, e.g. joined paragraphs.
+
+Reports lines/sec of each strategy and the fraction of the alignments of "all" (the optimal alignment of all NEs)
+which it reproduces.
+
+Run with: python benchmarks/bench_alignment.py --num_lines 200 --max_entities 300
+"""
+import logging
+import random
+import time
+
+import click
+from corpus import generate_pair
+
+from mt_named_entity.align import ALIGNMENT_STRATEGIES
+from mt_named_entity.filter import map_named_entity_types
+from mt_named_entity.ner import NERMarker
+
+log = logging.getLogger(__name__)
+
+
+@click.command()
+@click.option("--num_lines", type=int, default=200)
+@click.option("--max_entities", type=int, default=300, help="Maximum number of NEs in a line.")
+@click.option("--seed", type=int, default=1)
+def main(num_lines, max_entities, seed):
+    logging.basicConfig(level=logging.INFO)
+    rng = random.Random(seed)
+    pairs = [generate_pair(rng, max_entities=max_entities, max_filler=2) for _ in range(num_lines)]
+    en_markers = [
+        [NERMarker.from_tag(tag, pair.en_line) for tag in map_named_entity_types(pair.en_tags)] for pair in pairs
+    ]
+    is_markers = [
+        [NERMarker.from_tag(tag, pair.is_line) for tag in map_named_entity_types(pair.is_tags)] for pair in pairs
+    ]
+    log.info(f"{sum(map(len, en_markers))} EN and {sum(map(len, is_markers))} IS NEs")
+    results = {}
+    for name, align_markers in ALIGNMENT_STRATEGIES.items():
+        start_time = time.perf_counter()
+        results[name] = [align_markers(en, is_) for en, is_ in zip(en_markers, is_markers)]
+        seconds = time.perf_counter() - start_time
+        log.info(f"{name}: {num_lines / seconds:.1f} lines/s")
+    reference = [{(a.marker_1, a.marker_2) for a in line} for line in results["all"]]
+    total = sum(len(line) for line in reference)
+    for name, alignments in results.items():
+        found = sum(len(ref & {(a.marker_1, a.marker_2) for a in line}) for ref, line in zip(reference, alignments))
+        distance = sum(a.distance for line in alignments for a in line)
+        log.info(f"{name}: reproduces {found / total:.1%} of the alignments of all, total distance {distance:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compare the fp32 NER models against --cpu_optimized (int8 quantized) ones on CPU.
+
+Reports sentences/sec and peak RSS of each, and how many of the fp32 NEs the quantized model reproduces
+on tests/data/example.{lang}. Each model is loaded in its own process so that RSS is comparable.
+
+Run with: python benchmarks/bench_cpu_optimized.py --lang is --repeat 50
+"""
+import logging
+import multiprocessing
+import resource
+import time
+from typing import Dict, List
+
+import click
+
+from mt_named_entity.ner import load_ner_model
+
+log = logging.getLogger(__name__)
+
+
+def tag_example(lang: str, batch_size: int, repeat: int, cpu_optimized: bool, results: multiprocessing.Queue):
+    with open(f"tests/data/example.{lang}") as f:
+        lines = [line.strip() for line in f]
+    model = load_ner_model(lang, "cpu", batch_size, cpu_optimized=cpu_optimized)
+    ner_tags = model(lines)
+    start_time = time.perf_counter()
+    model(lines * repeat)
+    seconds = time.perf_counter() - start_time
+    results.put(
+        {
+            "ner_tags": [[str(tag) for tag in line_tags] for line_tags in ner_tags],
+            "sentences_per_sec": len(lines) * repeat / seconds,
+            # ru_maxrss is in kilobytes on Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+    )
+
+
+def run_in_process(*args) -> Dict:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=tag_example, args=(*args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def agreement(reference: List[List[str]], other: List[List[str]]) -> float:
+    """The fraction of reference NEs which are also found in other."""
+    total = sum(len(line_tags) for line_tags in reference)
+    found = sum(len(set(ref_tags) & set(other_tags)) for ref_tags, other_tags in zip(reference, other))
+    return found / total if total else 1.0
+
+
+@click.command()
+@click.option("--lang", type=click.Choice(["en", "is"]), default="is")
+@click.option("--batch_size", type=int, default=64)
+@click.option("--repeat", type=int, default=50, help="How often the example is repeated when timing.")
+def main(lang, batch_size, repeat):
+    logging.basicConfig(level=logging.INFO)
+    fp32 = run_in_process(lang, batch_size, repeat, False)
+    int8 = run_in_process(lang, batch_size, repeat, True)
+    for name, result in (("fp32", fp32), ("int8", int8)):
+        log.info(f"{name}: {result['sentences_per_sec']:.1f} sentences/s, peak RSS {result['peak_rss_mb']:.0f} MB")
+    log.info(f"int8 reproduces {agreement(fp32['ner_tags'], int8['ner_tags']):.1%} of the fp32 NEs")
+    for fp32_tags, int8_tags in zip(fp32["ner_tags"], int8["ner_tags"]):
+        if fp32_tags != int8_tags:
+            log.info(f"fp32: {' '.join(fp32_tags)} int8: {' '.join(int8_tags)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark filter_same_number_of_entity_types against its batched variant.
+The batched variant is timed from NERTags, including the conversion with to_columnar.
+
+Run with: python benchmarks/bench_filter.py --num_lines 10000000
+"""
+import logging
+import time
+
+import click
+import numpy as np
+
+from mt_named_entity.filter import (
+    ALL_TAGS,
+    filter_same_number_of_entity_types,
+    filter_same_number_of_entity_types_batch,
+    to_columnar,
+)
+from mt_named_entity.ner import NERTag
+
+log = logging.getLogger(__name__)
+
+
+def random_columnar(rng: np.random.Generator, num_lines: int, max_tags_per_line: int):
+    """Return random columnar tag ids and line offsets."""
+    counts = rng.integers(0, max_tags_per_line + 1, size=num_lines)
+    offsets = np.zeros(num_lines + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    # We only draw P, L, O and M so that some lines survive the filtering.
+    tag_ids = rng.integers(0, 4, size=offsets[-1]).astype(np.int8)
+    return tag_ids, offsets
+
+
+def to_ner_tags(tag_ids: np.ndarray, offsets: np.ndarray):
+    """Convert columnar tag ids back to NERTags for the per-line implementation."""
+    return [
+        [NERTag(ALL_TAGS[tag_id], 0, 1) for tag_id in tag_ids[offsets[idx] : offsets[idx + 1]]]
+        for idx in range(len(offsets) - 1)
+    ]
+
+
+@click.command()
+@click.option("--num_lines", type=int, default=10_000_000)
+@click.option("--batch_size", type=int, default=1_000_000, help="Number of lines in each call to the batched variant.")
+@click.option("--scalar_lines", type=int, default=1_000_000, help="Number of lines to time the per-line variant on.")
+@click.option("--max_tags_per_line", type=int, default=4)
+@click.option("--seed", type=int, default=1)
+def main(num_lines, batch_size, scalar_lines, max_tags_per_line, seed):
+    logging.basicConfig(level=logging.INFO)
+    rng = np.random.default_rng(seed)
+
+    vectorized_time = 0.0
+    surviving = 0
+    for start in range(0, num_lines, batch_size):
+        size = min(batch_size, num_lines - start)
+        src_tags = to_ner_tags(*random_columnar(rng, size, max_tags_per_line))
+        tgt_tags = to_ner_tags(*random_columnar(rng, size, max_tags_per_line))
+        start_time = time.perf_counter()
+        src_mask, _ = filter_same_number_of_entity_types_batch(*to_columnar(src_tags), *to_columnar(tgt_tags))
+        vectorized_time += time.perf_counter() - start_time
+        surviving += int(src_mask.sum())
+    log.info(f"Batched: {num_lines} lines in {vectorized_time:.2f}s, {vectorized_time / num_lines * 1e9:.1f} ns/line")
+    log.info(f"Batched: {surviving} src NEs survived")
+
+    scalar_lines = min(scalar_lines, num_lines)
+    src_tags = to_ner_tags(*random_columnar(rng, scalar_lines, max_tags_per_line))
+    tgt_tags = to_ner_tags(*random_columnar(rng, scalar_lines, max_tags_per_line))
+    start_time = time.perf_counter()
+    for src_line, tgt_line in zip(src_tags, tgt_tags):
+        filter_same_number_of_entity_types(src_line, tgt_line)
+    scalar_time = time.perf_counter() - start_time
+    log.info(f"Per-line: {scalar_lines} lines in {scalar_time:.2f}s, {scalar_time / scalar_lines * 1e9:.1f} ns/line")
+    log.info(f"Speedup: {(scalar_time / scalar_lines) / (vectorized_time / num_lines):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""A synthetic parallel IS/EN corpus with known NEs, for benchmarking."""
+import random
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from mt_named_entity.ner import NERTag
+
+# Nominative, accusative, dative, genitive
+IS_NAMES = [
+    ("Guðrún", "Guðrúnu", "Guðrúnu", "Guðrúnar"),
+    ("Einar Jónsson", "Einar Jónsson", "Einari Jónssyni", "Einars Jónssonar"),
+    ("Anna", "Önnu", "Önnu", "Önnu"),
+    ("Pétur", "Pétur", "Pétri", "Péturs"),
+    ("Páll", "Pál", "Páli", "Páls"),
+    ("Hildur Sigurðardóttir", "Hildi Sigurðardóttur", "Hildi Sigurðardóttur", "Hildar Sigurðardóttur"),
+    ("Jón", "Jón", "Jóni", "Jóns"),
+    ("Sigríður Einarsdóttir", "Sigríði Einarsdóttur", "Sigríði Einarsdóttur", "Sigríðar Einarsdóttur"),
+]
+FOREIGN_NAMES = ["Alexei", "Joe Biden", "Johaug", "Angela Merkel"]
+PLACES = [("Reykjavík", "Reykjavík"), ("Akureyri", "Akureyri"), ("London", "London"), ("Ísafirði", "Ísafjörður")]
+ORGS = [("RÚV", "RÚV"), ("Alþingi", "Alþingi"), ("Sameinuðu þjóðirnar", "United Nations")]
+FILLER_IS = "og svo fór hann heim en hún var eftir í bænum með öllum hinum sem komu".split()
+FILLER_EN = "and then he went home but she stayed in town with all the others who came".split()
+
+
+@dataclass(frozen=True)
+class SyntheticPair:
+    """A parallel sentence pair with the NEs on both sides.
+    The IS side is also given as tokens and BIO labels, as the IceBERT NER model sees it."""
+
+    is_line: str
+    en_line: str
+    is_tokens: List[str]
+    is_labels: List[str]
+    is_tags: List[NERTag]
+    en_tags: List[NERTag]
+
+
+class _LineBuilder:
+    """Build a line from tokens, keeping track of the NE spans and BIO labels."""
+
+    def __init__(self) -> None:
+        self.line = ""
+        self.tokens: List[str] = []
+        self.labels: List[str] = []
+        self.tags: List[NERTag] = []
+
+    def add(self, text: str, tag: str = "", attach: bool = False):
+        if self.line and not attach:
+            self.line += " "
+        start_idx = len(self.line)
+        self.line += text
+        words = text.split(" ")
+        self.tokens.extend(words)
+        if tag:
+            self.labels.extend([f"B-{tag}"] + [f"I-{tag}"] * (len(words) - 1))
+            self.tags.append(NERTag(tag, start_idx, len(self.line)))
+        else:
+            self.labels.extend(["O"] * len(words))
+
+
+def _entities(rng: random.Random, num_entities: int) -> List[Tuple[str, str, str, str]]:
+    """Return (is_tag, en_tag, is_form, en_form) for random entities."""
+    entities = []
+    for _ in range(num_entities):
+        kind = rng.random()
+        if kind < 0.6:
+            forms = rng.choice(IS_NAMES)
+            entities.append(("Person", "PER", rng.choice(forms), forms[0]))
+        elif kind < 0.7:
+            name = rng.choice(FOREIGN_NAMES)
+            entities.append(("Person", "PER", name, name))
+        elif kind < 0.85:
+            is_place, en_place = rng.choice(PLACES)
+            entities.append(("Location", "LOC", is_place, en_place))
+        else:
+            is_org, en_org = rng.choice(ORGS)
+            entities.append(("Organization", "ORG", is_org, en_org))
+    return entities
+
+
+def generate_pair(rng: random.Random, max_entities: int = 4, max_filler: int = 8) -> SyntheticPair:
+    """Generate a random sentence pair. Some pairs have no NEs and some have a different number on each side."""
+    entities = _entities(rng, rng.randint(0, max_entities))
+    is_builder = _LineBuilder()
+    en_builder = _LineBuilder()
+    drop_en = rng.random() < 0.1 and len(entities) > 0
+    for idx, (is_tag, en_tag, is_form, en_form) in enumerate(entities):
+        num_filler = rng.randint(1, max_filler)
+        for word in rng.sample(FILLER_IS, num_filler):
+            is_builder.add(word)
+        for word in rng.sample(FILLER_EN, num_filler):
+            en_builder.add(word)
+        is_builder.add(is_form, is_tag)
+        if not (drop_en and idx == 0):
+            en_builder.add(en_form, en_tag)
+        if rng.random() < 0.3:
+            is_builder.add(",", attach=True)
+            en_builder.add(",", attach=True)
+    for word in rng.sample(FILLER_IS, rng.randint(1, max_filler)):
+        is_builder.add(word)
+    for word in rng.sample(FILLER_EN, rng.randint(1, max_filler)):
+        en_builder.add(word)
+    is_builder.add(".", attach=True)
+    en_builder.add(".", attach=True)
+    return SyntheticPair(
+        is_builder.line,
+        en_builder.line,
+        is_builder.tokens,
+        is_builder.labels,
+        is_builder.tags,
+        en_builder.tags,
+    )
+
+
+def generate_corpus(num_lines: int, seed: int = 1) -> List[SyntheticPair]:
+    """Generate a deterministic synthetic parallel corpus."""
+    rng = random.Random(seed)
+    return [generate_pair(rng) for _ in range(num_lines)]
@@ -0,0 +1,22 @@
+"""A fake NER model which stands in for EN_NER/IS_NER in benchmarks."""
+import time
+from typing import Dict, Iterable, List
+
+from mt_named_entity.ner import NERTag
+
+
+class FakeTagger:
+    """Return known NERTags for known lines (and none for other lines).
+    Optionally sleeps to simulate the cost of model inference."""
+
+    def __init__(self, known_tags: Dict[str, List[NERTag]], seconds_per_line: float = 0.0) -> None:
+        self.known_tags = known_tags
+        self.seconds_per_line = seconds_per_line
+        self.lines_tagged = 0
+
+    def __call__(self, batch: Iterable[str]) -> List[List[NERTag]]:
+        lines = [line.strip() for line in batch]
+        if self.seconds_per_line:
+            time.sleep(self.seconds_per_line * len(lines))
+        self.lines_tagged += len(lines)
+        return [self.known_tags.get(line, []) for line in lines]
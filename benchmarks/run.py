@@ -0,0 +1,279 @@
+"""Benchmark every pipeline stage on a synthetic parallel corpus.
+
+Each stage runs in a fresh process so that its peak RSS can be reported.
+Model-dependent stages use a fake tagger. Results are appended as a JSON line to --results,
+tagged with the current commit, so that regressions are visible per commit.
+
+Run with: python benchmarks/run.py --num_lines 100000 --results bench_output.jsonl
+"""
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import subprocess
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import click
+from click.testing import CliRunner
+from corpus import SyntheticPair, generate_corpus
+from fake_tagger import FakeTagger
+
+from mt_named_entity import cli as mt_cli
+from mt_named_entity.align import align_markers_by_jaro_winkler, align_markers_by_order
+from mt_named_entity.correct import Corrector, correct_line
+from mt_named_entity.embed import embed_ner_tags, extract_ner_tags
+from mt_named_entity.filter import filter_same_number_of_entity_types_batch, map_named_entity_types, to_columnar
+from mt_named_entity.ner import IS_NER, NERMarker, NERTag
+
+log = logging.getLogger(__name__)
+
+# A stage prepares its input (untimed) and returns the function to time.
+STAGE = Callable[[List[SyntheticPair], str], Callable[[], None]]
+STAGES: Dict[str, STAGE] = {}
+
+
+def stage(name: str):
+    def register(func: STAGE) -> STAGE:
+        STAGES[name] = func
+        return func
+
+    return register
+
+
+def write_lines(path: str, lines: List[str]):
+    with open(path, "w") as f:
+        for line in lines:
+            f.write(line + "\n")
+
+
+def tags_to_str(tags: List[NERTag]) -> str:
+    return " ".join(str(tag) for tag in tags)
+
+
+def write_corpus(corpus: List[SyntheticPair], tmp_dir: str) -> Dict[str, str]:
+    """Write the corpus and its (unnormalized and normalized) NEs to files."""
+    paths = {name: os.path.join(tmp_dir, name) for name in ("is", "en", "is.ner", "en.ner", "is.norm", "en.norm")}
+    write_lines(paths["is"], [pair.is_line for pair in corpus])
+    write_lines(paths["en"], [pair.en_line for pair in corpus])
+    write_lines(paths["is.ner"], [tags_to_str(pair.is_tags) for pair in corpus])
+    write_lines(paths["en.ner"], [tags_to_str(pair.en_tags) for pair in corpus])
+    write_lines(paths["is.norm"], [tags_to_str(map_named_entity_types(pair.is_tags)) for pair in corpus])
+    write_lines(paths["en.norm"], [tags_to_str(map_named_entity_types(pair.en_tags)) for pair in corpus])
+    return paths
+
+
+def invoke(args: List[str]):
+    """Invoke the mt cli, logging to /dev/null."""
+    result = CliRunner().invoke(mt_cli.cli, ["--log_file", os.devnull] + args, catch_exceptions=False)
+    if result.exit_code != 0:
+        raise RuntimeError(f"mt {' '.join(args)} failed: {result.output}")
+
+
+def to_markers(corpus: List[SyntheticPair]):
+    is_markers = [
+        [NERMarker.from_tag(tag, pair.is_line) for tag in map_named_entity_types(pair.is_tags)] for pair in corpus
+    ]
+    en_markers = [
+        [NERMarker.from_tag(tag, pair.en_line) for tag in map_named_entity_types(pair.en_tags)] for pair in corpus
+    ]
+    return is_markers, en_markers
+
+
+@stage("parse_ner_tags")
+def bench_parse_ner_tags(corpus, tmp_dir):
+    def run():
+        for pair in corpus:
+            IS_NER.parse_ner_tags(pair.is_line, pair.is_tokens, pair.is_labels)
+
+    return run
+
+
+@stage("join_ner_tags")
+def bench_join_ner_tags(corpus, tmp_dir):
+    parsed = [IS_NER.parse_ner_tags(pair.is_line, pair.is_tokens, pair.is_labels) for pair in corpus]
+
+    def run():
+        for tags in parsed:
+            IS_NER.remove_B(IS_NER.join_ner_tags(list(tags)))
+
+    return run
+
+
+@stage("embed_ner_tags")
+def bench_embed_ner_tags(corpus, tmp_dir):
+    def run():
+        for pair in corpus:
+            embed_ner_tags(pair.is_line, pair.is_tags)
+
+    return run
+
+
+@stage("extract_ner_tags")
+def bench_extract_ner_tags(corpus, tmp_dir):
+    embedded = [embed_ner_tags(pair.is_line, pair.is_tags) for pair in corpus]
+
+    def run():
+        for line in embedded:
+            extract_ner_tags(line)
+
+    return run
+
+
+@stage("filter_text_by_ner")
+def bench_filter_text_by_ner(corpus, tmp_dir):
+    paths = write_corpus(corpus, tmp_dir)
+    outputs = [os.path.join(tmp_dir, f"filtered.{idx}") for idx in range(4)]
+
+    def run():
+        invoke(["filter-text-by-ner", paths["is"], paths["en"], paths["is.ner"], paths["en.ner"], *outputs])
+
+    return run
+
+
+@stage("filter_same_number_of_entity_types_batch")
+def bench_filter_batch(corpus, tmp_dir):
+    is_tags = [map_named_entity_types(pair.is_tags) for pair in corpus]
+    en_tags = [map_named_entity_types(pair.en_tags) for pair in corpus]
+
+    def run():
+        filter_same_number_of_entity_types_batch(*to_columnar(is_tags), *to_columnar(en_tags))
+
+    return run
+
+
+@stage("align_markers_by_jaro_winkler")
+def bench_align_jaro_winkler(corpus, tmp_dir):
+    is_markers, en_markers = to_markers(corpus)
+
+    def run():
+        for is_line_markers, en_line_markers in zip(is_markers, en_markers):
+            align_markers_by_jaro_winkler(is_line_markers, en_line_markers)
+
+    return run
+
+
+@stage("align_markers_by_order")
+def bench_align_order(corpus, tmp_dir):
+    is_markers, en_markers = to_markers(corpus)
+
+    def run():
+        for is_line_markers, en_line_markers in zip(is_markers, en_markers):
+            align_markers_by_order(is_line_markers, en_line_markers)
+
+    return run
+
+
+@stage("correct")
+def bench_correct(corpus, tmp_dir):
+    is_markers, en_markers = to_markers(corpus)
+    corrector = Corrector(should_correct_to_nomintaive_case=True)
+
+    def run():
+        for pair, is_line_markers, en_line_markers in zip(corpus, is_markers, en_markers):
+            correct_line(pair.is_line, pair.en_line, is_line_markers, en_line_markers, corrector)
+
+    return run
+
+
+@stage("eval")
+def bench_eval(corpus, tmp_dir):
+    paths = write_corpus(corpus, tmp_dir)
+
+    def run():
+        invoke(["eval", paths["is"], paths["en"], paths["is.norm"], paths["en.norm"], "--tsv"])
+
+    return run
+
+
+@stage("statistics")
+def bench_statistics(corpus, tmp_dir):
+    paths = write_corpus(corpus, tmp_dir)
+
+    def run():
+        invoke(["statistics", paths["is.ner"], paths["en.ner"], "--pairs"])
+
+    return run
+
+
+@stage("ner")
+def bench_ner(corpus, tmp_dir):
+    """The ner command with a fake model, i.e. the overhead around the model."""
+    paths = write_corpus(corpus, tmp_dir)
+    tagger = FakeTagger({pair.is_line: pair.is_tags for pair in corpus})
+    mt_cli.load_ner_model = lambda *args, **kwargs: tagger
+
+    def run():
+        invoke(["ner", paths["is"], os.path.join(tmp_dir, "tagged.ner"), "--lang", "is"])
+
+    return run
+
+
+def current_rss_mb() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_stage(name: str, num_lines: int, seed: int, results: multiprocessing.Queue):
+    """Run a single stage, in its own process."""
+    corpus = generate_corpus(num_lines, seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        run = STAGES[name](corpus, tmp_dir)
+        baseline_rss = current_rss_mb()
+        start_time = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - start_time
+    results.put(
+        {
+            "seconds": seconds,
+            "lines_per_sec": num_lines / seconds if seconds else float("inf"),
+            "baseline_rss_mb": baseline_rss,
+            # ru_maxrss is in kilobytes on Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+    )
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return "unknown"
+
+
+@click.command()
+@click.option("--num_lines", type=int, default=10000)
+@click.option("--seed", type=int, default=1)
+@click.option("--stages", type=str, default=",".join(STAGES), help="Comma separated stages to run.")
+@click.option("--results", type=str, default=None, help="Append the results as a JSON line to this file.")
+def main(num_lines, seed, stages, results):
+    logging.basicConfig(level=logging.INFO)
+    context = multiprocessing.get_context("spawn")
+    summary = {"commit": current_commit(), "time": time.time(), "num_lines": num_lines, "stages": {}}
+    for name in stages.split(","):
+        if name not in STAGES:
+            raise click.BadParameter(f"Unknown stage {name}. Known stages: {', '.join(STAGES)}")
+        queue = context.Queue()
+        process = context.Process(target=run_stage, args=(name, num_lines, seed, queue))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            raise RuntimeError(f"Stage {name} failed with exit code {process.exitcode}")
+        stage_result = queue.get()
+        summary["stages"][name] = stage_result
+        log.info(
+            f"{name:>42}: {stage_result['lines_per_sec']:>12.0f} lines/s, "
+            f"peak RSS {stage_result['peak_rss_mb']:.0f} MB (baseline {stage_result['baseline_rss_mb']:.0f} MB)"
+        )
+    if results:
+        with open(results, "a") as results_file:
+            results_file.write(json.dumps(summary) + "\n")
+
+
+if __name__ == "__main__":
+    main()
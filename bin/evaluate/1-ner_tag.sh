@@ -13,9 +13,14 @@ for MODEL in $EN_IS_MODELS; do
     MODEL_DIR="$OUT_DIR/$MODEL"
     MODEL_OUT_DIR="$OUT_DIR/$MODEL"
     mkdir -p $MODEL_OUT_DIR
+    # Tag all the datasets with a single model instance
+    NER_FILES=""
     for dataset in $DATASETS; do
         cp "$MODEL_DIR/$dataset".translation.$DIRECTION "$MODEL_OUT_DIR/$dataset".$LANG
-        mt ner "$MODEL_DIR/$dataset".translation.$DIRECTION "$MODEL_OUT_DIR/$dataset".$LANG.ner.unnorm --device cuda --batch_size 32 --lang $LANG
+        NER_FILES="$NER_FILES $MODEL_DIR/$dataset.translation.$DIRECTION $MODEL_OUT_DIR/$dataset.$LANG.ner.unnorm"
+    done
+    mt ner $NER_FILES --device cuda --batch_size 32 --lang $LANG
+    for dataset in $DATASETS; do
         mt normalize "$MODEL_OUT_DIR/$dataset".$LANG.ner.unnorm "$MODEL_OUT_DIR/$dataset".$LANG.ner
         rm "$MODEL_OUT_DIR/$dataset".$LANG.ner.unnorm
     done
@@ -26,9 +31,14 @@ for MODEL in $IS_EN_MODELS; do
     MODEL_DIR="$OUT_DIR/$MODEL"
     MODEL_OUT_DIR="$OUT_DIR/$MODEL"
     mkdir -p $MODEL_OUT_DIR
+    # Tag all the datasets with a single model instance
+    NER_FILES=""
     for dataset in $DATASETS; do
         cp "$MODEL_DIR/$dataset".translation.$DIRECTION "$MODEL_OUT_DIR/$dataset".$LANG
-        mt ner "$MODEL_DIR/$dataset".translation.$DIRECTION "$MODEL_OUT_DIR/$dataset".$LANG.ner.unnorm --device cuda --batch_size 32 --lang $LANG
+        NER_FILES="$NER_FILES $MODEL_DIR/$dataset.translation.$DIRECTION $MODEL_OUT_DIR/$dataset.$LANG.ner.unnorm"
+    done
+    mt ner $NER_FILES --device cuda --batch_size 32 --lang $LANG
+    for dataset in $DATASETS; do
         mt normalize "$MODEL_OUT_DIR/$dataset".$LANG.ner.unnorm "$MODEL_OUT_DIR/$dataset".$LANG.ner
         rm "$MODEL_OUT_DIR/$dataset".$LANG.ner.unnorm
     done
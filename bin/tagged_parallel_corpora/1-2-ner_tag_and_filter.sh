@@ -0,0 +1,18 @@
+#!/bin/bash
+#SBATCH --job-name=ner_tag_and_filter
+#SBATCH --gres=gpu:1
+# Tags both sides and filters in one job, instead of 1-ner_tag_*.sh and 2-filter.sh.
+OUT_DIR="/data/scratch/haukurpj/Projects/MT_NER_EVAL/parallel_corpora_out"
+echo $CUDA_VISIBLE_DEVICES
+DATASETS="greynir_articles_01-11-2020:01-06-2021 newscrawl_2007-2019"
+TGT_LANG="is"
+SRC_LANG="en"
+for dataset in $DATASETS; do
+    src_text="$OUT_DIR/$dataset.$SRC_LANG"
+    tgt_text="$OUT_DIR/$dataset.$TGT_LANG"
+    src_text_out="$OUT_DIR/$dataset.filtered.$SRC_LANG"
+    tgt_text_out="$OUT_DIR/$dataset.filtered.$TGT_LANG"
+    src_entities_out="$OUT_DIR/$dataset.filtered.$SRC_LANG.ner"
+    tgt_entities_out="$OUT_DIR/$dataset.filtered.$TGT_LANG.ner"
+    mt ner-parallel $src_text $tgt_text $src_text_out $tgt_text_out $src_entities_out $tgt_entities_out --src_lang $SRC_LANG --tgt_lang $TGT_LANG --device cuda --batch_size 64
+done
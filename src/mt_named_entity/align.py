@@ -1,16 +1,20 @@
 import logging
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
 
 from pyjarowinkler import distance
 from scipy.optimize import linear_sum_assignment
 
-from mt_named_entity.filter import filter_same_number_of_entity_types
+from mt_named_entity.filter import TAG_MAPPER, filter_same_number_of_entity_types
 
 from .ner import NERMarker, NERTag
 
 log = logging.getLogger(__name__)
 
+# Above this many marker pairs of a tag, by_tag_greedy matches the markers greedily instead of optimally.
+GREEDY_ABOVE = 2500
+
 
 @dataclass(frozen=True)
 class NERAlignment:
@@ -24,6 +28,16 @@ class NERAlignment:
         return f"{self.marker_1}-{self.marker_2}-{self.distance}"
 
 
+def marker_key(ner_marker: NERMarker) -> str:
+    """The string a marker is aligned on, its normalized key if computed."""
+    return ner_marker.key or ner_marker.named_entity
+
+
+def jaro_winkler_distance(w1: str, w2: str) -> float:
+    """Jaro-Winkler distance (not similarity score)"""
+    return 1 - distance.get_jaro_distance(w1, w2, winkler=True, scaling=0.1)
+
+
 def get_min_hun_distance(words1: List[str], words2: List[str]) -> Tuple[float, List[Tuple[int, int, float]]]:
     """Calculate a similarity score between all pairs of words."""
     values = []
@@ -36,8 +50,7 @@ def get_min_hun_distance(words1: List[str], words2: List[str]) -> Tuple[float, L
         row = []
         for j in range(len(words2)):
             w2 = words2[j]
-            # Jaro-Winkler distance (not similarity score)
-            row.append(1 - distance.get_jaro_distance(w1, w2, winkler=True, scaling=0.1))
+            row.append(jaro_winkler_distance(w1, w2))
         values.append(row)
     # Calculate the best pairing based on the similarity score.
     row_ids, col_ids = linear_sum_assignment(values)
@@ -61,8 +74,8 @@ def align_markers_by_jaro_winkler(ner_markers_1: List[NERMarker], ner_markers_2:
     """Aligns NERMarkers based on Jaro-Winkler distance."""
     try:
         min_dist, hits = get_min_hun_distance(
-            [ner_marker.named_entity for ner_marker in ner_markers_1],
-            [ner_marker.named_entity for ner_marker in ner_markers_2],
+            [marker_key(ner_marker) for ner_marker in ner_markers_1],
+            [marker_key(ner_marker) for ner_marker in ner_markers_2],
         )
     except (ValueError, distance.JaroDistanceException):
         log.exception(f"Bad NER markers: {ner_markers_1=}, {ner_markers_2}")
@@ -76,3 +89,54 @@ def align_markers_by_order(ner_markers_1: List[NERMarker], ner_markers_2: List[N
     ner_markers_1 = sorted(ner_markers_1, key=lambda x: x.tag)
     ner_markers_2 = sorted(ner_markers_2, key=lambda x: x.tag)
     return [NERAlignment(None, marker_1, marker_2) for marker_1, marker_2 in zip(ner_markers_1, ner_markers_2)]
+
+
+def get_greedy_hits(words1: List[str], words2: List[str]) -> List[Tuple[int, int, float]]:
+    """Pair words greedily, closest first, which avoids the cubic time of get_min_hun_distance but is not always
+    optimal. All pairs of words are compared, so min(len(words1), len(words2)) pairs are found."""
+    candidates = sorted(
+        (jaro_winkler_distance(w1, w2), i, j) for i, w1 in enumerate(words1) for j, w2 in enumerate(words2)
+    )
+    hits: List[Tuple[int, int, float]] = []
+    paired_1 = set()
+    paired_2 = set()
+    for dist, i, j in candidates:
+        if i not in paired_1 and j not in paired_2:
+            hits.append((i, j, dist))
+            paired_1.add(i)
+            paired_2.add(j)
+    return hits
+
+
+def align_markers_greedily(ner_markers_1: List[NERMarker], ner_markers_2: List[NERMarker]) -> List[NERAlignment]:
+    """Aligns NERMarkers greedily based on Jaro-Winkler distance, see get_greedy_hits."""
+    hits = get_greedy_hits(
+        [marker_key(ner_marker) for ner_marker in ner_markers_1],
+        [marker_key(ner_marker) for ner_marker in ner_markers_2],
+    )
+    return [NERAlignment(cost, ner_markers_1[hit_1], ner_markers_2[hit_2]) for hit_1, hit_2, cost in hits]
+
+
+def align_markers_by_tag(
+    ner_markers_1: List[NERMarker], ner_markers_2: List[NERMarker], greedy_above: Optional[int] = None
+) -> List[NERAlignment]:
+    """Aligns NERMarkers based on Jaro-Winkler distance, only within the same (normalized) tag.
+    Tags with more than greedy_above pairs of markers are aligned greedily."""
+    alignments = []
+    for tag in dict.fromkeys(TAG_MAPPER.get(marker.tag, marker.tag) for marker in ner_markers_1):
+        tag_markers_1 = [marker for marker in ner_markers_1 if TAG_MAPPER.get(marker.tag, marker.tag) == tag]
+        tag_markers_2 = [marker for marker in ner_markers_2 if TAG_MAPPER.get(marker.tag, marker.tag) == tag]
+        if not tag_markers_2:
+            continue
+        if greedy_above is not None and len(tag_markers_1) * len(tag_markers_2) > greedy_above:
+            alignments.extend(align_markers_greedily(tag_markers_1, tag_markers_2))
+        else:
+            alignments.extend(align_markers_by_jaro_winkler(tag_markers_1, tag_markers_2))
+    return alignments
+
+
+ALIGNMENT_STRATEGIES: Dict[str, Callable[[List[NERMarker], List[NERMarker]], List[NERAlignment]]] = {
+    "all": align_markers_by_jaro_winkler,
+    "by_tag": align_markers_by_tag,
+    "by_tag_greedy": partial(align_markers_by_tag, greedy_above=GREEDY_ABOVE),
+}
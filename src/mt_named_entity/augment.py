@@ -0,0 +1,112 @@
+import logging
+import random
+import re
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from .align import align_markers_by_jaro_winkler
+from .declensions import CASES, DeclensionTable, detect_case
+from .ner import NERMarker
+
+log = logging.getLogger(__name__)
+
+# A person entity embedded by `mt embed`.
+PERSON = re.compile(r"<P>(.*?)</P>")
+
+# The line index and the (src, tgt) embedded lines.
+NUMBERED_PAIR = Tuple[int, Tuple[str, str]]
+AUGMENTED = Tuple[List[Tuple[str, str]], Counter]
+# The maximum Jaro-Winkler distance between an IS person entity and the EN person entity it is paired with.
+MAX_DISTANCE = 0.5
+
+
+def person_markers(line: str) -> List[NERMarker]:
+    """The embedded person entities of the line, in order."""
+    return [NERMarker("P", match.start(1), match.end(1), match.group(1)) for match in PERSON.finditer(line)]
+
+
+def replace_persons(line: str, names: List[str]) -> str:
+    """Replace the embedded person entities of the line, in order, with the names."""
+    replacements = iter(names)
+    return PERSON.sub(lambda _: f"<P>{next(replacements)}</P>", line)
+
+
+def augment_pair(
+    src_line: str,
+    tgt_line: str,
+    table: DeclensionTable,
+    num_variants: int,
+    rng: random.Random,
+    max_distance: float = MAX_DISTANCE,
+) -> Tuple[List[Tuple[str, str]], str]:
+    """Create variants of an embedded IS (src) and EN (tgt) sentence pair where the person entities are replaced
+    with random names from the table. The IS names are in the case of the original name and the EN names
+    in nominative case. Both sides must have the same number of person entities, which are paired by
+    Jaro-Winkler distance, so a pair is skipped if any of its persons is further than max_distance from its pair.
+    Return the variants and the reason, if no variants could be created."""
+    src_persons = person_markers(src_line)
+    tgt_persons = person_markers(tgt_line)
+    if not src_persons:
+        return [], "no_persons"
+    if len(src_persons) != len(tgt_persons):
+        return [], "different_number_of_persons"
+    alignments = align_markers_by_jaro_winkler(src_persons, tgt_persons)
+    if len(alignments) != len(src_persons) or any(
+        alignment.distance is None or alignment.distance > max_distance for alignment in alignments
+    ):
+        return [], "persons_not_aligned"
+    # The index of the tgt person paired with each src person.
+    tgt_idxs = {alignment.marker_1: tgt_persons.index(alignment.marker_2) for alignment in alignments}
+    cases_and_genders = [detect_case(person.named_entity) for person in src_persons]
+    if any(case is None for case, _ in cases_and_genders):
+        return [], "unknown_case"
+    # The genders which the replacement names can have.
+    all_genders = [sorted(gender for gender in genders if table.names.get(gender)) for _, genders in cases_and_genders]
+    if not all(all_genders):
+        return [], "no_names"
+    variants = []
+    for _ in range(num_variants):
+        src_names = []
+        tgt_names = [""] * len(tgt_persons)
+        for person, (case, _), genders in zip(src_persons, cases_and_genders, all_genders):
+            forms = rng.choice(table.names[rng.choice(genders)])
+            src_names.append(forms[CASES.index(case)])  # type: ignore
+            tgt_names[tgt_idxs[person]] = forms[0]
+        variants.append((replace_persons(src_line, src_names), replace_persons(tgt_line, tgt_names)))
+    return variants, "augmented"
+
+
+def augment_chunk(
+    chunk: List[NUMBERED_PAIR], table: DeclensionTable, num_variants: int, seed: int, max_distance: float = MAX_DISTANCE
+) -> AUGMENTED:
+    """Augment a chunk of numbered sentence pairs. Each line has its own random generator,
+    seeded by the seed and the line index, so the output does not depend on the chunks or workers."""
+    all_variants = []
+    reasons: Counter = Counter()
+    for line_idx, (src_line, tgt_line) in chunk:
+        rng = random.Random(f"{seed}:{line_idx}")
+        variants, reason = augment_pair(
+            src_line.rstrip("\n"), tgt_line.rstrip("\n"), table, num_variants, rng, max_distance=max_distance
+        )
+        all_variants.extend(variants)
+        reasons[reason] += 1
+    return all_variants, reasons
+
+
+# The table of a worker process, set once by set_worker_table rather than sent with every chunk.
+_worker_table: Optional[DeclensionTable] = None
+
+
+def set_worker_table(table: DeclensionTable):
+    """Set the table which augment_chunk_in_worker uses in this process, e.g. as a Pool initializer."""
+    global _worker_table
+    _worker_table = table
+
+
+def augment_chunk_in_worker(
+    chunk: List[NUMBERED_PAIR], num_variants: int, seed: int, max_distance: float = MAX_DISTANCE
+) -> AUGMENTED:
+    """augment_chunk with the table set by set_worker_table."""
+    if _worker_table is None:
+        raise RuntimeError("set_worker_table must be called before augment_chunk_in_worker")
+    return augment_chunk(chunk, _worker_table, num_variants, seed, max_distance)
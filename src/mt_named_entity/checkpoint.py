@@ -0,0 +1,67 @@
+import json
+import logging
+import os
+from typing import List, TextIO
+
+log = logging.getLogger(__name__)
+
+CHECKPOINT_SUFFIX = ".checkpoint"
+
+
+def checkpoint_path(output_path: str) -> str:
+    return output_path + CHECKPOINT_SUFFIX
+
+
+def read_checkpoint(output_path: str) -> int:
+    """Return the number of completed lines recorded for the output, or -1 if there is no checkpoint."""
+    path = checkpoint_path(output_path)
+    if not os.path.exists(path):
+        return -1
+    with open(path) as f:
+        return json.load(f)["lines"]
+
+
+def write_checkpoint(outputs: List[TextIO], output_paths: List[str], completed_lines: List[int]):
+    """Flush the outputs to disk and then record how many lines of each are complete.
+    The checkpoint is replaced atomically, so it never claims more lines than have been written.
+    Closed outputs are skipped, so they must have been flushed to disk by an earlier checkpoint."""
+    for output in outputs:
+        if output.closed:
+            continue
+        output.flush()
+        os.fsync(output.fileno())
+    for output_path, num_lines in zip(output_paths, completed_lines):
+        tmp_path = checkpoint_path(output_path) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"lines": num_lines}, f)
+        os.replace(tmp_path, checkpoint_path(output_path))
+
+
+def remove_checkpoint(output_path: str):
+    if os.path.exists(checkpoint_path(output_path)):
+        os.remove(checkpoint_path(output_path))
+
+
+def prepare_resume(output_path: str) -> int:
+    """Verify an existing output against its checkpoint and truncate anything written after the checkpoint.
+    Without a checkpoint all complete lines of the output are kept. Return the number of completed lines."""
+    num_lines = read_checkpoint(output_path)
+    if not os.path.exists(output_path):
+        if num_lines > 0:
+            raise ValueError(f"The checkpoint of {output_path} has {num_lines} lines but the output does not exist")
+        return 0
+    completed_lines = 0
+    with open(output_path, "rb+") as f:
+        end_idx = 0
+        while num_lines == -1 or completed_lines < num_lines:
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                # A partially written line
+                break
+            completed_lines += 1
+            end_idx = f.tell()
+        if completed_lines < num_lines:
+            raise ValueError(f"{output_path} has {completed_lines} lines but its checkpoint has {num_lines}")
+        f.truncate(end_idx)
+    log.info(f"Resuming {output_path} after {completed_lines} lines")
+    return completed_lines
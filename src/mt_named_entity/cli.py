@@ -1,25 +1,86 @@
+import asyncio
+import json
 import logging
+import os
 import re
 from collections import Counter
+from functools import partial
+from itertools import chain, islice
 from random import sample, shuffle
-from typing import Dict, Iterable, List
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import click
 from tqdm import tqdm
 
-from mt_named_entity.align import align_markers_by_jaro_winkler, align_markers_by_order
+from mt_named_entity.align import (
+    ALIGNMENT_STRATEGIES,
+    GREEDY_ABOVE,
+    align_markers_by_jaro_winkler,
+    align_markers_by_order,
+)
 from mt_named_entity.correct import CorrectionResult, Corrector, correct_line
 
-from .embed import embed_ner_entity, embed_ner_tags, extract_ner_tags
-from .eval import ALIGNED, ALL_METRICS, DISTANCE, MATCHES, UPPER_BOUND, get_metrics
-from .filter import ALL_TAGS, filter_named_entity_types, filter_same_number_of_entity_types, map_named_entity_types
-from .ner import EN_NER, IS_NER, NERMarker, NERTag
+from .augment import MAX_DISTANCE, augment_chunk_in_worker, set_worker_table
+from .checkpoint import prepare_resume, remove_checkpoint
+from .counting import ExternalCounter
+from .declensions import DeclensionTable, load_or_build_table, read_names
+from .dedup import DeduplicatingTagger, ReusingTagger, read_previous_run
+from .dictionary import CorrectionsIndex
+from .embed import embed_ner_tags, extract_ner_tags
+from .eval import (
+    ALIGNED,
+    ALL_GROUPS,
+    ALL_METRICS,
+    DISTANCE,
+    MATCHES,
+    UPPER_BOUND,
+    SpanCounts,
+    empty_metrics,
+    evaluate_chunk,
+    merge_metrics,
+    span_counts_chunk,
+)
+from .filter import filter_ner_pairs, map_named_entity_types
+from .ner import NERMarker, NERTag, close_model, load_ner_model, tag_files
+from .ner_parallel import ParallelTagger
+from .normalization import KEY_MODES
+from .parallel import chunked, chunked_zip, map_chunks
+from .pos import IS_POS, aligned_persons
+from .prefilter import DEFAULT_RULES, RULES, PrefilteringTagger, parse_rules
+from .profiling import Profiler
+from .provenance import ProvenanceIndex
+from .server import NERClient, serve
+from .stats import CorpusProfile, count_entities_chunk, profile_chunk
+from .threads import autotune_intra_op_threads, available_cpus, candidate_thread_counts, configure_threads
 
 log = logging.getLogger(__name__)
 
-ALL_GROUPS = ["all"] + ALL_TAGS
 METRIC_FIELDS = [f"{group}_{metric}" for group in ALL_GROUPS for metric in ALL_METRICS]
 
+profile_out_option = click.option(
+    "--profile_out",
+    type=str,
+    default=None,
+    help="Write a JSON summary of the time spent in each stage, and counters, to this file.",
+)
+
+
+def thread_options(func):
+    """Options to control the CPU threads used by torch."""
+    func = click.option(
+        "--cpu_affinity",
+        type=str,
+        default=None,
+        help="Pin the process to these CPUs, e.g. 0-15,32-47. Also the default number of intra-op threads.",
+    )(func)
+    func = click.option(
+        "--inter_op_threads", type=int, default=None, help="Number of threads torch runs independent operations on."
+    )(func)
+    func = click.option(
+        "--intra_op_threads", type=int, default=None, help="Number of threads torch uses within an operation."
+    )(func)
+    return func
+
 
 @click.group()
 @click.option("--debug/--no_debug", default=False)
@@ -88,25 +149,497 @@ def sample_parallel(inp_lang1, inp_lang2, out_lang1, out_lang2, total_num_lines,
 
 
 @cli.command()
-@click.argument("inp", type=click.File("r"))
-@click.argument("out", type=click.File("w"))
+@click.argument("files", nargs=-1, type=str)
+@click.option(
+    "--manifest",
+    type=click.File("r"),
+    default=None,
+    help="A TSV file with an input and an output path on each line. Tagged after FILES.",
+)
 @click.option("--lang", type=click.Choice(["en", "is"]), default="is")
 @click.option("--device", type=str, default="cpu")
 @click.option("--batch_size", type=int, default=64)
-def ner(inp, out, lang, device, batch_size):
-    """A command to NER tag input file and write to output file.
+@click.option(
+    "--server",
+    type=str,
+    default=None,
+    help="Tag using a server started with serve-ner at host:port or unix:/path/to/socket instead of loading the model.",
+)
+@click.option(
+    "--request_lines",
+    type=int,
+    default=1024,
+    help="Number of lines in each request to the --server. All requests of a chunk are sent without waiting.",
+)
+@click.option(
+    "--chunk_size",
+    type=int,
+    default=10000,
+    help="Number of lines given to the model at once. Lines from different files share chunks.",
+)
+@click.option(
+    "--cpu_optimized/--no_cpu_optimized",
+    default=False,
+    help="Quantize the linear layers of the model to int8 for faster inference on CPU.",
+)
+@thread_options
+@click.option(
+    "--autotune_threads/--no_autotune_threads",
+    default=False,
+    help="Tag a sample of the input with different numbers of intra-op threads and use the fastest.",
+)
+@click.option("--autotune_lines", type=int, default=200, help="Number of lines to autotune the threads on.")
+@click.option(
+    "--resume/--no_resume",
+    default=False,
+    help="Continue tagging after the last checkpoint of each output, e.g. after the job was preempted.",
+)
+@click.option(
+    "--dedup/--no_dedup",
+    default=False,
+    help="Only tag each distinct line once and copy the NEs to its duplicates.",
+)
+@click.option(
+    "--dedup_cache_lines",
+    type=int,
+    default=1_000_000,
+    help="Number of recently tagged lines to remember for --dedup. With 0, lines are only deduplicated within a chunk.",
+)
+@click.option(
+    "--previous_input",
+    type=str,
+    multiple=True,
+    help="An input of a previous run. Lines found in it reuse the NEs in the corresponding --previous_output. "
+    "Can be given multiple times.",
+)
+@click.option(
+    "--previous_output",
+    type=str,
+    multiple=True,
+    help="The output of a previous run on the corresponding --previous_input.",
+)
+@click.option(
+    "--prefilter",
+    type=str,
+    default=None,
+    help=f"Comma separated rules for lines which get no NEs without running the model, out of {', '.join(RULES)}. "
+    f"E.g. {','.join(DEFAULT_RULES)}.",
+)
+@click.option(
+    "--prefilter_check_lines",
+    type=int,
+    default=0,
+    help="Tag this many of the lines skipped by --prefilter anyway and report how many have NEs.",
+)
+@click.option(
+    "--tokenizer_workers",
+    type=int,
+    default=0,
+    help="Number of processes to tokenize Icelandic with, overlapping tokenization with inference.",
+)
+@click.option(
+    "--queue_size",
+    type=int,
+    default=2,
+    help="Read, tag and write in separate threads, with at most this many chunks waiting between them. "
+    "0 runs them one after another.",
+)
+@profile_out_option
+def ner(
+    files,
+    manifest,
+    lang,
+    device,
+    batch_size,
+    server,
+    request_lines,
+    chunk_size,
+    cpu_optimized,
+    intra_op_threads,
+    inter_op_threads,
+    cpu_affinity,
+    autotune_threads,
+    autotune_lines,
+    resume,
+    dedup,
+    dedup_cache_lines,
+    previous_input,
+    previous_output,
+    prefilter,
+    prefilter_check_lines,
+    tokenizer_workers,
+    queue_size,
+    profile_out,
+):
+    """A command to NER tag input files and write to output files.
+    FILES are pairs of input and output files, i.e. INP OUT [INP OUT]...; all are tagged with a single model.
     Input has a sentence in each line, not tokenized.
     The output has the string representation of all NERTags found in the corresponding sentence, separated by a space.
-    The output maintains empty lines."""
-    log.info(f"NER tagging")
-    inp = tqdm(inp)
-    if lang == "en":
-        ner = EN_NER(device, batch_size)
-    else:
-        ner = IS_NER(device, batch_size)
-    for sent_ner_tag in ner(inp):
-        out.write(" ".join([str(tag) for tag in sent_ner_tag]) + "\n")
+    The output maintains empty lines.
+    A checkpoint is written next to each output file after every chunk and removed when done."""
+    file_pairs = read_file_pairs(files, manifest)
+    if len(previous_input) != len(previous_output):
+        raise click.BadParameter("Each --previous_input needs a --previous_output.")
+    log.info(f"NER tagging {len(file_pairs)} files")
+    profiler = Profiler()
+    configure_threads(intra_op_threads, inter_op_threads, cpu_affinity)
+    with profiler.timer("model_loading"):
+        if server:
+            ner = NERClient(server, lang, request_lines=request_lines)
+        else:
+            ner = load_ner_model(
+                lang,
+                device,
+                batch_size,
+                profiler=profiler,
+                cpu_optimized=cpu_optimized,
+                tokenizer_workers=tokenizer_workers,
+            )
+    model = ner
+    try:
+        output_paths = [out for _, out in file_pairs]
+        # Standard output cannot be checkpointed.
+        checkpointed = "-" not in output_paths
+        if resume and not checkpointed:
+            raise click.BadParameter("Cannot resume when writing to standard output.")
+        skip_lines = [prepare_resume(out) for out in output_paths] if resume else [0] * len(file_pairs)
+        # Each pair is opened as tag_files reaches it and closed once its last line is written.
+        input_files = [LazyFile(inp, "r") for inp, _ in file_pairs]
+        inputs: List[Iterable[str]] = [tqdm(input_file, desc=input_file.path) for input_file in input_files]
+        if autotune_threads and not server:
+            with profiler.timer("autotuning"):
+                # The sample is put back, since the input might not be seekable.
+                sample_lines = list(islice(inputs[0], autotune_lines))
+                inputs[0] = chain(sample_lines, inputs[0])
+                # Includes --cpu_affinity, which is set by now.
+                autotune_intra_op_threads(ner, sample_lines, candidate_thread_counts(available_cpus()))
+        if dedup:
+            ner = dedup_tagger = DeduplicatingTagger(ner, dedup_cache_lines, profiler=profiler)
+        if previous_input:
+            with profiler.timer("reading_previous"):
+                previous = read_previous_run(previous_input, previous_output)
+            ner = reusing_tagger = ReusingTagger(ner, previous, profiler=profiler)
+        if prefilter:
+            try:
+                rules = parse_rules(prefilter)
+            except ValueError as e:
+                raise click.BadParameter(str(e))
+            ner = prefiltering_tagger = PrefilteringTagger(ner, rules, prefilter_check_lines, profiler=profiler)
+        outputs = [LazyFile(out, "a" if resume else "w") for out in output_paths]
+
+        def close_files(file_idx: int):
+            input_files[file_idx].close()
+            outputs[file_idx].close()
+
+        # Reading the input is included in the tokenization time.
+        throughputs = tag_files(
+            ner,
+            inputs,
+            outputs,
+            chunk_size,
+            profiler=profiler,
+            skip_lines=skip_lines,
+            checkpoint_paths=output_paths if checkpointed else None,
+            queue_size=queue_size,
+            file_done=close_files,
+        )
+    finally:
+        close_model(model)
+    if checkpointed:
+        for out in output_paths:
+            remove_checkpoint(out)
+    for (inp, _), (num_lines, seconds) in zip(file_pairs, throughputs):
+        log.info(f"{inp}: {num_lines} lines in {seconds:.1f}s, {num_lines / seconds if seconds else 0:.1f} lines/s")
+    if dedup:
+        dedup_tagger.log_summary()
+    if previous_input:
+        reusing_tagger.log_summary()
+    if prefilter:
+        prefiltering_tagger.log_summary()
     log.info(f"NER tagging done")
+    profiler.write(profile_out)
+
+
+class LazyFile:
+    """A file which is opened when it is first read or written, so that many files can be given at once.
+    It is closed until then, and closing it opens it first, so that an output without lines is still created."""
+
+    def __init__(self, path: str, mode: str) -> None:
+        self.path = path
+        self.mode = mode
+        self.file: Optional[IO] = None
+
+    def open(self) -> IO:
+        if self.file is None:
+            self.file = click.open_file(self.path, self.mode)
+        return self.file
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.open())
+
+    def write(self, text: str) -> int:
+        return self.open().write(text)
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def fileno(self) -> int:
+        return self.open().fileno()
+
+    @property
+    def closed(self) -> bool:
+        return self.file is None or self.file.closed
+
+    def close(self):
+        self.open().close()
+
+
+def read_file_pairs(files: Iterable[str], manifest: Optional[Iterable[str]]) -> List[Tuple[str, str]]:
+    """Read (input, output) pairs from a flat list of paths and a TSV manifest."""
+    files = list(files)
+    if len(files) % 2 != 0:
+        raise click.BadParameter("FILES must be pairs of input and output files.")
+    file_pairs = list(zip(files[::2], files[1::2]))
+    if manifest is not None:
+        for line in manifest:
+            if line.strip() == "":
+                continue
+            inp, out = line.strip().split("\t")
+            file_pairs.append((inp, out))
+    if not file_pairs:
+        raise click.BadParameter("No files to tag given, either as FILES or --manifest.")
+    return file_pairs
+
+
+@cli.command()
+@click.option("--langs", type=str, default="is,en", help="Comma separated languages to load NER models for.")
+@click.option("--address", type=str, default="localhost:8765", help="host:port or unix:/path/to/socket.")
+@click.option("--device", type=str, default="cpu")
+@click.option("--batch_size", type=int, default=64)
+@click.option("--max_batch_lines", type=int, default=1024, help="Maximum number of lines sent to a model at once.")
+@click.option(
+    "--max_wait_ms",
+    type=float,
+    default=20.0,
+    help="How long a request may wait for other requests to be batched with it.",
+)
+@click.option(
+    "--cpu_optimized/--no_cpu_optimized",
+    default=False,
+    help="Quantize the linear layers of the model to int8 for faster inference on CPU.",
+)
+@click.option(
+    "--tokenizer_workers",
+    type=int,
+    default=0,
+    help="Number of processes to tokenize Icelandic with, overlapping tokenization with inference.",
+)
+@thread_options
+def serve_ner(
+    langs,
+    address,
+    device,
+    batch_size,
+    max_batch_lines,
+    max_wait_ms,
+    cpu_optimized,
+    tokenizer_workers,
+    intra_op_threads,
+    inter_op_threads,
+    cpu_affinity,
+):
+    """Load the NER models once and serve them, so that `mt ner --server` does not reload them.
+    Concurrent requests are batched together."""
+    configure_threads(intra_op_threads, inter_op_threads, cpu_affinity)
+    models = {}
+    for lang in langs.split(","):
+        log.info(f"Loading NER model for {lang}")
+        models[lang] = load_ner_model(
+            lang, device, batch_size, cpu_optimized=cpu_optimized, tokenizer_workers=tokenizer_workers
+        )
+    try:
+        asyncio.run(serve(models, address, max_batch_lines, max_wait_ms))
+    except KeyboardInterrupt:
+        log.info("Stopped serving NER")
+    finally:
+        for model in models.values():
+            close_model(model)
+
+
+@cli.command()
+@click.argument("src_text", type=click.File("r"))
+@click.argument("tgt_text", type=click.File("r"))
+@click.argument("src_text_out", type=click.File("w"))
+@click.argument("tgt_text_out", type=click.File("w"))
+@click.argument("src_entities_out", type=click.File("w"))
+@click.argument("tgt_entities_out", type=click.File("w"))
+@click.option("--src_lang", type=click.Choice(["en", "is"]), default="en")
+@click.option("--tgt_lang", type=click.Choice(["en", "is"]), default="is")
+@click.option("--device", type=str, default="cpu")
+@click.option("--batch_size", type=int, default=64)
+@click.option("--chunk_size", type=int, default=10000, help="Number of line pairs given to the models at once.")
+@click.option(
+    "--skip_unmatched/--no_skip_unmatched",
+    default=True,
+    help="Only tag the tgt side of lines whose src side has P, L or O entities. The others are filtered out anyway.",
+)
+@click.option(
+    "--cpu_optimized/--no_cpu_optimized",
+    default=False,
+    help="Quantize the linear layers of the models to int8 for faster inference on CPU.",
+)
+@click.option(
+    "--tokenizer_workers",
+    type=int,
+    default=0,
+    help="Number of processes to tokenize Icelandic with, overlapping tokenization with inference.",
+)
+@click.option(
+    "--queue_size",
+    type=int,
+    default=2,
+    help="Tag the src and tgt sides in separate threads, with at most this many chunks waiting between them. "
+    "0 tags them one after another.",
+)
+@thread_options
+@profile_out_option
+def ner_parallel(
+    src_text,
+    tgt_text,
+    src_text_out,
+    tgt_text_out,
+    src_entities_out,
+    tgt_entities_out,
+    src_lang,
+    tgt_lang,
+    device,
+    batch_size,
+    chunk_size,
+    skip_unmatched,
+    cpu_optimized,
+    tokenizer_workers,
+    queue_size,
+    intra_op_threads,
+    inter_op_threads,
+    cpu_affinity,
+    profile_out,
+):
+    """NER tag both sides of a parallel corpus with models loaded in one process and filter the pairs
+    as filter-text-by-ner does, without writing the intermediate NER files. Unlike filter-text-by-ner,
+    the kept pairs are written in their original order."""
+    profiler = Profiler()
+    configure_threads(intra_op_threads, inter_op_threads, cpu_affinity)
+    with profiler.timer("model_loading"):
+        models = [
+            load_ner_model(
+                lang,
+                device,
+                batch_size,
+                profiler=profiler,
+                cpu_optimized=cpu_optimized,
+                tokenizer_workers=tokenizer_workers,
+            )
+            for lang in (src_lang, tgt_lang)
+        ]
+    try:
+        tagger = ParallelTagger(*models, skip_unmatched=skip_unmatched, profiler=profiler)
+        pairs = tagger.tag_and_filter(zip(tqdm(src_text), tgt_text), chunk_size, queue_size=queue_size)
+        for src_line, tgt_line, src_ner_tags, tgt_ner_tags in pairs:
+            with profiler.timer("writing"):
+                # The newline is still present.
+                src_text_out.write(src_line)
+                tgt_text_out.write(tgt_line)
+                src_entities_out.write(" ".join([str(tag) for tag in src_ner_tags]) + "\n")
+                tgt_entities_out.write(" ".join([str(tag) for tag in tgt_ner_tags]) + "\n")
+    finally:
+        for model in models:
+            close_model(model)
+    log.info(
+        f"Kept {profiler.counters['lines_kept']} of {profiler.counters['lines']} lines, "
+        f"skipped tagging {profiler.counters['tgt_lines_skipped']} tgt lines"
+    )
+    profiler.write(profile_out)
+
+
+@cli.command()
+@click.argument("is_text", type=click.File("r"))
+@click.argument("is_entities", type=click.File("r"))
+@click.argument("en_text", type=click.File("r"))
+@click.argument("en_entities", type=click.File("r"))
+@click.argument("out", type=click.File("w"))
+@click.option("--device", type=str, default="cpu")
+@click.option("--batch_size", type=int, default=64)
+@click.option("--chunk_size", type=int, default=10000, help="Number of lines read at once.")
+@click.option(
+    "--max_distance",
+    type=float,
+    default=0.9,
+    help="The maximum Jaro-Winkler distance for an IS person entity to be aligned to an EN entity.",
+)
+@click.option(
+    "--cpu_optimized/--no_cpu_optimized",
+    default=False,
+    help="Quantize the linear layers of the model to int8 for faster inference on CPU.",
+)
+@click.option(
+    "--tokenizer_workers",
+    type=int,
+    default=0,
+    help="Number of processes to tokenize Icelandic with.",
+)
+@thread_options
+@profile_out_option
+def pos(
+    is_text,
+    is_entities,
+    en_text,
+    en_entities,
+    out,
+    device,
+    batch_size,
+    chunk_size,
+    max_distance,
+    cpu_optimized,
+    tokenizer_workers,
+    intra_op_threads,
+    inter_op_threads,
+    cpu_affinity,
+    profile_out,
+):
+    """POS tag the IS person entities which are aligned to EN entities. For each line, write the aligned entities
+    with the IFD tag of their first token, e.g. P:0:14:nkeo-s, separated by a space. Lines without aligned
+    person entities are not tagged and are empty."""
+    configure_threads(intra_op_threads, inter_op_threads, cpu_affinity)
+    profiler = Profiler()
+    model = IS_POS(
+        device, batch_size, profiler=profiler, cpu_optimized=cpu_optimized, tokenizer_workers=tokenizer_workers
+    )
+    try:
+        lines = zip(is_text, is_entities, en_text, en_entities)
+        for chunk in chunked(tqdm(lines), chunk_size):
+            with profiler.timer("alignment"):
+                is_lines = [is_line.strip() for is_line, _, _, _ in chunk]
+                all_persons = [
+                    aligned_persons(
+                        to_ner_markers(read_ner_tags([is_ner]), [is_line])[0],
+                        to_ner_markers(read_ner_tags([en_ner]), [en_line.strip()])[0],
+                        max_distance,
+                    )
+                    for is_line, (_, is_ner, en_line, en_ner) in zip(is_lines, chunk)
+                ]
+            all_pos_tags = model.tag_entities(is_lines, all_persons)  # type: ignore
+            with profiler.timer("writing"):
+                for persons, pos_tags in zip(all_persons, all_pos_tags):
+                    line = " ".join(
+                        f"{NERTag.__repr__(person)}:{pos_tag}" for person, pos_tag in zip(persons, pos_tags)
+                    )
+                    out.write(line + "\n")
+                out.flush()
+            profiler.count("lines", len(chunk))
+    finally:
+        model.close()
+    profiler.write(profile_out)
 
 
 @cli.command()
@@ -131,18 +664,37 @@ def embed(original, ner_entities, output):
 @click.argument("original", type=click.File("r"))
 @click.argument("ner_entities", type=click.File("r"))
 @click.argument("output", type=click.File("w"))
-def unique_ner_entities(original, ner_entities, output):
-    """Return all unique NER entities found in the original text."""
+@click.option("--workers", type=int, default=1, help="Number of processes to count shards of lines with.")
+@click.option("--chunk_size", type=int, default=10000, help="Number of lines in each shard.")
+@click.option(
+    "--max_keys",
+    type=int,
+    default=1_000_000,
+    help="Maximum number of distinct entities held in memory before spilling sorted runs to disk.",
+)
+@click.option("--tmp_dir", type=str, default=None, help="Directory for the sorted runs. Defaults to the system tmp.")
+@click.option(
+    "--counts/--no_counts",
+    default=False,
+    help="Write 'entity<TAB>tag<TAB>count' lines sorted by decreasing frequency instead.",
+)
+def unique_ner_entities(original, ner_entities, output, workers, chunk_size, max_keys, tmp_dir, counts):
+    """Return all unique NER entities found in the original text, embedded in their tag, e.g. <P>Jón</P>, sorted."""
     log.info(f"Finding unique NER entities")
-    original = tqdm(original)
-    ner_entities = read_ner_tags(ner_entities)
-    all_entities = set()
-    for sent_ner_tags, sent_original in zip(ner_entities, original):
-        sent = sent_original.strip()
-        all_entities.update(embed_ner_entity(sent, ner_tag) for ner_tag in sent_ner_tags)
-
-    for entity in sorted(all_entities):
-        output.write(entity + "\n")
+    counter = ExternalCounter(max_keys=max_keys, tmp_dir=tmp_dir)
+    chunks = chunked_zip([original, ner_entities], chunk_size)
+    count_chunk = partial(count_entities_chunk, embedded=not counts)
+    try:
+        for chunk_counts in tqdm(map_chunks(count_chunk, chunks, workers)):
+            counter.update(chunk_counts)
+        if counts:
+            for entity_tag, count in counter.most_common():
+                output.write(f"{entity_tag}\t{count}\n")
+        else:
+            for entity, _ in counter.items():
+                output.write(entity + "\n")
+    finally:
+        counter.close()
     log.info(f"Done")
 
 
@@ -177,39 +729,51 @@ def extract_embeds(embedded_text, ner_entities, clean_text):
 @click.argument("tgt_text_out", type=click.File("w"))
 @click.argument("src_entities_out", type=click.File("w"))
 @click.argument("tgt_entities_out", type=click.File("w"))
+@click.option("--chunk_size", type=int, default=10000, help="Number of line pairs filtered at once.")
+@profile_out_option
 def filter_text_by_ner(
-    src_text, tgt_text, src_entities, tgt_entities, src_text_out, tgt_text_out, src_entities_out, tgt_entities_out
+    src_text,
+    tgt_text,
+    src_entities,
+    tgt_entities,
+    src_text_out,
+    tgt_text_out,
+    src_entities_out,
+    tgt_entities_out,
+    chunk_size,
+    profile_out,
 ):
     """Filter the src and tgt based on the provided NER entities. Empty lines are not written out."""
     log.info(f"Filtering")
+    profiler = Profiler()
     src_text = tqdm(src_text)
     src_text_to_write = []
     tgt_text_to_write = []
     src_entities_to_write = []
     tgt_entities_to_write = []
-    for sent_src_text, sent_tgt_text, sent_src_entities, sent_tgt_entities in zip(
-        src_text, tgt_text, src_entities, tgt_entities
-    ):
-        sent_src_entities = [NERTag.from_str(a_str) for a_str in sent_src_entities.strip().split(" ") if a_str != ""]
-        sent_tgt_entities = [NERTag.from_str(a_str) for a_str in sent_tgt_entities.strip().split(" ") if a_str != ""]
-        if not sent_src_entities or not sent_tgt_entities:
-            continue
-        sent_entities = [sent_src_entities, sent_tgt_entities]
-        # We map the named entities to a unified format, so that we can use the same filter function.
-        sent_entities = [map_named_entity_types(entities) for entities in sent_entities]
-        # We filter out named entities we are not interested in.
-        sent_entities = [filter_named_entity_types(entities) for entities in sent_entities]
-        if not sent_entities[0] or not sent_entities[1]:
-            continue
-        # We then filter out sentences which do not have the same number of entity types.
-        src_entities, tgt_entities = filter_same_number_of_entity_types(*sent_entities)
-        if not src_entities or not tgt_entities:
-            continue
-        # The newline is still present.
-        src_text_to_write.append(sent_src_text)
-        tgt_text_to_write.append(sent_tgt_text)
-        src_entities_to_write.append(src_entities)
-        tgt_entities_to_write.append(tgt_entities)
+    for chunk in chunked(zip(src_text, tgt_text, src_entities, tgt_entities), chunk_size):
+        profiler.count("lines", len(chunk))
+        with profiler.timer("parsing"):
+            chunk_src_entities = [
+                [NERTag.from_str(a_str) for a_str in sent_src_entities.strip().split(" ") if a_str != ""]
+                for _, _, sent_src_entities, _ in chunk
+            ]
+            chunk_tgt_entities = [
+                [NERTag.from_str(a_str) for a_str in sent_tgt_entities.strip().split(" ") if a_str != ""]
+                for _, _, _, sent_tgt_entities in chunk
+            ]
+        with profiler.timer("filtering"):
+            chunk_src_entities, chunk_tgt_entities = filter_ner_pairs(chunk_src_entities, chunk_tgt_entities)
+        for (sent_src_text, sent_tgt_text, _, _), sent_src_entities, sent_tgt_entities in zip(
+            chunk, chunk_src_entities, chunk_tgt_entities
+        ):
+            if not sent_src_entities or not sent_tgt_entities:
+                continue
+            # The newline is still present.
+            src_text_to_write.append(sent_src_text)
+            tgt_text_to_write.append(sent_tgt_text)
+            src_entities_to_write.append(sent_src_entities)
+            tgt_entities_to_write.append(sent_tgt_entities)
 
     assert len(src_text_to_write) == len(
         tgt_text_to_write
@@ -221,25 +785,29 @@ def filter_text_by_ner(
         src_text_to_write
     ), f"The source text and NEs should have the same lengths. src_text={len(src_text_to_write)}, src_ne={len(src_entities_to_write)}"
     length = len(src_text_to_write)
+    profiler.count("lines_kept", length)
     indices = list(range(length))
     shuffle(indices)
-    for idx in indices:
-        sent_src_text, sent_tgt_text, sent_src_entities, sent_tgt_entities = (
-            src_text_to_write[idx],
-            tgt_text_to_write[idx],
-            src_entities_to_write[idx],
-            tgt_entities_to_write[idx],
-        )
-        assert len(sent_src_entities) == len(
-            sent_tgt_entities
-        ), f"The source NEs and target NEs should have the same lengths. src_ne={len(sent_src_entities)}, tgt_ne={len(sent_tgt_entities)}"
-        assert sent_src_text.strip() != ""
-        assert sent_tgt_text.strip() != ""
-        src_text_out.write(sent_src_text)
-        tgt_text_out.write(sent_tgt_text)
-        src_entities_out.write(" ".join([str(tag) for tag in sent_src_entities]) + "\n")
-        tgt_entities_out.write(" ".join([str(tag) for tag in sent_tgt_entities]) + "\n")
+    with profiler.timer("writing"):
+        for idx in indices:
+            sent_src_text, sent_tgt_text, sent_src_entities, sent_tgt_entities = (
+                src_text_to_write[idx],
+                tgt_text_to_write[idx],
+                src_entities_to_write[idx],
+                tgt_entities_to_write[idx],
+            )
+            assert len(sent_src_entities) == len(
+                sent_tgt_entities
+            ), f"The source NEs and target NEs should have the same lengths. src_ne={len(sent_src_entities)}, tgt_ne={len(sent_tgt_entities)}"
+            assert sent_src_text.strip() != ""
+            assert sent_tgt_text.strip() != ""
+            src_text_out.write(sent_src_text)
+            tgt_text_out.write(sent_tgt_text)
+            src_entities_out.write(" ".join([str(tag) for tag in sent_src_entities]) + "\n")
+            tgt_entities_out.write(" ".join([str(tag) for tag in sent_tgt_entities]) + "\n")
     log.info(f"Filtering done")
+    profiler.write(profile_out)
+
 
 @cli.command()
 @click.argument("file_to_filter", type=click.File("r"))
@@ -255,16 +823,136 @@ def filter_by_idxs(file_to_filter, idx_file, filter_result_file):
 
 
 @cli.command()
-@click.argument("entities_file", type=click.File("r"))
-def statistics(entities_file):
-    """Get statistics about NER entities in a file."""
+@click.argument("entities_files", type=click.File("r"), nargs=-1, required=True)
+@click.option(
+    "--pairs/--no_pairs",
+    default=False,
+    help="Treat the files as src/tgt pairs (src1 tgt1 src2 tgt2 ...) and report tag-count agreement for each pair.",
+)
+@click.option("--workers", type=int, default=1, help="Number of processes to profile shards of lines with.")
+@click.option("--chunk_size", type=int, default=10000, help="Number of lines in each shard.")
+@click.option("--json_out", type=click.File("w"), default=None, help="Write the full profile as JSON to this file.")
+def statistics(entities_files, pairs, workers, chunk_size, json_out):
+    """Get statistics about NER entities in files. The files are read in parallel in a single pass."""
     log.info(f"Getting statistics")
-    counter = Counter()
-    for line in entities_file:
-        entities = [NERTag.from_str(a_str) for a_str in line.strip().split(" ") if a_str != ""]
-        counter.update([entity.tag for entity in entities])
-    for key, value in sorted(counter.items()):
-        click.echo(f"{key}\t{value}")
+    if pairs and len(entities_files) % 2 != 0:
+        raise click.BadParameter("An even number of files is required with --pairs.")
+    file_names = [entities_file.name for entities_file in entities_files]
+    profile = CorpusProfile.empty(len(entities_files), pairs)
+    chunks = ((chunk, pairs) for chunk in chunked_zip(entities_files, chunk_size))
+    for chunk_profile in tqdm(map_chunks(profile_chunk, chunks, workers)):
+        profile.merge(chunk_profile)
+    for file_name, file_profile in zip(file_names, profile.files):
+        if len(file_names) > 1:
+            click.echo(file_name)
+        for key, value in sorted(file_profile.tag_counts.items()):
+            click.echo(f"{key}\t{value}")
+        log.info(
+            f"{file_name}: lines={file_profile.lines}, lines_without_entities={file_profile.lines_without_entities}"
+        )
+    for idx, pair in enumerate(profile.pairs):
+        log.info(
+            f"{file_names[2 * idx]}-{file_names[2 * idx + 1]}: same_tag_counts={pair.lines_same_tag_counts}, "
+            f"kept_by_filter={pair.lines_kept_by_filter}/{pair.lines}"
+        )
+    if json_out:
+        json.dump(profile.to_dict(file_names), json_out, indent=2)
+
+
+@cli.command()
+@click.argument("index_dir", type=str)
+@click.argument("dataset_files", type=click.File("r"), nargs=-1, required=True)
+def build_provenance(index_dir, dataset_files):
+    """Build an index of which datasets contain each (cleaned) sentence, for `mt provenance`.
+    The dataset name is the file name up to the first dot."""
+    datasets = [os.path.basename(dataset_file.name).split(".")[0] for dataset_file in dataset_files]
+    index = ProvenanceIndex.build(datasets, [tqdm(dataset_file) for dataset_file in dataset_files])
+    index.save(index_dir)
+    log.info(f"Indexed {len(index)} unique sentences from {len(datasets)} datasets")
+
+
+@cli.command()
+@click.argument("index_dir", type=str)
+@click.argument("inp", type=click.File("r"))
+@click.argument("out", type=click.File("w"))
+@click.option("--chunk_size", type=int, default=10000, help="Number of lines looked up at once.")
+def provenance(index_dir, inp, out, chunk_size):
+    """Write the datasets which contain each line of the input, separated by a comma. Empty if none."""
+    index = ProvenanceIndex.load(index_dir)
+    found = 0
+    for lines in chunked(tqdm(inp), chunk_size):
+        for mask in index.lookup_masks(lines):
+            out.write(",".join(index.to_datasets(mask)) + "\n")
+            found += mask != 0
+    log.info(f"Found {found} lines in the datasets")
+
+
+@cli.command()
+@click.argument("names", type=click.File("r"))
+@click.argument("out", type=str)
+def build_declensions(names, out):
+    """Decline the names in NAMES, which has a gender (kk/kvk) and a name, tab separated, on each line,
+    using BÍN. The first names of full names are also declined. The table has the gender and the NF, ÞF, ÞGF and EF
+    forms of a name, tab separated, on each line and is used by correct --declensions and augment-names."""
+    table = DeclensionTable.build(read_names(names))
+    table.save(out)
+    log.info(f"Wrote {len(table)} names to {out}")
+
+
+@cli.command()
+@click.argument("src_embedded", type=click.File("r"))
+@click.argument("tgt_embedded", type=click.File("r"))
+@click.argument("names", type=str)
+@click.argument("src_out", type=click.File("w"))
+@click.argument("tgt_out", type=click.File("w"))
+@click.option("--num_variants", type=int, default=1, help="Number of variants to create of each sentence pair.")
+@click.option("--seed", type=int, default=1)
+@click.option(
+    "--max_distance",
+    type=float,
+    default=MAX_DISTANCE,
+    help="The maximum Jaro-Winkler distance between an IS person entity and the EN person entity it is paired with.",
+)
+@click.option("--workers", type=int, default=1, help="Number of processes to augment shards of lines with.")
+@click.option("--chunk_size", type=int, default=10000, help="Number of lines in each shard.")
+@click.option(
+    "--declensions_cache",
+    type=str,
+    default=None,
+    help="Where to cache the case forms of the names, as built by build-declensions. \
+Defaults to NAMES.declensions.tsv.",
+)
+def augment_names(
+    src_embedded,
+    tgt_embedded,
+    names,
+    src_out,
+    tgt_out,
+    num_variants,
+    seed,
+    max_distance,
+    workers,
+    chunk_size,
+    declensions_cache,
+):
+    """Create synthetic sentence pairs by replacing the person entities in IS (src) and EN (tgt) text,
+    embedded by `mt embed`, with random names. NAMES has a gender (kk/kvk) and a name, tab separated, on each line.
+    The IS names are declined to the case of the original name and the EN names are in nominative case.
+    The person entities of a pair are paired by Jaro-Winkler distance."""
+    table = load_or_build_table(names, declensions_cache or f"{names}.declensions.tsv")
+    chunks = chunked(enumerate(zip(src_embedded, tgt_embedded)), chunk_size)
+    augment = partial(augment_chunk_in_worker, num_variants=num_variants, seed=seed, max_distance=max_distance)
+    reasons: Counter = Counter()
+    # The table is given to each worker once, not pickled with every chunk.
+    for variants, chunk_reasons in tqdm(
+        map_chunks(augment, chunks, workers, initializer=set_worker_table, initargs=(table,))
+    ):
+        for src_line, tgt_line in variants:
+            src_out.write(src_line + "\n")
+            tgt_out.write(tgt_line + "\n")
+        reasons.update(chunk_reasons)
+    for reason, count in reasons.most_common():
+        log.info(f"{reason}: {count}")
 
 
 def read_ner_tags(file_stream: Iterable[str]) -> List[List[NERTag]]:
@@ -290,37 +978,80 @@ def normalize(entities_file, entities_file_normalized):
 @click.argument("ref_entities", type=click.File("r"))
 @click.argument("sys_entities", type=click.File("r"))
 @click.option("--tsv/--no-tsv", default=False)
-def eval(ref_text, sys_text, ref_entities, sys_entities, tsv):
-    sys_text = [line.strip() for line in sys_text]
-    ref_text = [line.strip() for line in ref_text]
-    # log.info(f"BLEU score: {sacrebleu.corpus_bleu(sys_text, [ref_text])}")
-    ref_entities = to_ner_markers(read_ner_tags(ref_entities), ref_text)
-    sys_entities = to_ner_markers(read_ner_tags(sys_entities), sys_text)
-    metrics: Dict[str, Dict[str, float]] = dict()
-    alignments = [
-        align_markers_by_jaro_winkler(ref_marker, sys_marker)
-        for ref_marker, sys_marker in zip(ref_entities, sys_entities)
-    ]
-    if alignments:
-        for group in ALL_GROUPS:
-            # We count maximum alignments based on the ref
-            upper_bound_ner_alignments = sum(
-                1 for markers in ref_entities for marker in markers if marker.tag == group or group == "all"
-            )
-            # Refs are marker_1
-            group_alignments = [
-                [alignment for alignment in s_alignment if alignment.marker_1.tag == group or group == "all"]
-                for s_alignment in alignments
-            ]
-            group_metrics = get_metrics(group_alignments, upper_bound_ner_alignments)
-            metrics[group] = group_metrics
-
-    else:
+@click.option(
+    "--alignment_strategy",
+    type=click.Choice(list(ALIGNMENT_STRATEGIES)),
+    default="all",
+    help="all: align all NEs of a line optimally. by_tag: only align NEs with the same tag, which is faster. "
+    f"by_tag_greedy: as by_tag, but align greedily when a tag has more than {GREEDY_ABOVE} pairs of NEs in a line.",
+)
+@click.option(
+    "--entity_keys",
+    type=click.Choice(KEY_MODES),
+    default="raw",
+    help="What NEs are aligned on. raw: the NEs as is. folded: casefolded and without diacritics. "
+    "lemmatized: also with name parts known to BÍN in nominative case.",
+)
+@click.option("--workers", type=int, default=1, help="Number of processes to evaluate shards of lines with.")
+@click.option("--chunk_size", type=int, default=10000, help="Number of lines in each shard.")
+@profile_out_option
+def eval(
+    ref_text,
+    sys_text,
+    ref_entities,
+    sys_entities,
+    tsv,
+    alignment_strategy,
+    entity_keys,
+    workers,
+    chunk_size,
+    profile_out,
+):
+    profiler = Profiler()
+    metrics = empty_metrics()
+    chunks = (
+        (chunk, alignment_strategy, entity_keys)
+        for chunk in chunked_zip([ref_text, sys_text, ref_entities, sys_entities], chunk_size)
+    )
+    for chunk_metrics, chunk_profiler in tqdm(map_chunks(evaluate_chunk, chunks, workers)):
+        merge_metrics(metrics, chunk_metrics)
+        profiler.merge(chunk_profiler)
+    if not profiler.counters["lines"]:
         raise ValueError("No alignments found")
     if tsv:
         click.echo(metric_values_to_tsv(metrics))
     else:
         log_metric_values(metrics)
+    profiler.write(profile_out)
+
+
+@cli.command()
+@click.argument("gold_entities", type=click.File("r"))
+@click.argument("pred_entities", type=click.File("r"))
+@click.option(
+    "--normalize/--no_normalize",
+    default=False,
+    help="Map the tags to the unified tag set before comparing, e.g. to compare EN and IS taggers.",
+)
+@click.option("--workers", type=int, default=1, help="Number of processes to count shards of lines with.")
+@click.option("--chunk_size", type=int, default=10000, help="Number of lines in each shard.")
+@click.option("--json_out", type=click.File("w"), default=None, help="Write the metrics as JSON to this file.")
+def ner_f1(gold_entities, pred_entities, normalize, workers, chunk_size, json_out):
+    """Span-level precision, recall and F1 per tag of predicted .ner spans against gold .ner spans.
+    A span is correct if its tag, start and end match."""
+    counts = SpanCounts()
+    chunks = ((chunk, normalize) for chunk in chunked_zip([gold_entities, pred_entities], chunk_size))
+    for chunk_counts in tqdm(map_chunks(span_counts_chunk, chunks, workers)):
+        counts.merge(chunk_counts)
+    metrics = counts.to_dict()
+    click.echo("tag\tprecision\trecall\tf1\tgold\tpred")
+    for tag, tag_metrics in metrics.items():
+        click.echo(
+            f"{tag}\t{tag_metrics['precision']:.4f}\t{tag_metrics['recall']:.4f}\t{tag_metrics['f1']:.4f}\t"
+            f"{tag_metrics['gold']}\t{tag_metrics['pred']}"
+        )
+    if json_out:
+        json.dump(metrics, json_out, indent=2)
 
 
 def metric_values_to_tsv(metrics):
@@ -424,7 +1155,20 @@ def show_examples(ref_text, sys_text, ref_entities, sys_entities, tag):
     "--corrections_tsv",
     type=str,
     default=None,
-    help="A filepath to a tsv with two columns containing corrections. First column is to match reference NE, second column is used to replace system NE.",
+    help="A filepath to a tsv with two columns containing corrections. First column is to match reference NE, second column is used to replace system NE. \
+Can also be a corrections index compiled with compile-corrections (.npz).",
+)
+@click.option(
+    "--match_inside_entities/--no_match_inside_entities",
+    default=False,
+    help="Also apply corrections whose key is found as whole words inside the reference NE.",
+)
+@click.option(
+    "--declensions",
+    type=str,
+    default=None,
+    help="A declension table built with build-declensions. Names in it are inflected to nominative case by lookup, \
+before BÍN.",
 )
 @click.option(
     "--corrections_idxs",
@@ -438,6 +1182,7 @@ def show_examples(ref_text, sys_text, ref_entities, sys_entities, tag):
     default=None,
     help="A filepath to save the updated (due to corrections) SYS NER markers.",
 )
+@profile_out_option
 def correct(
     ref_text,
     sys_text,
@@ -446,30 +1191,58 @@ def correct(
     sys_text_corrected,
     to_nominative_case,
     corrections_tsv,
+    match_inside_entities,
+    declensions,
     corrections_idxs,
     updated_sys_markers,
+    profile_out,
 ):
     """Correct the sys_text named entities according to options specified"""
-    sys_text = [line.strip() for line in sys_text]
-    ref_text = [line.strip() for line in ref_text]
-    # Read the NER tags and map them to NERMarkers
-    ref_markers = to_ner_markers(read_ner_tags(ref_entities), ref_text)
-    sys_markers = to_ner_markers(read_ner_tags(sys_entities), sys_text)
-    corrections = {}
+    profiler = Profiler()
+    with profiler.timer("reading"):
+        sys_text = [line.strip() for line in sys_text]
+        ref_text = [line.strip() for line in ref_text]
+        # Read the NER tags and map them to NERMarkers
+        ref_markers = to_ner_markers(read_ner_tags(ref_entities), ref_text)
+        sys_markers = to_ner_markers(read_ner_tags(sys_entities), sys_text)
+    corrections = None
+    corrections_index = None
     if corrections_tsv:
-        corrections = read_corrections(corrections_tsv)
-    correcter = Corrector(should_correct_to_nomintaive_case=to_nominative_case, corrections=corrections)
+        with profiler.timer("dictionary_loading"):
+            # Exact lookups only need the dictionary, the index is for matching inside entities.
+            if corrections_tsv.endswith(CorrectionsIndex.SUFFIX):
+                corrections_index = CorrectionsIndex.load(corrections_tsv)
+            else:
+                corrections = read_corrections(corrections_tsv)
+                if match_inside_entities:
+                    corrections_index = CorrectionsIndex.build(corrections)
+    declension_table = None
+    if declensions:
+        with profiler.timer("declensions_loading"):
+            declension_table = DeclensionTable.load(declensions)
+    correcter = Corrector(
+        should_correct_to_nomintaive_case=to_nominative_case,
+        corrections=corrections,
+        corrections_index=corrections_index,
+        match_inside_entities=match_inside_entities,
+        profiler=profiler,
+        declensions=declension_table,
+    )
     corrected_sys_text = []
     correct_idxs = []
     corrected_sys_markers = []
     for idx, (ref_line, sys_line, ref_marker, sys_marker) in enumerate(
         zip(ref_text, sys_text, ref_markers, sys_markers)
     ):
-        corrected_sys_line, updated_sys_marker, correction_result = correct_line(ref_line, sys_line, ref_marker, sys_marker, correcter)
+        corrected_sys_line, updated_sys_marker, correction_result = correct_line(
+            ref_line, sys_line, ref_marker, sys_marker, correcter
+        )
         corrected_sys_text.append(corrected_sys_line)
         corrected_sys_markers.append(updated_sys_marker)
         if correction_result == CorrectionResult.CORRECTED or correction_result == CorrectionResult.WAS_CORRECT:
             correct_idxs.append(idx)
+    profiler.count("lines", len(corrected_sys_text))
+    profiler.count("lines_correct", len(correct_idxs))
 
     sys_text_corrected.write("\n".join(corrected_sys_text))
     if corrections_idxs:
@@ -483,6 +1256,7 @@ def correct(
                 f.write(" ".join([NERTag.__repr__(tag) for tag in sent_ner_tag]) + "\n")
     log.info("Correction statistics")
     log.info(correcter.correction_statistics)
+    profiler.write(profile_out)
 
 
 def read_corrections(filepath: str) -> Dict[str, str]:
@@ -499,5 +1273,47 @@ def read_corrections(filepath: str) -> Dict[str, str]:
     return corrections
 
 
+def load_corrections_index(filepath: str) -> CorrectionsIndex:
+    """Load a compiled corrections index or build one from a corrections tsv."""
+    if filepath.endswith(CorrectionsIndex.SUFFIX):
+        return CorrectionsIndex.load(filepath)
+    return CorrectionsIndex.build(read_corrections(filepath))
+
+
+@cli.command()
+@click.argument("corrections_tsv", type=str)
+@click.argument("corrections_index", type=str)
+def compile_corrections(corrections_tsv, corrections_index):
+    """Compile a corrections tsv to an index (.npz) which loads quickly and can match keys inside NEs."""
+    if not corrections_index.endswith(CorrectionsIndex.SUFFIX):
+        raise click.BadParameter(f"The corrections index should end with {CorrectionsIndex.SUFFIX}")
+    log.info(f"Compiling corrections")
+    CorrectionsIndex.build(read_corrections(corrections_tsv)).save(corrections_index)
+
+
+@cli.command()
+@click.argument("text", type=click.File("r"))
+@click.argument("ner_entities", type=click.File("r"))
+@click.argument("missed_entities", type=click.File("w"))
+@click.option("--corrections_tsv", type=str, required=True, help="A corrections tsv or a compiled corrections index.")
+@click.option("--tag", type=str, default="P", help="The tag to give the entities found.")
+def find_dictionary_names(text, ner_entities, missed_entities, corrections_tsv, tag):
+    """Find keys of the corrections dictionary in the text which do not overlap the NER entities.
+    Writes the NERTags of the keys found, one line per line in the text."""
+    log.info(f"Finding dictionary names")
+    corrections_index = load_corrections_index(corrections_tsv)
+    found = 0
+    for line, ner_line in zip(tqdm(text), ner_entities):
+        sent_ner_tags = [NERTag.from_str(a_str) for a_str in ner_line.split()]
+        missed = [
+            NERTag(tag, start_idx, end_idx)
+            for start_idx, end_idx, _ in corrections_index.find_longest(line.strip())
+            if all(end_idx <= ner_tag.start_idx or ner_tag.end_idx <= start_idx for ner_tag in sent_ner_tags)
+        ]
+        found += len(missed)
+        missed_entities.write(" ".join([str(ner_tag) for ner_tag in missed]) + "\n")
+    log.info(f"Found {found} names missed by the NER")
+
+
 if __name__ == "__main__":
     cli()
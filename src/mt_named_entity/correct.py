@@ -6,7 +6,10 @@ from islenska import Bin
 from islenska.bindb import KsnidList
 
 from .align import align_markers_by_order
+from .declensions import DeclensionTable
+from .dictionary import CorrectionsIndex, find_word
 from .ner import NERMarker
+from .profiling import Profiler
 
 log = logging.getLogger(__name__)
 
@@ -33,14 +36,28 @@ class Corrector:
     """Applies corrections to NERMarkers and tracks statistics."""
 
     STATISTICS_DICTIONARY_KEY = "successful_dictionary_lookup"
+    STATISTICS_DICTIONARY_PARTIAL_KEY = "successful_partial_dictionary_lookup"
     STATISTICS_NOMINATIVE_CASE = "nominative_case_inflections"
 
-    def __init__(self, should_correct_to_nomintaive_case: bool, corrections: Optional[Dict[str, str]] = None) -> None:
+    def __init__(
+        self,
+        should_correct_to_nomintaive_case: bool,
+        corrections: Optional[Dict[str, str]] = None,
+        corrections_index: Optional[CorrectionsIndex] = None,
+        match_inside_entities: bool = False,
+        profiler: Optional[Profiler] = None,
+        declensions: Optional[DeclensionTable] = None,
+    ) -> None:
         self.b = Bin()
+        self.declensions = declensions
+        self.profiler = profiler if profiler else Profiler()
         self.should_correct_icelandic_to_nominative_case = should_correct_to_nomintaive_case
         self.corrections = corrections if corrections else {}
+        self.corrections_index = corrections_index
+        self.match_inside_entities = match_inside_entities
         self.correction_statistics = {
             self.STATISTICS_DICTIONARY_KEY: {correction_result: 0 for correction_result in CorrectionResult},
+            self.STATISTICS_DICTIONARY_PARTIAL_KEY: {correction_result: 0 for correction_result in CorrectionResult},
             self.STATISTICS_NOMINATIVE_CASE: {correction_result: 0 for correction_result in CorrectionResult},
         }
 
@@ -49,14 +66,24 @@ class Corrector:
     ) -> Tuple[str, CorrectionResult]:
         """Return the corrected marker_2 in the alignment. If no change is applied, return None."""
         # First we check if the src_ne is in the corrections dict and if so, we return the value
-        if src_ner_marker.named_entity in self.corrections:
-            correction = self.corrections[src_ner_marker.named_entity]
+        with self.profiler.timer("dictionary_lookup"):
+            correction = self._lookup_correction(src_ner_marker.named_entity)
+        if correction is not None:
             correction_result = CorrectionResult.WAS_CORRECT
             if tgt_ner_marker.named_entity != correction:
                 log.debug(f"Using corrections dictionary: {tgt_ner_marker.named_entity} -> {correction}")
                 correction_result = CorrectionResult.CORRECTED
             self.correction_statistics[self.STATISTICS_DICTIONARY_KEY][correction_result] += 1
             return correction, correction_result
+        # Then we check if dictionary entries are found inside the src_ne
+        if self.corrections_index is not None and self.match_inside_entities:
+            with self.profiler.timer("dictionary_lookup"):
+                correction, correction_result = self.correct_inside_entity(
+                    src_ner_marker.named_entity, tgt_ner_marker.named_entity
+                )
+            if correction_result != CorrectionResult.NO_CORRECTION:
+                self.correction_statistics[self.STATISTICS_DICTIONARY_PARTIAL_KEY][correction_result] += 1
+                return correction, correction_result
         # Otherwise we apply rules based on the tag
         if src_ner_marker.tag == "L":
             pass
@@ -67,7 +94,8 @@ class Corrector:
         elif src_ner_marker.tag == "P":
             # Otherwise we check if we should attempt to inflect the source_marker to nominative case.
             if self.should_correct_icelandic_to_nominative_case:
-                inflected_src_ne, correction_result = self.inflect_to_nominative_case(src_ner_marker.named_entity)
+                with self.profiler.timer("bin_lookup"):
+                    inflected_src_ne, correction_result = self.inflect_to_nominative_case(src_ner_marker.named_entity)
                 # We check if we were successfully to inflect to nominative case.
                 # This implies that the src_ne was an Icelandic Name.
                 # If so, we want to make sure that it is inflected to nominative case in TGT.
@@ -96,12 +124,43 @@ TGT={tgt_ner_marker.named_entity} -> {correction}."
             raise ValueError(f"Unknown tag: {src_ner_marker.tag}")
         return tgt_ner_marker.named_entity, CorrectionResult.NO_CORRECTION
 
+    def _lookup_correction(self, src_ne: str) -> Optional[str]:
+        """Return the dictionary correction of the whole src NE, if any."""
+        if src_ne in self.corrections:
+            return self.corrections[src_ne]
+        if self.corrections_index is not None:
+            return self.corrections_index.get(src_ne)
+        return None
+
+    def correct_inside_entity(self, src_ne: str, tgt_ne: str) -> Tuple[str, CorrectionResult]:
+        """Correct the tgt NE using dictionary keys found (as whole words) inside the src NE.
+        A key found in the src NE is replaced by its value where the key is also found in the tgt NE."""
+        assert self.corrections_index is not None
+        correction_result = CorrectionResult.NO_CORRECTION
+        correction = tgt_ne
+        for _, _, key_idx in self.corrections_index.find_longest(src_ne):
+            key, value = self.corrections_index.keys[key_idx], self.corrections_index.values[key_idx]
+            if find_word(correction, value) != -1:
+                correction_result = correction_result.gain(CorrectionResult.WAS_CORRECT)
+                continue
+            idx = find_word(correction, key)
+            if idx != -1:
+                log.debug(f"Using corrections dictionary inside NE: {key} -> {value} in {correction}")
+                correction = correction[:idx] + value + correction[idx + len(key) :]
+                correction_result = correction_result.gain(CorrectionResult.CORRECTED)
+        return correction, correction_result
+
     def inflect_to_nominative_case(self, src_ne: str) -> Tuple[str, CorrectionResult]:
         """Inflect the src NE to nominative case using BinPackage.
         Return the src_ne and the inflection result.
         If no change is applied, return the src_ne and CorrectionResult.NO_CORRECTION.
         If the src_ne is already in nominative case, return the src_ne and CorrectionResult.WAS_CORRECT.
         If the src_ne was inflected, return the inflected src_ne and CorrectionResult.CORRECTED."""
+        # Names in the declension table are looked up directly.
+        if self.declensions is not None:
+            nominative = self.declensions.nominative(src_ne)
+            if nominative is not None:
+                return nominative, CorrectionResult.WAS_CORRECT if nominative == src_ne else CorrectionResult.CORRECTED
         # We split the src_ne into words by whitespace and attempt to correct each word.
         original_src_ne = src_ne.split(" ")
         # We apply a simple heuristic to determine the src_ne gender
@@ -111,7 +170,7 @@ TGT={tgt_ner_marker.named_entity} -> {correction}."
         elif any([w.endswith("dóttir") or w.endswith("dóttur") for w in original_src_ne]):
             gender = "kvk"
         inflected_src_ne = [
-            self._inflect_using_bin(src_ne_part, case="NF", gender=gender, assume_uppercase=True)
+            self.inflect_using_bin(src_ne_part, case="NF", gender=gender, assume_uppercase=True)
             for src_ne_part in original_src_ne
         ]
         # We merge the lists - using the original words if the inflected word is None.
@@ -123,7 +182,7 @@ TGT={tgt_ner_marker.named_entity} -> {correction}."
 
         return " ".join(result), merged_correction_result
 
-    def _inflect_using_bin(
+    def inflect_using_bin(
         self, word: str, case: str = "NF", gender=None, assume_uppercase=True
     ) -> Tuple[str, CorrectionResult]:
         """Inflect the word using BinPackage.
@@ -222,31 +281,33 @@ def correct_line(
     """
     final_correction_result = CorrectionResult.NO_CORRECTION
     # Then we align the NEs in the source and target by order.
-    alignments = align_markers_by_order(src_markers, tgt_markers)
+    with corrector.profiler.timer("alignment"):
+        alignments = align_markers_by_order(src_markers, tgt_markers)
     # Then we correct the source and target lines by removing the wrong entities.
     corrections = [
         (alignment, corrector(src_line, tgt_line, alignment.marker_1, alignment.marker_2)) for alignment in alignments
     ]
-    # We order the corrections by the alignments' start_idx of the target_markers.
-    corrections.sort(key=lambda x: x[0].marker_2.start_idx)
-    total_sys_len_change = 0
-    updated_sys_markers = []
-    for alignment, (correction, correction_result) in corrections:
-        sys_len_change = len(correction) - len(alignment.marker_2.named_entity)
-        new_start = alignment.marker_2.start_idx + total_sys_len_change
-        new_end = alignment.marker_2.end_idx + total_sys_len_change + sys_len_change
-        # We correct the target line by replacing the wrong entities with the correct ones.
-        tgt_line = tgt_line[: new_start] + correction + tgt_line[new_start + len(alignment.marker_2.named_entity) :]
-        # We create new SYS NERMarkers which are based on the corrected target NEs.
-        updated_sys_markers.append(
-            NERMarker(
-                alignment.marker_2.tag,
-                new_start,
-                new_end,
-                correction,
+    with corrector.profiler.timer("string_rebuild"):
+        # We order the corrections by the alignments' start_idx of the target_markers.
+        corrections.sort(key=lambda x: x[0].marker_2.start_idx)
+        total_sys_len_change = 0
+        updated_sys_markers = []
+        for alignment, (correction, correction_result) in corrections:
+            sys_len_change = len(correction) - len(alignment.marker_2.named_entity)
+            new_start = alignment.marker_2.start_idx + total_sys_len_change
+            new_end = alignment.marker_2.end_idx + total_sys_len_change + sys_len_change
+            # We correct the target line by replacing the wrong entities with the correct ones.
+            tgt_line = tgt_line[: new_start] + correction + tgt_line[new_start + len(alignment.marker_2.named_entity) :]
+            # We create new SYS NERMarkers which are based on the corrected target NEs.
+            updated_sys_markers.append(
+                NERMarker(
+                    alignment.marker_2.tag,
+                    new_start,
+                    new_end,
+                    correction,
+                )
             )
-        )
-        total_sys_len_change += sys_len_change
+            total_sys_len_change += sys_len_change
 
-        final_correction_result = final_correction_result.gain(correction_result)
+            final_correction_result = final_correction_result.gain(correction_result)
     return tgt_line, updated_sys_markers, final_correction_result
@@ -0,0 +1,93 @@
+import heapq
+import logging
+import os
+import tempfile
+from collections import Counter
+from itertools import groupby
+from typing import IO, Iterable, Iterator, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+
+def _write_run(items: Iterable[Tuple[str, int]], tmp_dir: Optional[str]) -> str:
+    """Write (key, count) items to a temporary run file and return its path."""
+    fd, path = tempfile.mkstemp(prefix="mt_counts_", suffix=".run", dir=tmp_dir)
+    with os.fdopen(fd, "w") as run_file:
+        for key, count in items:
+            run_file.write(f"{key}\t{count}\n")
+    return path
+
+
+def _read_run(run_file: IO[str]) -> Iterator[Tuple[str, int]]:
+    """Read (key, count) items from a run file. The key may contain tabs."""
+    for line in run_file:
+        key, count = line.rstrip("\n").rsplit("\t", 1)
+        yield key, int(count)
+
+
+class ExternalCounter:
+    """Count string keys using a bounded in-memory hash map.
+    When the map holds more than max_keys keys it is spilled to a sorted run on disk.
+    The runs are merged when the counts are read."""
+
+    def __init__(self, max_keys: int = 1_000_000, tmp_dir: Optional[str] = None) -> None:
+        self.max_keys = max_keys
+        self.tmp_dir = tmp_dir
+        self.counts: Counter = Counter()
+        self.runs: List[str] = []
+
+    def update(self, counts: Counter):
+        self.counts.update(counts)
+        if len(self.counts) > self.max_keys:
+            self._spill()
+
+    def _spill(self):
+        log.debug(f"Spilling {len(self.counts)} keys to disk")
+        self.runs.append(_write_run(sorted(self.counts.items()), self.tmp_dir))
+        self.counts = Counter()
+
+    def items(self) -> Iterator[Tuple[str, int]]:
+        """Return all (key, count) items, sorted by key. Each key appears once."""
+        run_files = [open(path) for path in self.runs]
+        try:
+            merged = heapq.merge(*(_read_run(run_file) for run_file in run_files), sorted(self.counts.items()))
+            for key, group in groupby(merged, key=lambda item: item[0]):
+                yield key, sum(count for _, count in group)
+        finally:
+            for run_file in run_files:
+                run_file.close()
+
+    def most_common(self) -> Iterator[Tuple[str, int]]:
+        """Return all (key, count) items, sorted by decreasing count and then by key.
+        The sorting is done externally with runs of at most max_keys items."""
+        if not self.runs:
+            yield from sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+            return
+        by_count_runs = []
+        batch: List[Tuple[str, int]] = []
+        try:
+            for item in self.items():
+                batch.append(item)
+                if len(batch) >= self.max_keys:
+                    by_count_runs.append(_write_run(sorted(batch, key=lambda item: (-item[1], item[0])), self.tmp_dir))
+                    batch = []
+            run_files = [open(path) for path in by_count_runs]
+            try:
+                yield from heapq.merge(
+                    *(_read_run(run_file) for run_file in run_files),
+                    sorted(batch, key=lambda item: (-item[1], item[0])),
+                    key=lambda item: (-item[1], item[0]),
+                )
+            finally:
+                for run_file in run_files:
+                    run_file.close()
+        finally:
+            for path in by_count_runs:
+                os.remove(path)
+
+    def close(self):
+        """Remove the runs from disk."""
+        for path in self.runs:
+            os.remove(path)
+        self.runs = []
+        self.counts = Counter()
@@ -0,0 +1,161 @@
+import logging
+import os
+import re
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+
+from islenska import Bin
+
+if TYPE_CHECKING:
+    from .correct import Corrector
+
+log = logging.getLogger(__name__)
+
+# Nominative, accusative, dative and genitive, as in BÍN.
+CASES = ("NF", "ÞF", "ÞGF", "EF")
+GENDERS = ("kk", "kvk")
+# The parts of names in BÍN: first names, patronymics, matronymics and family names.
+NAME_PARTS = {"ism", "föð", "móð", "ætt"}
+SINGULAR_CASE = re.compile(r"^(NF|ÞF|ÞGF|EF)ET")
+
+# The case forms of a name, in the order of CASES.
+FORMS = Tuple[str, str, str, str]
+
+_bin: Optional[Bin] = None
+
+
+def get_bin() -> Bin:
+    """A BÍN instance per process."""
+    global _bin
+    if _bin is None:
+        _bin = Bin()
+    return _bin
+
+
+def decline_name(corrector: "Corrector", name: str, gender: str) -> Optional[FORMS]:
+    """Return the case forms of a name, or None if some word of it is not known or ambiguous in BÍN."""
+    # The Corrector uses the table, so it is imported here.
+    from .correct import CorrectionResult
+
+    forms = []
+    for case in CASES:
+        words = []
+        for word in name.split(" "):
+            inflected_word, result = corrector.inflect_using_bin(word, case=case, gender=gender, assume_uppercase=True)
+            if result not in (CorrectionResult.CORRECTED, CorrectionResult.WAS_CORRECT):
+                return None
+            words.append(inflected_word)
+        forms.append(" ".join(words))
+    return forms[0], forms[1], forms[2], forms[3]
+
+
+def detect_case(entity: str) -> Tuple[Optional[str], Set[str]]:
+    """Return the case of a name from its form, or None if it is ambiguous or unknown, and its possible genders.
+    Each word of the name restricts the possible cases, e.g. "Önnu" can be ÞF, ÞGF or EF but "Önnu Jónsdóttur"
+    is not NF."""
+    candidates: Optional[Set[Tuple[str, str]]] = None
+    for word in entity.split(" "):
+        _, analyses = get_bin().lookup_ksnid(word)
+        word_candidates = set()
+        for analysis in analyses:
+            match = SINGULAR_CASE.match(analysis.mark)
+            if analysis.ofl in GENDERS and analysis.hluti in NAME_PARTS and match is not None:
+                word_candidates.add((match.group(1), analysis.ofl))
+        if not word_candidates:
+            # Unknown words, e.g. foreign names, do not restrict the case.
+            continue
+        candidates = word_candidates if candidates is None else candidates & word_candidates
+    if not candidates:
+        return None, set()
+    cases = {case for case, _ in candidates}
+    if len(cases) != 1:
+        return None, set()
+    return cases.pop(), {gender for _, gender in candidates}
+
+
+class DeclensionTable:
+    """The case forms of names, by gender, with lookups from any case to nominative case and back."""
+
+    def __init__(self, names: Dict[str, List[FORMS]]) -> None:
+        self.names = names
+        self.by_nominative: Dict[str, FORMS] = {}
+        # A form which is a different name in some case, e.g. "Önnu" of both Anna and Önn, maps to None.
+        self.nominatives: Dict[str, Optional[str]] = {}
+        for all_forms in names.values():
+            for forms in all_forms:
+                self.by_nominative.setdefault(forms[0], forms)
+                for form in forms:
+                    if self.nominatives.get(form, forms[0]) != forms[0]:
+                        self.nominatives[form] = None
+                    else:
+                        self.nominatives[form] = forms[0]
+
+    def __len__(self) -> int:
+        return sum(len(forms) for forms in self.names.values())
+
+    def nominative(self, name: str) -> Optional[str]:
+        """Return the nominative case of a name in any case, or None if it is unknown or ambiguous."""
+        return self.nominatives.get(name)
+
+    def decline(self, name: str, case: str) -> Optional[str]:
+        """Return a name in nominative case in another case, or None if it is unknown."""
+        forms = self.by_nominative.get(name)
+        return forms[CASES.index(case)] if forms is not None else None
+
+    @staticmethod
+    def build(names: Iterable[Tuple[str, str]]) -> "DeclensionTable":
+        """Decline (gender, name) pairs using BÍN, and the first names of full names.
+        Names which cannot be declined are left out."""
+        from .correct import Corrector
+
+        corrector = Corrector(should_correct_to_nomintaive_case=True)
+        table: Dict[str, List[FORMS]] = {gender: [] for gender in GENDERS}
+        all_names = {}
+        for gender, name in names:
+            all_names[(gender, name)] = None
+            all_names[(gender, name.split(" ")[0])] = None
+        skipped = 0
+        for gender, name in all_names:
+            forms = decline_name(corrector, name, gender) if gender in table else None
+            if forms is None:
+                skipped += 1
+                continue
+            table[gender].append(forms)
+        log.info(f"Declined {sum(len(forms) for forms in table.values())} names, skipped {skipped}")
+        return DeclensionTable(table)
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            for gender, all_forms in self.names.items():
+                for forms in all_forms:
+                    f.write("\t".join((gender,) + forms) + "\n")
+
+    @staticmethod
+    def load(path: str) -> "DeclensionTable":
+        table: Dict[str, List[FORMS]] = {gender: [] for gender in GENDERS}
+        with open(path) as f:
+            for line in f:
+                gender, *forms = line.rstrip("\n").split("\t")
+                table[gender].append(tuple(forms))  # type: ignore
+        return DeclensionTable(table)
+
+
+def read_names(lines: Iterable[str]) -> List[Tuple[str, str]]:
+    """Read (gender, name) pairs, tab separated, as used by the patcher."""
+    names = []
+    for line in lines:
+        if line.strip() == "":
+            continue
+        gender, name = line.strip().split("\t")
+        names.append((gender, name))
+    return names
+
+
+def load_or_build_table(names_path: str, cache_path: str) -> DeclensionTable:
+    """Load the declension table from the cache, unless the names file is newer, in which case it is rebuilt."""
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(names_path):
+        log.info(f"Loading declensions from {cache_path}")
+        return DeclensionTable.load(cache_path)
+    with open(names_path) as f:
+        table = DeclensionTable.build(read_names(f))
+    table.save(cache_path)
+    return table
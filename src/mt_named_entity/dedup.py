@@ -0,0 +1,140 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from itertools import zip_longest
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .ner import NER_MODEL, NERTag, run_stages, subset_stages
+from .profiling import Profiler
+
+log = logging.getLogger(__name__)
+# The keys of the lines, the NERTags found without tagging and the keys of the lines to tag.
+DEDUP_STATE = Tuple[List[bytes], Dict[bytes, List[NERTag]], List[bytes]]
+# The NERTags of the lines, of which the reused ones are filled in, and the indices of the lines to tag.
+REUSE_STATE = Tuple[List[List[NERTag]], List[int]]
+
+
+def line_key(line: str) -> bytes:
+    """A short hash of a line, so that the cache does not hold the lines themselves."""
+    return hashlib.blake2b(line.encode("utf-8"), digest_size=16).digest()
+
+
+class DeduplicatingTagger:
+    """Wrap a NER model so that each distinct line is only tagged once and the NERTags are copied to the duplicates.
+    Lines are deduplicated within each batch and against a cache of the max_cache_lines most recently tagged lines.
+    With max_cache_lines=0 lines are only deduplicated within a batch."""
+
+    def __init__(self, model: NER_MODEL, max_cache_lines: int, profiler: Optional[Profiler] = None) -> None:
+        self.model = model
+        self.max_cache_lines = max_cache_lines
+        self.cache: "OrderedDict[bytes, List[NERTag]]" = OrderedDict()
+        # The first and last stage may run in different threads.
+        self.cache_lock = threading.Lock()
+        self.profiler = profiler if profiler else Profiler()
+
+    def __call__(self, batch: Iterable[str]) -> List[List[NERTag]]:
+        return run_stages(self.stages(), batch)
+
+    def stages(self) -> List[Callable]:
+        """Select the distinct uncached lines, run the stages of the model on them and copy the NERTags back.
+        When pipelined, a chunk may be selected before the previous chunk is cached and tag some lines again."""
+        return [self.select, *subset_stages(self.model), self.copy_back]
+
+    def select(self, batch: Iterable[str]) -> Tuple[DEDUP_STATE, Optional[List[str]]]:
+        lines = list(batch)
+        keys = [line_key(line) for line in lines]
+        found: Dict[bytes, List[NERTag]] = {}
+        to_tag: Dict[bytes, str] = {}
+        for key, line in zip(keys, lines):
+            if key in found or key in to_tag:
+                continue
+            with self.cache_lock:
+                ner_tags = self.cache.get(key)
+                if ner_tags is not None:
+                    self.cache.move_to_end(key)
+            if ner_tags is not None:
+                found[key] = ner_tags
+            else:
+                to_tag[key] = line
+        self.profiler.count("dedup_lines", len(lines))
+        self.profiler.count("dedup_lines_tagged", len(to_tag))
+        return (keys, found, list(to_tag)), list(to_tag.values()) if to_tag else None
+
+    def copy_back(self, item: Tuple[DEDUP_STATE, Optional[List[List[NERTag]]]]) -> List[List[NERTag]]:
+        (keys, found, tagged_keys), ner_tags = item
+        for key, line_ner_tags in zip(tagged_keys, ner_tags or []):
+            found[key] = line_ner_tags
+            self._cache(key, line_ner_tags)
+        return [found[key] for key in keys]
+
+    def _cache(self, key: bytes, ner_tags: List[NERTag]):
+        if self.max_cache_lines <= 0:
+            return
+        with self.cache_lock:
+            self.cache[key] = ner_tags
+            if len(self.cache) > self.max_cache_lines:
+                self.cache.popitem(last=False)
+
+    def log_summary(self):
+        lines = self.profiler.counters["dedup_lines"]
+        lines_tagged = self.profiler.counters["dedup_lines_tagged"]
+        if lines:
+            dedup_ratio = lines / max(lines_tagged, 1)
+            log.info(f"Tagged {lines_tagged} distinct lines out of {lines}, a dedup ratio of {dedup_ratio:.2f}")
+
+
+def read_previous_run(input_paths: Iterable[str], output_paths: Iterable[str]) -> Dict[bytes, str]:
+    """Map the lines of previously tagged inputs to the NER lines in their outputs."""
+    previous: Dict[bytes, str] = {}
+    for input_path, output_path in zip(input_paths, output_paths):
+        with open(input_path) as inp, open(output_path) as out:
+            for line, ner_line in zip_longest(inp, out):
+                if line is None or ner_line is None:
+                    raise ValueError(f"{input_path} and {output_path} have a different number of lines")
+                previous[line_key(line.rstrip("\n"))] = ner_line.strip()
+    log.info(f"Read {len(previous)} distinct previously tagged lines")
+    return previous
+
+
+class ReusingTagger:
+    """Wrap a NER model so that lines which were tagged in a previous run get the previous NERTags,
+    and only new or changed lines are tagged."""
+
+    def __init__(self, model: NER_MODEL, previous: Dict[bytes, str], profiler: Optional[Profiler] = None) -> None:
+        self.model = model
+        self.previous = previous
+        self.profiler = profiler if profiler else Profiler()
+
+    def __call__(self, batch: Iterable[str]) -> List[List[NERTag]]:
+        return run_stages(self.stages(), batch)
+
+    def stages(self) -> List[Callable]:
+        """Reuse the NERTags of the previous lines, run the stages of the model on the others and put them in order."""
+        return [self.select, *subset_stages(self.model), self.put_back]
+
+    def select(self, batch: Iterable[str]) -> Tuple[REUSE_STATE, Optional[List[str]]]:
+        lines = list(batch)
+        all_ner_tags: List[List[NERTag]] = [[] for _ in lines]
+        to_tag = []
+        for idx, line in enumerate(lines):
+            ner_line = self.previous.get(line_key(line.rstrip("\n")))
+            if ner_line is None:
+                to_tag.append(idx)
+            else:
+                all_ner_tags[idx] = [NERTag.from_str(a_str) for a_str in ner_line.split(" ") if a_str != ""]
+        self.profiler.count("reuse_lines", len(lines))
+        self.profiler.count("reuse_lines_tagged", len(to_tag))
+        return (all_ner_tags, to_tag), [lines[idx] for idx in to_tag] if to_tag else None
+
+    def put_back(self, item: Tuple[REUSE_STATE, Optional[List[List[NERTag]]]]) -> List[List[NERTag]]:
+        (all_ner_tags, to_tag), ner_tags = item
+        for idx, line_ner_tags in zip(to_tag, ner_tags or []):
+            all_ner_tags[idx] = line_ner_tags
+        return all_ner_tags
+
+    def log_summary(self):
+        lines = self.profiler.counters["reuse_lines"]
+        if lines:
+            reused = lines - self.profiler.counters["reuse_lines_tagged"]
+            log.info(f"Reused the previous NEs of {reused} out of {lines} lines, a reuse rate of {reused / lines:.1%}")
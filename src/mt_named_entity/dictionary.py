@@ -0,0 +1,193 @@
+import logging
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# The edges of the automaton are keyed by (node << CHAR_BITS) | ord(char). All of unicode fits in 21 bits.
+CHAR_BITS = 21
+NO_NODE = -1
+ROOT = 0
+KEY_SEPARATOR = "\n"
+
+# A match of a dictionary key in a text: (start_idx, end_idx, key_idx)
+Match = Tuple[int, int, int]
+
+
+def _is_boundary(text: str, idx: int) -> bool:
+    """Is the character index at a word boundary?"""
+    return idx <= 0 or idx >= len(text) or not (text[idx - 1].isalnum() and text[idx].isalnum())
+
+
+def find_word(text: str, word: str) -> int:
+    """Return the index of the first occurrence of word in text as a whole word, or -1."""
+    idx = text.find(word)
+    while idx != -1:
+        if _is_boundary(text, idx) and _is_boundary(text, idx + len(word)):
+            return idx
+        idx = text.find(word, idx + 1)
+    return -1
+
+
+def _split_keys(buffer: np.ndarray) -> List[str]:
+    """The inverse of joining the keys with KEY_SEPARATOR, where no keys give an empty buffer."""
+    if buffer.size == 0:
+        return []
+    return buffer.tobytes().decode("utf-8").split(KEY_SEPARATOR)
+
+
+class CorrectionsIndex:
+    """An Aho-Corasick automaton over the keys of a corrections dictionary.
+    The automaton is stored in flat numpy arrays so that it can be saved and loaded quickly."""
+
+    SUFFIX = ".npz"
+
+    def __init__(
+        self,
+        keys: List[str],
+        values: List[str],
+        edge_keys: np.ndarray,
+        edge_targets: np.ndarray,
+        fail: np.ndarray,
+        output: np.ndarray,
+        output_link: np.ndarray,
+    ) -> None:
+        self.keys = keys
+        self.values = values
+        # Sorted, for binary search.
+        self.edge_keys = edge_keys
+        self.edge_targets = edge_targets
+        # The longest proper suffix of a node which is also a node.
+        self.fail = fail
+        # The key index ending at a node, or NO_NODE.
+        self.output = output
+        # The next node on the fail chain which has an output, or NO_NODE.
+        self.output_link = output_link
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @staticmethod
+    def build(corrections: Dict[str, str]) -> "CorrectionsIndex":
+        """Build the automaton from a corrections dictionary."""
+        keys = [key for key in corrections if key != ""]
+        values = [corrections[key] for key in keys]
+        children: List[Dict[str, int]] = [{}]
+        output = [NO_NODE]
+        for key_idx, key in enumerate(keys):
+            node = ROOT
+            for char in key:
+                child = children[node].get(char)
+                if child is None:
+                    child = len(children)
+                    children[node][char] = child
+                    children.append({})
+                    output.append(NO_NODE)
+                node = child
+            output[node] = key_idx
+        # Breadth first, so the fail links of shorter prefixes are known.
+        fail = [ROOT] * len(children)
+        output_link = [NO_NODE] * len(children)
+        queue = deque(children[ROOT].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in children[node].items():
+                state = fail[node]
+                while state != ROOT and char not in children[state]:
+                    state = fail[state]
+                fail[child] = children[state].get(char, ROOT)
+                output_link[child] = fail[child] if output[fail[child]] != NO_NODE else output_link[fail[child]]
+                queue.append(child)
+        edges = sorted(
+            ((node << CHAR_BITS) | ord(char), child)
+            for node, node_children in enumerate(children)
+            for char, child in node_children.items()
+        )
+        log.info(f"Built a corrections index with {len(keys)} keys and {len(children)} nodes")
+        return CorrectionsIndex(
+            keys,
+            values,
+            np.array([edge for edge, _ in edges], dtype=np.int64),
+            np.array([child for _, child in edges], dtype=np.int32),
+            np.array(fail, dtype=np.int32),
+            np.array(output, dtype=np.int32),
+            np.array(output_link, dtype=np.int32),
+        )
+
+    def save(self, path: str):
+        """Save the index to a .npz file."""
+        np.savez(
+            path,
+            keys=np.frombuffer(KEY_SEPARATOR.join(self.keys).encode("utf-8"), dtype=np.uint8),
+            values=np.frombuffer(KEY_SEPARATOR.join(self.values).encode("utf-8"), dtype=np.uint8),
+            edge_keys=self.edge_keys,
+            edge_targets=self.edge_targets,
+            fail=self.fail,
+            output=self.output,
+            output_link=self.output_link,
+        )
+
+    @staticmethod
+    def load(path: str) -> "CorrectionsIndex":
+        """Load an index saved with save."""
+        with np.load(path) as arrays:
+            keys = _split_keys(arrays["keys"])
+            values = _split_keys(arrays["values"])
+            return CorrectionsIndex(
+                keys,
+                values,
+                arrays["edge_keys"],
+                arrays["edge_targets"],
+                arrays["fail"],
+                arrays["output"],
+                arrays["output_link"],
+            )
+
+    def _goto(self, node: int, char: str) -> int:
+        """Follow the edge from node with char, return NO_NODE if there is none."""
+        edge = (node << CHAR_BITS) | ord(char)
+        idx = int(np.searchsorted(self.edge_keys, edge))
+        if idx < len(self.edge_keys) and self.edge_keys[idx] == edge:
+            return int(self.edge_targets[idx])
+        return NO_NODE
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the value of a key, like dict.get."""
+        node = ROOT
+        for char in key:
+            node = self._goto(node, char)
+            if node == NO_NODE:
+                return None
+        key_idx = int(self.output[node])
+        return self.values[key_idx] if key_idx != NO_NODE else None
+
+    def find_all(self, text: str, whole_words: bool = True) -> List[Match]:
+        """Find all (possibly overlapping) occurrences of the keys in the text."""
+        matches = []
+        node = ROOT
+        for idx, char in enumerate(text):
+            next_node = self._goto(node, char)
+            while next_node == NO_NODE and node != ROOT:
+                node = int(self.fail[node])
+                next_node = self._goto(node, char)
+            node = next_node if next_node != NO_NODE else ROOT
+            match_node = node if self.output[node] != NO_NODE else int(self.output_link[node])
+            while match_node != NO_NODE:
+                key_idx = int(self.output[match_node])
+                start_idx = idx + 1 - len(self.keys[key_idx])
+                if not whole_words or (_is_boundary(text, start_idx) and _is_boundary(text, idx + 1)):
+                    matches.append((start_idx, idx + 1, key_idx))
+                match_node = int(self.output_link[match_node])
+        return matches
+
+    def find_longest(self, text: str, whole_words: bool = True) -> List[Match]:
+        """Find the leftmost-longest, non-overlapping occurrences of the keys in the text."""
+        matches = sorted(self.find_all(text, whole_words), key=lambda match: (match[0], -match[1]))
+        result: List[Match] = []
+        for match in matches:
+            if result and match[0] < result[-1][1]:
+                continue
+            result.append(match)
+        return result
@@ -1,9 +1,14 @@
 import logging
 from collections import Counter
-from typing import Dict, List
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from .align import NERAlignment
+from .align import ALIGNMENT_STRATEGIES, NERAlignment
+from .filter import ALL_TAGS
 from .ner import NERMarker
+from .normalization import with_keys
+from .profiling import Profiler
+from .stats import TagTuple, normalize_tag, parse_ner_line
 
 log = logging.getLogger(__name__)
 
@@ -12,6 +17,14 @@ UPPER_BOUND = "upper_bound"
 DISTANCE = "dist"
 MATCHES = "matches"
 ALL_METRICS = [ALIGNED, UPPER_BOUND, DISTANCE, MATCHES]
+ALL_GROUPS = ["all"] + ALL_TAGS
+# The metrics of each group. All the metrics are sums, so the metrics of shards can be added.
+GROUP_METRICS = Dict[str, Dict[str, float]]
+# A shard of (ref_text, sys_text, ref_entities, sys_entities) lines, the alignment strategy and the entity keys.
+EVAL_CHUNK = Tuple[List[Tuple[str, str, str, str]], str, str]
+
+# A span is packed into a single integer as (tag_idx, start_idx, end_idx), with SPAN_BITS for each index.
+SPAN_BITS = 24
 
 
 def get_markers_stats(ner_markers: List[List[NERMarker]]) -> Counter:
@@ -34,3 +47,130 @@ def get_metrics(alignments: List[List[NERAlignment]], upper_bound_ner_alignments
         DISTANCE: sum(dists),
         MATCHES: exact_match,
     }
+
+
+def empty_metrics() -> GROUP_METRICS:
+    return {group: {metric: 0 for metric in ALL_METRICS} for group in ALL_GROUPS}
+
+
+def merge_metrics(metrics: GROUP_METRICS, other: GROUP_METRICS):
+    for group in ALL_GROUPS:
+        for metric in ALL_METRICS:
+            metrics[group][metric] += other[group][metric]
+
+
+def to_markers(text: str, ner_line: str) -> List[NERMarker]:
+    text = text.strip()
+    tags = parse_ner_line(ner_line)
+    return [NERMarker(tag, start_idx, end_idx, text[start_idx:end_idx]) for tag, start_idx, end_idx in tags]
+
+
+def evaluate_chunk(args: EVAL_CHUNK) -> Tuple[GROUP_METRICS, Profiler]:
+    """Align the ref and sys NEs of a shard of lines and compute the metrics of each group."""
+    chunk, alignment_strategy, entity_keys = args
+    profiler = Profiler()
+    with profiler.timer("reading"):
+        ref_entities = [to_markers(ref_line, ref_ner_line) for ref_line, _, ref_ner_line, _ in chunk]
+        sys_entities = [to_markers(sys_line, sys_ner_line) for _, sys_line, _, sys_ner_line in chunk]
+    with profiler.timer("keys"):
+        ref_entities = [with_keys(ref_marker, entity_keys) for ref_marker in ref_entities]
+        sys_entities = [with_keys(sys_marker, entity_keys) for sys_marker in sys_entities]
+    profiler.count("lines", len(chunk))
+    align_markers = ALIGNMENT_STRATEGIES[alignment_strategy]
+    with profiler.timer("alignment"):
+        alignments = [
+            align_markers(ref_marker, sys_marker) for ref_marker, sys_marker in zip(ref_entities, sys_entities)
+        ]
+    metrics: GROUP_METRICS = {}
+    for group in ALL_GROUPS:
+        # We count maximum alignments based on the ref
+        upper_bound_ner_alignments = sum(
+            1 for markers in ref_entities for marker in markers if marker.tag == group or group == "all"
+        )
+        # Refs are marker_1
+        group_alignments = [
+            [alignment for alignment in s_alignment if alignment.marker_1.tag == group or group == "all"]
+            for s_alignment in alignments
+        ]
+        with profiler.timer("metrics"):
+            metrics[group] = get_metrics(group_alignments, upper_bound_ner_alignments)
+    return metrics, profiler
+
+
+def pack_spans(tags: List[TagTuple], tag_idxs: Dict[str, int]) -> List[int]:
+    """Pack the spans of a line into integers, adding unseen tags to tag_idxs."""
+    return [
+        tag_idxs.setdefault(tag, len(tag_idxs)) << 2 * SPAN_BITS | start_idx << SPAN_BITS | end_idx
+        for tag, start_idx, end_idx in tags
+    ]
+
+
+@dataclass
+class SpanCounts:
+    """True positive, false positive and false negative spans per tag, for span-level precision, recall and F1.
+    A predicted span is a true positive if the gold has the same tag, start and end. Counts of shards can be merged."""
+
+    true_positives: Counter = field(default_factory=Counter)
+    false_positives: Counter = field(default_factory=Counter)
+    false_negatives: Counter = field(default_factory=Counter)
+    # The tag of each packed tag index, which is only meaningful within these counts.
+    tag_idxs: Dict[str, int] = field(default_factory=dict, compare=False, repr=False)
+    idx_tags: List[str] = field(default_factory=list, compare=False, repr=False)
+
+    def update(self, gold_tags: List[TagTuple], pred_tags: List[TagTuple]):
+        """Count the spans of a line."""
+        gold = set(pack_spans(gold_tags, self.tag_idxs))
+        pred = set(pack_spans(pred_tags, self.tag_idxs))
+        if len(self.idx_tags) < len(self.tag_idxs):
+            self.idx_tags = list(self.tag_idxs)
+        for counter, spans in (
+            (self.true_positives, gold & pred),
+            (self.false_positives, pred - gold),
+            (self.false_negatives, gold - pred),
+        ):
+            for span in spans:
+                counter[self.idx_tags[span >> 2 * SPAN_BITS]] += 1
+
+    def merge(self, other: "SpanCounts"):
+        self.true_positives.update(other.true_positives)
+        self.false_positives.update(other.false_positives)
+        self.false_negatives.update(other.false_negatives)
+
+    def tags(self) -> List[str]:
+        return sorted(self.true_positives.keys() | self.false_positives.keys() | self.false_negatives.keys())
+
+    def precision_recall_f1(self, tags: Optional[Iterable[str]] = None) -> Tuple[float, float, float]:
+        """The micro-averaged precision, recall and F1 over the tags, all tags by default."""
+        tags = self.tags() if tags is None else list(tags)
+        true_positives = sum(self.true_positives[tag] for tag in tags)
+        precision = true_positives / max(1, true_positives + sum(self.false_positives[tag] for tag in tags))
+        recall = true_positives / max(1, true_positives + sum(self.false_negatives[tag] for tag in tags))
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
+        return precision, recall, f1
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {}
+        for name, tags in [("all", self.tags())] + [(tag, [tag]) for tag in self.tags()]:
+            precision, recall, f1 = self.precision_recall_f1(tags)
+            result[name] = {
+                "precision": precision,
+                "recall": recall,
+                "f1": f1,
+                "gold": sum(self.true_positives[tag] + self.false_negatives[tag] for tag in tags),
+                "pred": sum(self.true_positives[tag] + self.false_positives[tag] for tag in tags),
+            }
+        return result
+
+
+def span_counts_chunk(args: Tuple[List[Tuple[str, str]], bool]) -> SpanCounts:
+    """Count the spans in a chunk of (gold, pred) .ner lines, optionally with normalized tags."""
+    chunk, normalize = args
+    counts = SpanCounts()
+    for gold_line, pred_line in chunk:
+        gold_tags = parse_ner_line(gold_line)
+        pred_tags = parse_ner_line(pred_line)
+        if normalize:
+            gold_tags = [(normalize_tag(tag), start_idx, end_idx) for tag, start_idx, end_idx in gold_tags]
+            pred_tags = [(normalize_tag(tag), start_idx, end_idx) for tag, start_idx, end_idx in pred_tags]
+        counts.update(gold_tags, pred_tags)
+    return counts
@@ -1,5 +1,7 @@
 from typing import Counter, List, Tuple
 
+import numpy as np
+
 from mt_named_entity.ner import NERTag
 
 PER = "P"
@@ -49,9 +51,13 @@ SP_TAGS = {
 TAG_MAPPER = {**IS_TAGS, **HF_TAGS, **SP_TAGS}
 ALL_TAGS = [PER, LOC, ORG, MISC, DATE, TIME, MON, PERC]
 ALLOWED_TAGS = {PER, LOC, ORG}
+# Integer ids of the normalized tags, used for the columnar representation of NERTags.
+TAG_IDS = {tag: idx for idx, tag in enumerate(ALL_TAGS)}
 
 
-def filter_same_number_of_entity_types(src_NEs: List[NERTag], tgt_NEs: List[NERTag]) -> Tuple[List[NERTag], List[NERTag]]:
+def filter_same_number_of_entity_types(
+    src_NEs: List[NERTag], tgt_NEs: List[NERTag]
+) -> Tuple[List[NERTag], List[NERTag]]:
     """Filter translations by named entities types count. If the src and tgt do not contain the same number of NEs types for some type, that type is filtered out."""
     src_counter = Counter([tag.tag for tag in src_NEs])
     tgt_counter = Counter([tag.tag for tag in tgt_NEs])
@@ -62,6 +68,42 @@ def filter_same_number_of_entity_types(src_NEs: List[NERTag], tgt_NEs: List[NERT
     tgt_NEs = [tag for tag in tgt_NEs if tag.tag in allowed_tags and src_counter[tag.tag] == tgt_counter[tag.tag]]
     return src_NEs, tgt_NEs
 
+
+def to_columnar(ner_tags: List[List[NERTag]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Convert normalized NERTags of many lines to columnar arrays.
+    Return the tag ids of all the NERTags (flattened) and the offsets of each line into that array,
+    i.e. the tags of line i are tag_ids[offsets[i] : offsets[i + 1]]."""
+    tag_ids = np.fromiter((TAG_IDS[tag.tag] for line in ner_tags for tag in line), dtype=np.int8)
+    offsets = np.zeros(len(ner_tags) + 1, dtype=np.int64)
+    np.cumsum([len(line) for line in ner_tags], out=offsets[1:])
+    return tag_ids, offsets
+
+
+def _tag_histograms(tag_ids: np.ndarray, offsets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the line index of each tag and the per-line tag histogram (lines x tags)."""
+    num_lines = len(offsets) - 1
+    line_idxs = np.repeat(np.arange(num_lines, dtype=np.int64), np.diff(offsets))
+    histograms = np.bincount(line_idxs * len(ALL_TAGS) + tag_ids, minlength=num_lines * len(ALL_TAGS))
+    return line_idxs, histograms.reshape(num_lines, len(ALL_TAGS))
+
+
+def filter_same_number_of_entity_types_batch(
+    src_tag_ids: np.ndarray, src_offsets: np.ndarray, tgt_tag_ids: np.ndarray, tgt_offsets: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """A batched version of filter_same_number_of_entity_types which works on columnar tag ids, see to_columnar.
+    Return boolean masks over the src and tgt tag ids marking the NEs which survive the filtering."""
+    if len(src_offsets) != len(tgt_offsets):
+        raise ValueError(
+            f"The src and tgt should have the same number of lines. src={len(src_offsets) - 1}, tgt={len(tgt_offsets) - 1}"
+        )
+    src_line_idxs, src_histograms = _tag_histograms(src_tag_ids, src_offsets)
+    tgt_line_idxs, tgt_histograms = _tag_histograms(tgt_tag_ids, tgt_offsets)
+    # A tag type survives if it is present on both sides the same number of times.
+    # The counts of a present tag are positive, so equality implies presence in both.
+    same_count = src_histograms == tgt_histograms
+    return same_count[src_line_idxs, src_tag_ids], same_count[tgt_line_idxs, tgt_tag_ids]
+
+
 def map_named_entity_types(ner_tags: List[NERTag]) -> List[NERTag]:
     """Map named entities types. We map different system NE markers to a uniform format using TAG_MAPPER."""
     return [NERTag(TAG_MAPPER[tag.tag], tag.start_idx, tag.end_idx) for tag in ner_tags]
@@ -70,3 +112,32 @@ def map_named_entity_types(ner_tags: List[NERTag]) -> List[NERTag]:
 def filter_named_entity_types(ner_tags: List[NERTag]) -> List[NERTag]:
     """Filter named entities types. We only allow Organization, Location and Person."""
     return [tag for tag in ner_tags if tag.tag in ALLOWED_TAGS]
+
+
+def filter_ner_pair(src_NEs: List[NERTag], tgt_NEs: List[NERTag]) -> Tuple[List[NERTag], List[NERTag]]:
+    """Map the NEs of a sentence pair to the unified tag set, keep the allowed types and then the types which have the
+    same count on both sides. Return empty lists if the pair should be discarded."""
+    # We map the named entities to a unified format, so that we can use the same filter function.
+    src_NEs = filter_named_entity_types(map_named_entity_types(src_NEs))
+    tgt_NEs = filter_named_entity_types(map_named_entity_types(tgt_NEs))
+    if not src_NEs or not tgt_NEs:
+        return [], []
+    return filter_same_number_of_entity_types(src_NEs, tgt_NEs)
+
+
+def _apply_mask(ner_tags: List[List[NERTag]], mask: np.ndarray) -> List[List[NERTag]]:
+    """Keep the NERTags whose entry in the mask over the flattened NERTags is True."""
+    keep = iter(mask.tolist())
+    return [[tag for tag in line if next(keep)] for line in ner_tags]
+
+
+def filter_ner_pairs(
+    src_NEs: List[List[NERTag]], tgt_NEs: List[List[NERTag]]
+) -> Tuple[List[List[NERTag]], List[List[NERTag]]]:
+    """A batched version of filter_ner_pair for many sentence pairs, which counts the types of all pairs at once,
+    see filter_same_number_of_entity_types_batch. A pair should be discarded if its NEs are empty."""
+    src_NEs = [filter_named_entity_types(map_named_entity_types(ner_tags)) for ner_tags in src_NEs]
+    tgt_NEs = [filter_named_entity_types(map_named_entity_types(ner_tags)) for ner_tags in tgt_NEs]
+    # A pair with no NEs on one side keeps none on either, since no type has the same count on both sides.
+    src_mask, tgt_mask = filter_same_number_of_entity_types_batch(*to_columnar(src_NEs), *to_columnar(tgt_NEs))
+    return _apply_mask(src_NEs, src_mask), _apply_mask(tgt_NEs, tgt_mask)
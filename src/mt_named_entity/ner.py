@@ -1,17 +1,29 @@
 import logging
 import os
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Generator, Iterable, List, Tuple
+from functools import reduce
+from itertools import islice
+from typing import Any, Callable, Generator, Iterable, List, Optional, TextIO, Tuple
 
 import flair
 import torch
 from flair.data import Sentence
 from flair.models import SequenceTagger
 from greynirseq.cli.greynirseq import NER
-from tokenizer.tokenizer import split_into_sentences
+
+from .checkpoint import write_checkpoint
+from .parallel import chunked, pipeline
+from .profiling import Profiler
+from .tokenization import IcelandicTokenizer
 
 NER_RESULTS = Generator[Tuple[List[str], List[str], str], None, None]
+# A NER model maps lines to the NERTags found in each line.
+NER_MODEL = Callable[[Iterable[str]], List[List["NERTag"]]]
+# The lines and their tokens, and also their labels, as IS_NER passes them between stages.
+TOKENIZED = Tuple[List[str], List[List[str]]]
+LABELED = Tuple[List[str], List[List[str]], List[List[str]]]
 log = logging.getLogger(__name__)
 
 
@@ -38,6 +50,8 @@ class NERMarker(NERTag):
     """Hold a NER marker"""
 
     named_entity: str
+    # A normalized named_entity to align on, see normalization.with_keys. Empty if not computed.
+    key: str = field(default="", compare=False, repr=False)
 
     def __str__(self) -> str:
         return f"{self.tag}:{self.start_idx}:{self.end_idx}:{self.named_entity}"
@@ -54,55 +68,119 @@ class NERMarker(NERTag):
         return NERMarker(tag.tag, tag.start_idx, tag.end_idx, line[tag.start_idx : tag.end_idx])
 
 
+def quantize_for_cpu(module: torch.nn.Module, device: str) -> torch.nn.Module:
+    """Dynamically quantize the linear layers of a model to int8, which is faster and smaller on CPU."""
+    if device != "cpu":
+        raise ValueError(f"Quantized inference is only supported on cpu, not {device}")
+    log.info("Quantizing the linear layers of the model to int8")
+    return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+
+
 class EN_NER:
-    def __init__(self, device, batch_size):
+    def __init__(self, device, batch_size, profiler: Optional[Profiler] = None, cpu_optimized: bool = False):
         flair.device = torch.device(device)
         self.model: SequenceTagger = SequenceTagger.load("flair/ner-english-large")  # type: ignore
+        if cpu_optimized:
+            self.model = quantize_for_cpu(self.model, device)  # type: ignore
         self.batch_size = batch_size
+        self.profiler = profiler if profiler else Profiler()
 
     def __call__(self, batch: Iterable[str]) -> List[List[NERTag]]:
-        sentences = [Sentence(sent) for sent in batch]
-        self.model.predict(sentences, mini_batch_size=self.batch_size)
-        sentences_dict = list(map(lambda s: s.to_dict(tag_type="ner"), sentences))
-        for sent in sentences_dict:
-            for entity in sent["entities"]:
-                if len(entity["labels"]) > 1:
-                    log.error(f"Found two labels, be sure that they are in decreasing order:{entity['labels']}")
-        return [
-            [NERTag(entity["labels"][0].value, entity["start_pos"], entity["end_pos"]) for entity in sent["entities"]]
-            for sent in sentences_dict
-        ]
+        return self.finish(self.infer(self.prepare(batch)))
+
+    def stages(self) -> List[Callable]:
+        """The stages of __call__, which can be pipelined."""
+        return [self.prepare, self.infer, self.finish]
+
+    def prepare(self, batch: Iterable[str]) -> List[Sentence]:
+        with self.profiler.timer("tokenization"):
+            return [Sentence(sent) for sent in batch]
+
+    def infer(self, sentences: List[Sentence]) -> List[Sentence]:
+        with self.profiler.timer("inference"):
+            self.model.predict(sentences, mini_batch_size=self.batch_size)
+        return sentences
+
+    def finish(self, sentences: List[Sentence]) -> List[List[NERTag]]:
+        with self.profiler.timer("span_recovery"):
+            sentences_dict = list(map(lambda s: s.to_dict(tag_type="ner"), sentences))
+            for sent in sentences_dict:
+                for entity in sent["entities"]:
+                    if len(entity["labels"]) > 1:
+                        log.error(f"Found two labels, be sure that they are in decreasing order:{entity['labels']}")
+            return [
+                [
+                    NERTag(entity["labels"][0].value, entity["start_pos"], entity["end_pos"])
+                    for entity in sent["entities"]
+                ]
+                for sent in sentences_dict
+            ]
 
 
 class IS_NER:
-    def __init__(self, device, batch_size):
+    def __init__(
+        self,
+        device,
+        batch_size,
+        profiler: Optional[Profiler] = None,
+        cpu_optimized: bool = False,
+        tokenizer_workers: int = 0,
+        tokenization_cache_lines: int = 100_000,
+    ):
         self.model = NER(device, batch_size=batch_size, show_progress=True, max_input_words_split=100)
+        if cpu_optimized:
+            # The hub interface wraps the IceBERT model
+            self.model.model = quantize_for_cpu(self.model.model, device)
+        self.profiler = profiler if profiler else Profiler()
+        self.tokenizer = IcelandicTokenizer(
+            workers=tokenizer_workers, cache_lines=tokenization_cache_lines, profiler=self.profiler
+        )
 
     def __call__(self, input) -> List[List[NERTag]]:
         all_lines = [line.strip() for line in input]
-        all_tokens: List[List[str]] = []
-        for line in all_lines:
-            list_of_lines = list(split_into_sentences(line))
-            tokens = []
-            for a_line in list_of_lines:
-                tokens.extend(a_line.split(" "))
-            all_tokens.append(tokens)
-
         ner_tags = []
+        # With tokenizer workers, the next batch is tokenized while the model runs on this one.
+        for lines, all_tokens in self.tokenizer.tokenize_batches(all_lines):
+            ner_tags.extend(self.finish(self.infer((lines, all_tokens))))
+        return ner_tags
+
+    def close(self):
+        """Stop the tokenizer workers."""
+        self.tokenizer.close()
+
+    def stages(self) -> List[Callable]:
+        """The stages of __call__, which can be pipelined."""
+        return [self.prepare, self.infer, self.finish]
+
+    def prepare(self, input) -> TOKENIZED:
+        all_lines = [line.strip() for line in input]
+        all_tokens = [
+            tokens for _, batch_tokens in self.tokenizer.tokenize_batches(all_lines) for tokens in batch_tokens
+        ]
+        return all_lines, all_tokens
+
+    def infer(self, tokenized: TOKENIZED) -> LABELED:
+        all_lines, all_tokens = tokenized
         tmp_tokens_file = f"tmp_tokens_{datetime.now()}"
         tmp_labels_file = f"tmp_labels_{datetime.now()}"
-        with open(tmp_tokens_file, "w") as f_tokens:
-            for tokens in all_tokens:
-                f_tokens.write(" ".join(tokens) + "\n")
-        with open(tmp_tokens_file, "r") as f_tokens, open(tmp_labels_file, "w") as f_labels:
-            self.model.run(f_tokens, f_labels)
-        with open(tmp_labels_file, "r") as f_labels:
-            for line, labels, tokens in zip(all_lines, f_labels, all_tokens):
-                label_list = [label for label in labels.strip().split(" ") if label != ""]
-                ner_tags.append(self.remove_B(self.join_ner_tags(self.parse_ner_tags(line, tokens, label_list))))
+        with self.profiler.timer("inference"):
+            with open(tmp_tokens_file, "w") as f_tokens:
+                for tokens in all_tokens:
+                    f_tokens.write(" ".join(tokens) + "\n")
+            with open(tmp_tokens_file, "r") as f_tokens, open(tmp_labels_file, "w") as f_labels:
+                self.model.run(f_tokens, f_labels)
+            with open(tmp_labels_file, "r") as f_labels:
+                all_labels = [[label for label in labels.strip().split(" ") if label != ""] for labels in f_labels]
         os.remove(tmp_labels_file)
         os.remove(tmp_tokens_file)
-        return ner_tags
+        return all_lines, all_tokens, all_labels
+
+    def finish(self, labeled: LABELED) -> List[List[NERTag]]:
+        with self.profiler.timer("span_recovery"):
+            return [
+                self.remove_B(self.join_ner_tags(self.parse_ner_tags(line, tokens, label_list)))
+                for line, tokens, label_list in zip(*labeled)
+            ]
 
     @staticmethod
     def remove_B(ner_tags: List[NERTag]) -> List[NERTag]:
@@ -180,3 +258,125 @@ class IS_NER:
             start_idx = end_idx
             additional_length = 0
         return tags
+
+
+def load_ner_model(
+    lang: str,
+    device: str,
+    batch_size: int,
+    profiler: Optional[Profiler] = None,
+    cpu_optimized: bool = False,
+    tokenizer_workers: int = 0,
+) -> NER_MODEL:
+    """Load the NER model for the language."""
+    if lang == "en":
+        return EN_NER(device, batch_size, profiler=profiler, cpu_optimized=cpu_optimized)
+    return IS_NER(
+        device, batch_size, profiler=profiler, cpu_optimized=cpu_optimized, tokenizer_workers=tokenizer_workers
+    )
+
+
+def model_stages(model: NER_MODEL) -> List[Callable]:
+    """The stages of a model which can be pipelined, or the model as a single stage."""
+    stages = getattr(model, "stages", None)
+    return stages() if stages is not None else [model]
+
+
+def close_model(model: NER_MODEL):
+    """Release the resources of a model which has any, e.g. tokenizer workers or a connection."""
+    close = getattr(model, "close", None)
+    if close is not None:
+        close()
+
+
+def run_stages(stages: List[Callable], value: Any) -> Any:
+    """Run the stages one after another."""
+    return reduce(lambda value, stage: stage(value), stages, value)
+
+
+def subset_stages(model: NER_MODEL) -> List[Callable]:
+    """The stages of a model which a wrapper runs on a subset of its lines, between its own first stage,
+    which selects the subset, and last stage, which puts the NERTags back in order.
+    The stages pass (state, value) and leave the state of the wrapper as is. A value of None means that
+    the subset is empty, and the model is not run."""
+
+    def on_subset(stage: Callable) -> Callable[[Tuple[Any, Any]], Tuple[Any, Any]]:
+        def run(item: Tuple[Any, Any]) -> Tuple[Any, Any]:
+            state, value = item
+            return state, None if value is None else stage(value)
+
+        return run
+
+    return [on_subset(stage) for stage in model_stages(model)]
+
+
+# A chunk of (file_idx, line), the chunk as it passes through the model stages, and the time spent on it.
+CHUNK_IN_STAGES = Tuple[List[Tuple[int, str]], Any, float]
+
+
+def _timed_stage(stage: Callable) -> Callable[[CHUNK_IN_STAGES], CHUNK_IN_STAGES]:
+    def run(item: CHUNK_IN_STAGES) -> CHUNK_IN_STAGES:
+        chunk, value, seconds = item
+        start_time = time.perf_counter()
+        value = stage(value)
+        return chunk, value, seconds + time.perf_counter() - start_time
+
+    return run
+
+
+def tag_files(
+    model: NER_MODEL,
+    inputs: List[Iterable[str]],
+    outputs: List[TextIO],
+    chunk_size: int,
+    profiler: Optional[Profiler] = None,
+    skip_lines: Optional[List[int]] = None,
+    checkpoint_paths: Optional[List[str]] = None,
+    queue_size: int = 0,
+    file_done: Optional[Callable[[int], None]] = None,
+) -> List[Tuple[int, float]]:
+    """Tag the lines of all inputs with a single model and write the NERTags to the corresponding outputs.
+    Lines from consecutive files share chunks, so that small files do not leave batches half full.
+    The first skip_lines of each input are skipped, e.g. when resuming. If checkpoint_paths are given,
+    a checkpoint is written for each output after every chunk.
+    If queue_size > 0, reading, each stage of the model and writing run in separate threads,
+    with at most queue_size chunks waiting between them.
+    file_done is called with the index of each file, in order, once all its lines are written and checkpointed,
+    e.g. to close it.
+    Return the number of lines tagged in each file and the tagging time attributed to it."""
+    profiler = profiler if profiler else Profiler()
+    skip_lines = skip_lines if skip_lines else [0] * len(inputs)
+    lines_per_file = [0] * len(inputs)
+    seconds_per_file = [0.0] * len(inputs)
+    numbered_lines = (
+        (file_idx, line) for file_idx, inp in enumerate(inputs) for line in islice(inp, skip_lines[file_idx], None)
+    )
+    items = ((chunk, [line for _, line in chunk], 0.0) for chunk in chunked(numbered_lines, chunk_size))
+    stages = [_timed_stage(stage) for stage in model_stages(model)]
+    if queue_size > 0:
+        results = pipeline(items, stages, queue_size)
+    else:
+        results = (run_stages(stages, item) for item in items)
+    files_done = 0
+    for chunk, ner_tags, seconds in results:
+        # A chunk may span files, so its time is split by the number of lines.
+        seconds_per_line = seconds / len(chunk)
+        with profiler.timer("writing"):
+            for (file_idx, _), sent_ner_tag in zip(chunk, ner_tags):
+                outputs[file_idx].write(" ".join([str(tag) for tag in sent_ner_tag]) + "\n")
+                lines_per_file[file_idx] += 1
+                seconds_per_file[file_idx] += seconds_per_line
+                profiler.count("entities", len(sent_ner_tag))
+            if checkpoint_paths:
+                completed_lines = [skipped + tagged for skipped, tagged in zip(skip_lines, lines_per_file)]
+                write_checkpoint(outputs, checkpoint_paths, completed_lines)
+        profiler.count("lines", len(chunk))
+        # The files are read in order, so the files before the last one in the chunk are done.
+        if file_done:
+            while files_done < chunk[-1][0]:
+                file_done(files_done)
+                files_done += 1
+    if file_done:
+        for file_idx in range(files_done, len(inputs)):
+            file_done(file_idx)
+    return list(zip(lines_per_file, seconds_per_file))
@@ -0,0 +1,78 @@
+import logging
+from functools import reduce
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from .filter import filter_named_entity_types, filter_ner_pair, map_named_entity_types
+from .ner import NER_MODEL, NERTag
+from .parallel import chunked, pipeline
+from .profiling import Profiler
+
+log = logging.getLogger(__name__)
+
+# The src and tgt lines of a chunk, and the NERTags of each side once tagged.
+PAIR_CHUNK = Tuple[List[str], List[str], List[List[NERTag]], List[List[NERTag]]]
+# A sentence pair which survives the filtering, with its filtered NERTags.
+FILTERED_PAIR = Tuple[str, str, List[NERTag], List[NERTag]]
+
+
+def has_allowed_entities(ner_tags: List[NERTag]) -> bool:
+    """Whether the NERTags include a type which filter-text-by-ner keeps, i.e. a P, L or O."""
+    return bool(filter_named_entity_types(map_named_entity_types(ner_tags)))
+
+
+class ParallelTagger:
+    """Tag both sides of a parallel corpus, chunk by chunk, and filter the pairs as filter-text-by-ner does.
+    If skip_unmatched, the tgt side of a line is only tagged if the src side has entities which may survive
+    the filtering, which does not change the result."""
+
+    def __init__(
+        self,
+        src_model: NER_MODEL,
+        tgt_model: NER_MODEL,
+        skip_unmatched: bool = True,
+        profiler: Optional[Profiler] = None,
+    ) -> None:
+        self.src_model = src_model
+        self.tgt_model = tgt_model
+        self.skip_unmatched = skip_unmatched
+        self.profiler = profiler if profiler else Profiler()
+
+    def tag_src(self, chunk: PAIR_CHUNK) -> PAIR_CHUNK:
+        src_lines, tgt_lines, _, _ = chunk
+        return src_lines, tgt_lines, self.src_model(src_lines), []
+
+    def tag_tgt(self, chunk: PAIR_CHUNK) -> PAIR_CHUNK:
+        src_lines, tgt_lines, src_ner_tags, _ = chunk
+        idxs = list(range(len(tgt_lines)))
+        if self.skip_unmatched:
+            idxs = [idx for idx in idxs if has_allowed_entities(src_ner_tags[idx])]
+        tgt_ner_tags: List[List[NERTag]] = [[] for _ in tgt_lines]
+        if idxs:
+            for idx, ner_tags in zip(idxs, self.tgt_model([tgt_lines[idx] for idx in idxs])):
+                tgt_ner_tags[idx] = ner_tags
+        self.profiler.count("tgt_lines_skipped", len(tgt_lines) - len(idxs))
+        return src_lines, tgt_lines, src_ner_tags, tgt_ner_tags
+
+    def tag_and_filter(
+        self, pairs: Iterable[Tuple[str, str]], chunk_size: int, queue_size: int = 0
+    ) -> Iterator[FILTERED_PAIR]:
+        """Yield the pairs which survive the filtering, in order. If queue_size > 0, the src and tgt models
+        run in separate threads, so that the tgt side of a chunk is tagged while the src side of the next one is."""
+        items = (([src for src, _ in chunk], [tgt for _, tgt in chunk], [], []) for chunk in chunked(pairs, chunk_size))
+        stages = [self.tag_src, self.tag_tgt]
+        if queue_size > 0:
+            results = pipeline(items, stages, queue_size)
+        else:
+            results = (reduce(lambda item, stage: stage(item), stages, item) for item in items)
+        for src_lines, tgt_lines, all_src_ner_tags, all_tgt_ner_tags in results:
+            self.profiler.count("lines", len(src_lines))
+            with self.profiler.timer("filtering"):
+                kept = []
+                for src_line, tgt_line, src_ner_tags, tgt_ner_tags in zip(
+                    src_lines, tgt_lines, all_src_ner_tags, all_tgt_ner_tags
+                ):
+                    src_ner_tags, tgt_ner_tags = filter_ner_pair(src_ner_tags, tgt_ner_tags)
+                    if src_ner_tags:
+                        kept.append((src_line, tgt_line, src_ner_tags, tgt_ner_tags))
+            self.profiler.count("lines_kept", len(kept))
+            yield from kept
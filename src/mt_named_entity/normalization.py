@@ -0,0 +1,42 @@
+import unicodedata
+from dataclasses import replace
+from functools import lru_cache
+from typing import List
+
+from .declensions import GENDERS, NAME_PARTS, get_bin
+from .ner import NERMarker
+
+# Letters which do not decompose into a base letter and a diacritic.
+FOLDED_LETTERS = str.maketrans({"þ": "th", "ð": "d", "æ": "ae", "ø": "o", "ß": "ss"})
+KEY_MODES = ["raw", "folded", "lemmatized"]
+
+
+def fold(text: str) -> str:
+    """Casefold and remove diacritics, e.g. "Jónsson" -> "jonsson" and "Þórður" -> "thordur"."""
+    text = text.casefold().translate(FOLDED_LETTERS)
+    return "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+
+
+@lru_cache(maxsize=1_000_000)
+def lemmatize_name_part(word: str) -> str:
+    """Return the nominative case of a word which BÍN knows as a part of a name, e.g. "Jónssonar" -> "Jónsson".
+    Other and ambiguous words are returned as is."""
+    _, analyses = get_bin().lookup_ksnid(word)
+    lemmas = {analysis.ord for analysis in analyses if analysis.ofl in GENDERS and analysis.hluti in NAME_PARTS}
+    return lemmas.pop() if len(lemmas) == 1 else word
+
+
+def entity_key(entity: str, mode: str) -> str:
+    """The key of an entity which markers are aligned on, see KEY_MODES."""
+    if mode == "raw":
+        return entity
+    if mode == "lemmatized":
+        entity = " ".join(lemmatize_name_part(word) for word in entity.split(" "))
+    return fold(entity)
+
+
+def with_keys(ner_markers: List[NERMarker], mode: str) -> List[NERMarker]:
+    """Return the markers with their keys set, unless the mode is raw."""
+    if mode == "raw":
+        return ner_markers
+    return [replace(marker, key=entity_key(marker.named_entity, mode)) for marker in ner_markers]
@@ -4,7 +4,6 @@ from __future__ import annotations
 import argparse
 import logging
 import os
-import re
 from collections import defaultdict
 from dataclasses import asdict, dataclass
 from typing import Generator, Iterable, List, Optional, Tuple
@@ -15,6 +14,8 @@ from pyjarowinkler import distance
 from scipy.optimize import linear_sum_assignment
 from spacy.gold import offsets_from_biluo_tags
 
+from mt_named_entity.provenance import ProvenanceIndex, preprocess_sentence
+
 nlp = spacy.load("en_core_web_lg")
 log = logging.getLogger(__name__)
 
@@ -78,14 +79,6 @@ class NERAnalyser:
     DATA_PATHS_IS = ["/data/datasets/{0}/clean/train/{0}.en-is.train.is".format(dataset) for dataset in DATASETS]
     DATA_PATHS_EN = ["/data/datasets/{0}/clean/train/{0}.en-is.train.en".format(dataset) for dataset in DATASETS]
     DATA_PATHS = DATA_PATHS_IS + DATA_PATHS_EN
-    # For cleaning
-    PUNCTUATION_SYMBOLS = (
-        "'ʼ∞¥≈€∂‧Ω÷‐℉†℃‛″£™∙§«»@¯^!½³²˜−{$¼¹≠}º‗®‑#¡´&`|·≥―′¿<≤~?±" '…\\>”_+][°–=*"‘%„“;:-•(),…–`-—!’?;“”:.,'
-    )
-    DIGIT_PROG = re.compile(r"\d+")
-    PUNCT_PROG = re.compile("[" + re.escape(PUNCTUATION_SYMBOLS) + "]")
-    SPACE_PROG = re.compile(r"\s+")
-
     # For statistics
     stats = {
         dataset: {
@@ -101,9 +94,12 @@ class NERAnalyser:
         for dataset in DATASETS + ["mixup"]
     }
 
-    def __init__(self) -> None:
+    def __init__(self, provenance_index: Optional[str] = None) -> None:
         """Initialize counters and stuff."""
         self.provenance_sets = {path: set() for path in self.DATA_PATHS}
+        # A directory with an index built by `mt build-provenance`, instead of the provenance sets.
+        self.provenance_index_dir = provenance_index
+        self.provenance_index: Optional[ProvenanceIndex] = None
         self.ner_hist_1 = defaultdict(int)
         self.ner_hist_2 = defaultdict(int)
         self.ner_pair_hist = defaultdict(int)
@@ -117,14 +113,14 @@ class NERAnalyser:
         Remove all punctuation.
         Remove all multiple spaces.
         """
-        sentence = sentence.lower()
-        sentence = NERAnalyser.DIGIT_PROG.sub("0", sentence)
-        sentence = NERAnalyser.PUNCT_PROG.sub("", sentence)
-        sentence = NERAnalyser.SPACE_PROG.sub("", sentence)
-        return sentence
+        return preprocess_sentence(sentence)
 
     def load_provenance(self):
         """Load the provenance set, i.e. for each dataset we clean the sentences and store uniques."""
+        if self.provenance_index_dir is not None:
+            log.info("Loading provenance index.")
+            self.provenance_index = ProvenanceIndex.load(self.provenance_index_dir)
+            return
         log.info("Loading provenance sets.")
         for path in self.provenance_sets:
             if not os.path.exists(path):
@@ -136,6 +132,8 @@ class NERAnalyser:
 
     def check_provenance(self, sentence: str) -> List[str]:
         """Return a list datasets the cleaned sentence is present in."""
+        if self.provenance_index is not None:
+            return self.provenance_index.lookup(sentence)
         hits = []
         cleaned_sentence = self.preprocess_sentence(sentence)
         for path in self.provenance_sets:
@@ -478,6 +476,7 @@ def main():
     parser.add_argument("--en_ent")
     parser.add_argument("--output")
     parser.add_argument("--provenance", type=bool, default=False)
+    parser.add_argument("--provenance_index", default=None, help="An index built with `mt build-provenance`.")
     parser.add_argument("--name_histograms", type=bool, default=False)
 
     args = parser.parse_args()
@@ -487,7 +486,7 @@ def main():
 
     provenance = None
     if args.provenance:
-        provenance = NERAnalyser()
+        provenance = NERAnalyser(provenance_index=args.provenance_index)
         provenance.load_provenance()
         # TODO: fix print_stats
         # eval_ner.print_stats()
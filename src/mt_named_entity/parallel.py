@@ -0,0 +1,126 @@
+import logging
+import queue
+import threading
+from itertools import islice
+from multiprocessing import Pool
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def chunked(lines: Iterable[T], chunk_size: int) -> Iterator[List[T]]:
+    """Split an iterable into lists of chunk_size elements. The last chunk may be smaller."""
+    iterator = iter(lines)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+
+def chunked_zip(files: Iterable[Iterable[str]], chunk_size: int) -> Iterator[List[Tuple[str, ...]]]:
+    """Read aligned lines from multiple files and split them into chunks of chunk_size line tuples."""
+    return chunked(zip(*files), chunk_size)
+
+
+def map_chunks(
+    func: Callable[[T], R],
+    chunks: Iterable[T],
+    workers: int,
+    initializer: Optional[Callable[..., None]] = None,
+    initargs: Tuple = (),
+) -> Iterator[R]:
+    """Apply func to each chunk, in order. If workers > 1 the chunks are processed by a pool of processes.
+    func must be picklable, i.e. defined at module level.
+    initializer(*initargs) is called once in each process before any chunk, e.g. to set data which is too large
+    to send with every chunk."""
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        yield from map(func, chunks)
+        return
+    log.info(f"Using {workers} worker processes")
+    with Pool(workers, initializer=initializer, initargs=initargs) as pool:
+        # We keep the input lazy and the output ordered.
+        yield from pool.imap(func, chunks)
+
+
+class _Failure:
+    """An exception raised in a pipeline stage, passed on to the consumer."""
+
+    def __init__(self, exception: Exception) -> None:
+        self.exception = exception
+
+
+_DONE = object()
+# How often blocked stages check whether the consumer has stopped.
+_POLL_SECONDS = 0.1
+
+
+def pipeline(items: Iterable, stages: List[Callable], queue_size: int) -> Iterator:
+    """Iterate over the items and apply each stage in its own thread, with bounded queues between the threads.
+    The output is in the order of the items. A full queue blocks the stages before it, which bounds the memory.
+    An exception in any stage is raised in the consumer."""
+    queues: List[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    stopped = threading.Event()
+
+    def put(out_queue: queue.Queue, item) -> bool:
+        while not stopped.is_set():
+            try:
+                out_queue.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(in_queue: queue.Queue):
+        while not stopped.is_set():
+            try:
+                return in_queue.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def read():
+        try:
+            for item in items:
+                if not put(queues[0], item):
+                    return
+        except Exception as e:
+            put(queues[0], _Failure(e))
+            return
+        put(queues[0], _DONE)
+
+    def run_stage(stage: Callable, in_queue: queue.Queue, out_queue: queue.Queue):
+        while True:
+            item = get(in_queue)
+            if item is _DONE or isinstance(item, _Failure):
+                put(out_queue, item)
+                return
+            try:
+                result = stage(item)
+            except Exception as e:
+                put(out_queue, _Failure(e))
+                return
+            if not put(out_queue, result):
+                return
+
+    threads = [threading.Thread(target=read, daemon=True)] + [
+        threading.Thread(target=run_stage, args=(stage, queues[idx], queues[idx + 1]), daemon=True)
+        for idx, stage in enumerate(stages)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Failure):
+                raise item.exception
+            yield item
+    finally:
+        # Also stops the threads if the consumer stops early.
+        stopped.set()
+        for thread in threads:
+            thread.join()
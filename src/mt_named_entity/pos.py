@@ -0,0 +1,103 @@
+import logging
+from typing import List, Optional, Tuple
+
+from greynirseq.cli.greynirseq import POS
+
+from .align import align_markers_by_jaro_winkler
+from .declensions import CASES
+from .ner import IS_NER, NERMarker, NERTag, quantize_for_cpu
+from .parallel import chunked
+from .profiling import Profiler
+from .tokenization import IcelandicTokenizer
+
+log = logging.getLogger(__name__)
+
+# The case letter of a noun in an IFD tag, e.g. "nkeþ-s", and the corresponding BÍN case.
+IFD_CASES = {"n": CASES[0], "o": CASES[1], "þ": CASES[2], "e": CASES[3]}
+
+
+def ifd_case(pos_tag: str) -> Optional[str]:
+    """Return the case of a noun from its IFD tag, or None if it is not a noun, e.g. "e" for foreign names."""
+    if not pos_tag.startswith("n") or len(pos_tag) < 4:
+        return None
+    return IFD_CASES.get(pos_tag[3])
+
+
+def aligned_persons(is_markers: List[NERMarker], en_markers: List[NERMarker], max_distance: float) -> List[NERMarker]:
+    """Return the IS person entities which are aligned to an EN entity within max_distance, in order."""
+    alignments = align_markers_by_jaro_winkler(en_markers, is_markers)
+    persons = [
+        alignment.marker_2
+        for alignment in alignments
+        if alignment.marker_2.tag == "P" and alignment.distance is not None and alignment.distance <= max_distance
+    ]
+    return sorted(persons, key=lambda marker: marker.start_idx)
+
+
+def token_start_idxs(line: str, tokens: List[str]) -> List[int]:
+    """The character offset of each token in the line."""
+    return [tag.start_idx for tag in IS_NER.parse_ner_tags(line, tokens, ["T"] * len(tokens))]
+
+
+def tags_at_entities(line: str, tokens: List[str], pos_tags: List[str], entities: List[NERTag]) -> List[str]:
+    """Return the POS tag of the first token of each entity."""
+    start_idxs = token_start_idxs(line, tokens)
+    entity_tags = []
+    for entity in entities:
+        # The token containing the start of the entity
+        token_idx = max(sum(1 for start_idx in start_idxs if start_idx <= entity.start_idx) - 1, 0)
+        entity_tags.append(pos_tags[token_idx])
+    return entity_tags
+
+
+class IS_POS:
+    """Tag Icelandic lines with IFD POS tags. The lines in a call are sorted by length into batches,
+    so that little padding is needed, which matters most on CPU."""
+
+    def __init__(
+        self,
+        device,
+        batch_size,
+        profiler: Optional[Profiler] = None,
+        cpu_optimized: bool = False,
+        tokenizer_workers: int = 0,
+    ):
+        self.model = POS(device, batch_size=batch_size, show_progress=False, max_input_words_split=100)
+        if cpu_optimized:
+            self.model.model = quantize_for_cpu(self.model.model, device)
+        self.batch_size = batch_size
+        self.profiler = profiler if profiler else Profiler()
+        self.tokenizer = IcelandicTokenizer(workers=tokenizer_workers, profiler=self.profiler)
+
+    def __call__(self, lines: List[str]) -> Tuple[List[List[str]], List[List[str]]]:
+        """Return the tokens of each line and their POS tags."""
+        all_tokens = [
+            [token for token in tokens if token != ""]
+            for _, batch_tokens in self.tokenizer.tokenize_batches(lines)
+            for tokens in batch_tokens
+        ]
+        all_pos_tags: List[List[str]] = [[] for _ in lines]
+        order = sorted(range(len(lines)), key=lambda idx: len(all_tokens[idx]))
+        with self.profiler.timer("inference"):
+            for batch_idxs in chunked(order, self.batch_size):
+                batch_pos_tags = self.model.infer([" ".join(all_tokens[idx]) for idx in batch_idxs])
+                for idx, pos_tags in zip(batch_idxs, batch_pos_tags):
+                    all_pos_tags[idx] = pos_tags
+        return all_tokens, all_pos_tags
+
+    def tag_entities(self, lines: List[str], all_entities: List[List[NERTag]]) -> List[List[str]]:
+        """Return the POS tag of the first token of each entity. Only lines with entities are tagged."""
+        idxs = [idx for idx, entities in enumerate(all_entities) if entities]
+        all_entity_tags: List[List[str]] = [[] for _ in lines]
+        all_tokens, all_pos_tags = self([lines[idx] for idx in idxs])
+        for idx, tokens, pos_tags in zip(idxs, all_tokens, all_pos_tags):
+            if len(tokens) != len(pos_tags):
+                log.error(f"Number of tokens and POS tags are not equal: {tokens} {pos_tags}. Skipping the line")
+                continue
+            all_entity_tags[idx] = tags_at_entities(lines[idx], tokens, pos_tags, all_entities[idx])
+        self.profiler.count("pos_lines_tagged", len(idxs))
+        return all_entity_tags
+
+    def close(self):
+        """Stop the tokenizer workers."""
+        self.tokenizer.close()
@@ -0,0 +1,122 @@
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .ner import NER_MODEL, NERTag, run_stages, subset_stages
+from .profiling import Profiler
+
+log = logging.getLogger(__name__)
+# The lines, the indices of the lines to tag or check and the indices of the lines to check.
+PREFILTER_STATE = Tuple[List[str], List[int], Set[int]]
+
+
+def is_empty(line: str) -> bool:
+    return line.strip() == ""
+
+
+def has_no_letters(line: str) -> bool:
+    """E.g. numbers and punctuation only."""
+    return not any(char.isalpha() for char in line)
+
+
+def is_lowercase(line: str) -> bool:
+    """No uppercase letters at all. Entities are nearly always capitalized in both English and Icelandic."""
+    return not any(char.isupper() for char in line)
+
+
+def has_no_capitalized_after_first(line: str) -> bool:
+    """No token after the first starts with an uppercase letter. Misses entities at the start of a line."""
+    return not any(token[:1].isupper() for token in line.split()[1:])
+
+
+# Rules which decide that a line cannot contain an entity, by name. The first three are safe, the last is not.
+RULES: Dict[str, Callable[[str], bool]] = {
+    "empty": is_empty,
+    "no_letters": has_no_letters,
+    "lowercase": is_lowercase,
+    "no_capitalized_after_first": has_no_capitalized_after_first,
+}
+DEFAULT_RULES = ["empty", "no_letters", "lowercase"]
+
+
+def parse_rules(rules: str) -> List[str]:
+    """Parse comma separated rule names."""
+    names = [name.strip() for name in rules.split(",") if name.strip() != ""]
+    for name in names:
+        if name not in RULES:
+            raise ValueError(f"Unknown prefilter rule: {name}. Known rules are {', '.join(RULES)}")
+    return names
+
+
+class PrefilteringTagger:
+    """Wrap a NER model so that lines which match any of the rules get no NERTags without running the model.
+    To check the rules, the first check_lines skipped lines are tagged anyway and the skipped lines in which
+    the model finds entities are counted. Checked lines still get no NERTags, so the output does not depend
+    on check_lines."""
+
+    def __init__(
+        self, model: NER_MODEL, rules: List[str], check_lines: int = 0, profiler: Optional[Profiler] = None
+    ) -> None:
+        self.model = model
+        self.rules = [(name, RULES[name]) for name in rules]
+        self.check_lines = check_lines
+        self.profiler = profiler if profiler else Profiler()
+
+    def skipped_by(self, line: str) -> Optional[str]:
+        """Return the name of the first rule which matches the line, if any."""
+        for name, rule in self.rules:
+            if rule(line):
+                return name
+        return None
+
+    def __call__(self, batch: Iterable[str]) -> List[List[NERTag]]:
+        return run_stages(self.stages(), batch)
+
+    def stages(self) -> List[Callable]:
+        """Select the lines to tag and check, run the stages of the model on them and put the NERTags in order."""
+        return [self.select, *subset_stages(self.model), self.put_back]
+
+    def select(self, batch: Iterable[str]) -> Tuple[PREFILTER_STATE, Optional[List[str]]]:
+        lines = list(batch)
+        to_tag = []
+        to_check = []
+        with self.profiler.timer("prefilter"):
+            for idx, line in enumerate(lines):
+                rule = self.skipped_by(line)
+                if rule is None:
+                    to_tag.append(idx)
+                    continue
+                self.profiler.count(f"prefilter_skipped_{rule}")
+                if self.profiler.counters["prefilter_checked"] < self.check_lines:
+                    self.profiler.count("prefilter_checked")
+                    to_check.append(idx)
+        self.profiler.count("prefilter_lines", len(lines))
+        self.profiler.count("prefilter_lines_tagged", len(to_tag))
+        idxs = sorted(to_tag + to_check)
+        return (lines, idxs, set(to_check)), [lines[idx] for idx in idxs] if idxs else None
+
+    def put_back(self, item: Tuple[PREFILTER_STATE, Optional[List[List[NERTag]]]]) -> List[List[NERTag]]:
+        (lines, idxs, checked), ner_tags = item
+        all_ner_tags: List[List[NERTag]] = [[] for _ in lines]
+        for idx, line_ner_tags in zip(idxs, ner_tags or []):
+            if idx not in checked:
+                all_ner_tags[idx] = line_ner_tags
+            elif line_ner_tags:
+                self.profiler.count("prefilter_checked_with_entities")
+                log.debug(f"A skipped line has entities: {lines[idx].strip()} {line_ner_tags}")
+        return all_ner_tags
+
+    def log_summary(self):
+        lines = self.profiler.counters["prefilter_lines"]
+        if not lines:
+            return
+        skipped = lines - self.profiler.counters["prefilter_lines_tagged"]
+        log.info(f"Skipped {skipped} of {lines} lines ({skipped / lines:.1%}) with the prefilter")
+        for name, _ in self.rules:
+            log.info(f"{name}: {self.profiler.counters[f'prefilter_skipped_{name}']} lines")
+        checked = self.profiler.counters["prefilter_checked"]
+        if checked:
+            with_entities = self.profiler.counters["prefilter_checked_with_entities"]
+            log.info(
+                f"The model found entities in {with_entities} of {checked} checked skipped lines, "
+                f"an accuracy of {1 - with_entities / checked:.1%}"
+            )
@@ -0,0 +1,95 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, DefaultDict, Dict, Iterator, Optional
+
+log = logging.getLogger(__name__)
+
+
+class Profiler:
+    """Collects wall-clock timings of named stages and counters. Safe to use from multiple threads.
+    Stages may overlap (e.g. when pipelined) so their times do not necessarily sum to the total."""
+
+    def __init__(self) -> None:
+        self.start_time = time.perf_counter()
+        self.timings: DefaultDict[str, float] = defaultdict(float)
+        self.calls: Counter = Counter()
+        self.counters: Counter = Counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Time the block and add it to the stage."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start_time
+            with self._lock:
+                self.timings[stage] += elapsed
+                self.calls[stage] += 1
+
+    def add_time(self, stage: str, seconds: float):
+        """Add time measured elsewhere, e.g. in a worker process, to the stage."""
+        with self._lock:
+            self.timings[stage] += seconds
+            self.calls[stage] += 1
+
+    def count(self, counter: str, value: int = 1):
+        with self._lock:
+            self.counters[counter] += value
+
+    def merge(self, other: "Profiler"):
+        """Add the timings and counters of another profiler, e.g. from a worker."""
+        with self._lock:
+            for stage, seconds in other.timings.items():
+                self.timings[stage] += seconds
+            self.calls.update(other.calls)
+            self.counters.update(other.counters)
+
+    def to_dict(self) -> Dict[str, Any]:
+        total_seconds = time.perf_counter() - self.start_time
+        with self._lock:
+            result: Dict[str, Any] = {
+                "total_seconds": total_seconds,
+                "stages": {
+                    stage: {
+                        "seconds": seconds,
+                        "calls": self.calls[stage],
+                        "share": seconds / total_seconds if total_seconds else 0.0,
+                    }
+                    for stage, seconds in sorted(self.timings.items(), key=lambda item: -item[1])
+                },
+                "counters": dict(self.counters),
+            }
+        if "lines" in self.counters and total_seconds:
+            result["lines_per_sec"] = self.counters["lines"] / total_seconds
+        return result
+
+    def __getstate__(self):
+        # The lock cannot be pickled, e.g. when returned from a worker process.
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def log_summary(self):
+        summary = self.to_dict()
+        log.info(f"Total time: {summary['total_seconds']:.2f}s")
+        for stage, stage_summary in summary["stages"].items():
+            log.info(f"{stage}: {stage_summary['seconds']:.2f}s ({stage_summary['share']:.1%})")
+        for counter, value in summary["counters"].items():
+            log.info(f"{counter}: {value}")
+
+    def write(self, profile_out: Optional[str]):
+        """Log the summary and write it as JSON to profile_out, if given."""
+        self.log_summary()
+        if profile_out:
+            with open(profile_out, "w") as f:
+                json.dump(self.to_dict(), f, indent=2)
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from array import array
+from typing import Iterable, List
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# The datasets a sentence is found in are stored as a bitmask.
+MAX_DATASETS = 64
+PUNCTUATION_SYMBOLS = (
+    "'ʼ∞¥≈€∂‧Ω÷‐℉†℃‛″£™∙§«»@¯^!½³²˜−{$¼¹≠}º‗®‑#¡´&`|·≥―′¿<≤~?±" '…\\>”_+][°–=*"‘%„“;:-•(),…–`-—!’?;“”:.,'
+)
+DIGIT_PROG = re.compile(r"\d+")
+PUNCT_PROG = re.compile("[" + re.escape(PUNCTUATION_SYMBOLS) + "]")
+SPACE_PROG = re.compile(r"\s+")
+
+
+def preprocess_sentence(sentence: str) -> str:
+    """Clean sentence.
+
+    Lowercase.
+    Replace multiple digits with 0.
+    Remove all punctuation.
+    Remove all multiple spaces.
+    """
+    sentence = sentence.lower()
+    sentence = DIGIT_PROG.sub("0", sentence)
+    sentence = PUNCT_PROG.sub("", sentence)
+    sentence = SPACE_PROG.sub("", sentence)
+    return sentence
+
+
+def sentence_hash(sentence: str) -> int:
+    """A 64 bit hash of the cleaned sentence."""
+    digest = hashlib.blake2b(preprocess_sentence(sentence).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class ProvenanceIndex:
+    """Which datasets contain a sentence, after cleaning with preprocess_sentence.
+    Stored as sorted 64 bit sentence hashes and a bitmask of datasets for each hash, which are memory-mapped on load.
+    Hash collisions are possible but negligible at 64 bits for corpora of this size."""
+
+    def __init__(self, datasets: List[str], hashes: np.ndarray, masks: np.ndarray) -> None:
+        self.datasets = datasets
+        self.hashes = hashes
+        self.masks = masks
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    @staticmethod
+    def build(datasets: List[str], files: List[Iterable[str]]) -> "ProvenanceIndex":
+        """Build the index from the lines of each dataset."""
+        if len(datasets) > MAX_DATASETS:
+            raise ValueError(f"At most {MAX_DATASETS} datasets are supported, got {len(datasets)}")
+        all_hashes = []
+        all_masks = []
+        for dataset_idx, (dataset, lines) in enumerate(zip(datasets, files)):
+            # An array of machine integers, since a set of Python ints would use several times the memory.
+            dataset_hashes = np.unique(np.array(array("Q", (sentence_hash(line) for line in lines)), dtype=np.uint64))
+            log.info(f"{dataset}: {len(dataset_hashes)} unique sentences")
+            all_hashes.append(dataset_hashes)
+            all_masks.append(np.full(len(dataset_hashes), 1 << dataset_idx, dtype=np.uint64))
+        hashes = np.concatenate(all_hashes) if all_hashes else np.zeros(0, dtype=np.uint64)
+        masks = np.concatenate(all_masks) if all_masks else np.zeros(0, dtype=np.uint64)
+        order = np.argsort(hashes, kind="stable")
+        hashes = hashes[order]
+        masks = masks[order]
+        if len(hashes) == 0:
+            return ProvenanceIndex(datasets, hashes, masks)
+        # Combine the masks of equal hashes
+        starts = np.flatnonzero(np.r_[True, hashes[1:] != hashes[:-1]])
+        return ProvenanceIndex(datasets, hashes[starts], np.bitwise_or.reduceat(masks, starts))
+
+    def save(self, index_dir: str):
+        os.makedirs(index_dir, exist_ok=True)
+        np.save(os.path.join(index_dir, "hashes.npy"), self.hashes)
+        np.save(os.path.join(index_dir, "masks.npy"), self.masks)
+        with open(os.path.join(index_dir, "datasets.json"), "w") as f:
+            json.dump(self.datasets, f)
+
+    @staticmethod
+    def load(index_dir: str) -> "ProvenanceIndex":
+        """Load an index saved with save. The arrays are memory-mapped, so this is instant."""
+        with open(os.path.join(index_dir, "datasets.json")) as f:
+            datasets = json.load(f)
+        return ProvenanceIndex(
+            datasets,
+            np.load(os.path.join(index_dir, "hashes.npy"), mmap_mode="r"),
+            np.load(os.path.join(index_dir, "masks.npy"), mmap_mode="r"),
+        )
+
+    def lookup_masks(self, sentences: List[str]) -> np.ndarray:
+        """Return the bitmask of datasets containing each sentence, 0 if none."""
+        hashes = np.array([sentence_hash(sentence) for sentence in sentences], dtype=np.uint64)
+        if len(self.hashes) == 0:
+            return np.zeros(len(sentences), dtype=np.uint64)
+        idxs = np.minimum(np.searchsorted(self.hashes, hashes), len(self.hashes) - 1)
+        return np.where(self.hashes[idxs] == hashes, self.masks[idxs], np.uint64(0))
+
+    def to_datasets(self, mask: int) -> List[str]:
+        return [dataset for dataset_idx, dataset in enumerate(self.datasets) if int(mask) >> dataset_idx & 1]
+
+    def lookup(self, sentence: str) -> List[str]:
+        """Return the datasets containing the sentence."""
+        return self.to_datasets(self.lookup_masks([sentence])[0])
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import logging
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from .ner import NER_MODEL, NERTag
+from .parallel import chunked
+
+log = logging.getLogger(__name__)
+
+# Requests and responses are single lines of JSON, so a large request is a long line.
+STREAM_LIMIT = 2**26
+# Number of requests of a connection which are tagged or waiting to be answered at once.
+MAX_PENDING_REQUESTS = 64
+UNIX_PREFIX = "unix:"
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """Parse "host:port" to (host, port) or "unix:/path/to/socket" to (path, -1)."""
+    if address.startswith(UNIX_PREFIX):
+        return address[len(UNIX_PREFIX) :], -1
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+class BatchingTagger:
+    """Coalesce concurrent tagging requests into batches for a NER model.
+    A batch is sent to the model when it has max_batch_lines lines or when the oldest request
+    has waited max_wait_ms. The model is only called from a single thread."""
+
+    def __init__(self, model: NER_MODEL, max_batch_lines: int, max_wait_ms: float) -> None:
+        self.model = model
+        self.max_batch_lines = max_batch_lines
+        self.max_wait = max_wait_ms / 1000
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.queue: "asyncio.Queue[Tuple[List[str], asyncio.Future]]" = asyncio.Queue()
+
+    async def tag(self, lines: List[str]) -> List[List[NERTag]]:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((lines, future))
+        return await future
+
+    async def _next_batch(self) -> List[Tuple[List[str], asyncio.Future]]:
+        batch = [await self.queue.get()]
+        num_lines = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while num_lines < self.max_batch_lines:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(request)
+            num_lines += len(request[0])
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            all_lines = [line for lines, _ in batch for line in lines]
+            log.debug(f"Tagging a batch of {len(all_lines)} lines from {len(batch)} requests")
+            try:
+                all_tags = await loop.run_in_executor(self.executor, self.model, all_lines)
+            except Exception as e:
+                log.exception("Tagging failed")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            start_idx = 0
+            for lines, future in batch:
+                future.set_result(all_tags[start_idx : start_idx + len(lines)])
+                start_idx += len(lines)
+
+
+async def _answer(taggers: Dict[str, BatchingTagger], line: bytes) -> dict:
+    try:
+        request = json.loads(line)
+        lang = request["lang"]
+        if lang not in taggers:
+            raise ValueError(f"No NER model loaded for lang={lang}. Loaded: {', '.join(taggers)}")
+        tags = await taggers[lang].tag(request["lines"])
+        return {"tags": [[str(tag) for tag in line_tags] for line_tags in tags]}
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+async def _handle_connection(taggers: Dict[str, BatchingTagger], reader, writer):
+    """Answer requests {"lang": ..., "lines": [...]} with {"tags": [[NERTag, ...], ...]} until the client closes.
+    Requests are tagged concurrently, so that the requests a client sends ahead share batches, and answered in order."""
+    answers: "asyncio.Queue[Optional[asyncio.Task]]" = asyncio.Queue(maxsize=MAX_PENDING_REQUESTS)
+
+    async def write_answers():
+        while (answer := await answers.get()) is not None:
+            writer.write(json.dumps(await answer).encode("utf-8") + b"\n")
+            await writer.drain()
+
+    answer_writer = asyncio.create_task(write_answers())
+    try:
+        while line := await reader.readline():
+            await answers.put(asyncio.create_task(_answer(taggers, line)))
+        await answers.put(None)
+        await answer_writer
+    finally:
+        answer_writer.cancel()
+        writer.close()
+
+
+async def serve(models: Dict[str, NER_MODEL], address: str, max_batch_lines: int, max_wait_ms: float):
+    """Serve the NER models on the address until cancelled."""
+    taggers = {lang: BatchingTagger(model, max_batch_lines, max_wait_ms) for lang, model in models.items()}
+    workers = [asyncio.create_task(tagger.run()) for tagger in taggers.values()]
+
+    async def handle(reader, writer):
+        await _handle_connection(taggers, reader, writer)
+
+    host, port = parse_address(address)
+    if port == -1:
+        server = await asyncio.start_unix_server(handle, path=host, limit=STREAM_LIMIT)
+    else:
+        server = await asyncio.start_server(handle, host=host, port=port, limit=STREAM_LIMIT)
+    log.info(f"Serving NER for {', '.join(models)} on {address}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for worker in workers:
+            worker.cancel()
+
+
+class NERClient:
+    """A NER model which sends the lines to a server started with `mt serve-ner`.
+    The requests of a call are sent from a separate thread while the responses are read, so that the server
+    can batch them together instead of waiting for a round trip per request."""
+
+    def __init__(self, address: str, lang: str, request_lines: int = 1024) -> None:
+        self.lang = lang
+        self.request_lines = request_lines
+        host, port = parse_address(address)
+        if port == -1:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(host)
+        else:
+            self.socket = socket.create_connection((host, port))
+        self.reader = self.socket.makefile("rb")
+        self.writer = self.socket.makefile("wb")
+
+    def _send(self, requests: List[List[str]]):
+        try:
+            for lines in requests:
+                self.writer.write(json.dumps({"lang": self.lang, "lines": lines}).encode("utf-8") + b"\n")
+            self.writer.flush()
+        except OSError:
+            # The reader reports the closed connection.
+            log.debug("Sending to the NER server failed", exc_info=True)
+
+    def __call__(self, batch) -> List[List[NERTag]]:
+        requests = list(chunked((line.strip() for line in batch), self.request_lines))
+        sender = threading.Thread(target=self._send, args=(requests,), daemon=True)
+        sender.start()
+        ner_tags: List[List[NERTag]] = []
+        try:
+            for _ in requests:
+                response_line = self.reader.readline()
+                if not response_line:
+                    raise ValueError("NER server closed the connection")
+                response = json.loads(response_line)
+                if "error" in response:
+                    raise ValueError(f"NER server failed: {response['error']}")
+                ner_tags.extend([NERTag.from_str(tag) for tag in line_tags] for line_tags in response["tags"])
+        except Exception:
+            # The remaining responses would be out of step with the next call, and the sender might be blocked.
+            self.socket.shutdown(socket.SHUT_RDWR)
+            raise
+        finally:
+            sender.join()
+        return ner_tags
+
+    def close(self):
+        self.reader.close()
+        self.writer.close()
+        self.socket.close()
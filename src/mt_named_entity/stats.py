@@ -0,0 +1,181 @@
+import logging
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, DefaultDict, Dict, List, Optional, Tuple
+
+from .filter import ALL_TAGS, ALLOWED_TAGS, TAG_MAPPER
+
+log = logging.getLogger(__name__)
+
+# A lightweight NERTag: (tag, start_idx, end_idx)
+TagTuple = Tuple[str, int, int]
+
+
+def parse_ner_line(line: str) -> List[TagTuple]:
+    """Parse a line of NERTags without creating NERTag objects."""
+    tags = []
+    for a_str in line.split():
+        tag, start_idx, end_idx = a_str.split(":")
+        tags.append((tag, int(start_idx), int(end_idx)))
+    return tags
+
+
+def normalize_tag(tag: str) -> str:
+    """Map a tag to the unified tag set, see filter.map_named_entity_types. Unknown tags are kept as they are."""
+    return tag if tag in ALL_TAGS else TAG_MAPPER.get(tag, tag)
+
+
+@dataclass
+class NERProfile:
+    """Statistics about the NERTags in a single .ner file. Profiles of shards can be merged."""
+
+    lines: int = 0
+    lines_without_entities: int = 0
+    tag_counts: Counter = field(default_factory=Counter)
+    # Number of entities in a line -> number of lines
+    entities_per_line: Counter = field(default_factory=Counter)
+    # Tag -> span length in characters -> number of entities
+    span_lengths: DefaultDict[str, Counter] = field(default_factory=lambda: defaultdict(Counter))
+
+    def update(self, tags: List[TagTuple]):
+        self.lines += 1
+        if not tags:
+            self.lines_without_entities += 1
+        self.entities_per_line[len(tags)] += 1
+        for tag, start_idx, end_idx in tags:
+            self.tag_counts[tag] += 1
+            self.span_lengths[tag][end_idx - start_idx] += 1
+
+    def merge(self, other: "NERProfile"):
+        self.lines += other.lines
+        self.lines_without_entities += other.lines_without_entities
+        self.tag_counts.update(other.tag_counts)
+        self.entities_per_line.update(other.entities_per_line)
+        for tag, lengths in other.span_lengths.items():
+            self.span_lengths[tag].update(lengths)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "lines": self.lines,
+            "lines_without_entities": self.lines_without_entities,
+            "tag_counts": dict(sorted(self.tag_counts.items())),
+            "entities_per_line": dict(sorted(self.entities_per_line.items())),
+            "span_lengths": {tag: dict(sorted(lengths.items())) for tag, lengths in sorted(self.span_lengths.items())},
+        }
+
+
+@dataclass
+class AgreementProfile:
+    """Agreement of the normalized tag counts of parallel .ner files, mirrors filter-text-by-ner."""
+
+    lines: int = 0
+    lines_both_with_entities: int = 0
+    # Lines in which all the normalized tag counts agree.
+    lines_same_tag_counts: int = 0
+    # Tag -> lines in which the tag is present on either side / present on both sides with the same count.
+    tag_lines_present: Counter = field(default_factory=Counter)
+    tag_lines_agree: Counter = field(default_factory=Counter)
+    # Lines and src NEs which filter-text-by-ner would write out.
+    lines_kept_by_filter: int = 0
+    entities_kept_by_filter: int = 0
+
+    def update(self, src_tags: List[TagTuple], tgt_tags: List[TagTuple]):
+        self.lines += 1
+        src_counts = Counter(normalize_tag(tag) for tag, _, _ in src_tags)
+        tgt_counts = Counter(normalize_tag(tag) for tag, _, _ in tgt_tags)
+        if src_counts == tgt_counts:
+            self.lines_same_tag_counts += 1
+        for tag in src_counts.keys() | tgt_counts.keys():
+            self.tag_lines_present[tag] += 1
+            if src_counts[tag] == tgt_counts[tag]:
+                self.tag_lines_agree[tag] += 1
+        if not src_tags or not tgt_tags:
+            return
+        self.lines_both_with_entities += 1
+        # Only allowed tags which are present on both sides the same number of times survive.
+        kept = sum(src_counts[tag] for tag in ALLOWED_TAGS if src_counts[tag] == tgt_counts[tag])
+        if kept:
+            self.lines_kept_by_filter += 1
+            self.entities_kept_by_filter += kept
+
+    def merge(self, other: "AgreementProfile"):
+        self.lines += other.lines
+        self.lines_both_with_entities += other.lines_both_with_entities
+        self.lines_same_tag_counts += other.lines_same_tag_counts
+        self.tag_lines_present.update(other.tag_lines_present)
+        self.tag_lines_agree.update(other.tag_lines_agree)
+        self.lines_kept_by_filter += other.lines_kept_by_filter
+        self.entities_kept_by_filter += other.entities_kept_by_filter
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "lines": self.lines,
+            "lines_both_with_entities": self.lines_both_with_entities,
+            "lines_same_tag_counts": self.lines_same_tag_counts,
+            "same_tag_counts_rate": self.lines_same_tag_counts / max(1, self.lines),
+            "tag_agreement_rate": {
+                tag: self.tag_lines_agree[tag] / self.tag_lines_present[tag] for tag in sorted(self.tag_lines_present)
+            },
+            "lines_kept_by_filter": self.lines_kept_by_filter,
+            "entities_kept_by_filter": self.entities_kept_by_filter,
+            "kept_by_filter_rate": self.lines_kept_by_filter / max(1, self.lines),
+        }
+
+
+@dataclass
+class CorpusProfile:
+    """The profiles of multiple .ner files, read in parallel, and the agreement of src/tgt pairs."""
+
+    files: List[NERProfile]
+    pairs: List[AgreementProfile]
+
+    @staticmethod
+    def empty(num_files: int, paired: bool) -> "CorpusProfile":
+        num_pairs = num_files // 2 if paired else 0
+        return CorpusProfile([NERProfile() for _ in range(num_files)], [AgreementProfile() for _ in range(num_pairs)])
+
+    def merge(self, other: "CorpusProfile"):
+        for profile, other_profile in zip(self.files, other.files):
+            profile.merge(other_profile)
+        for pair, other_pair in zip(self.pairs, other.pairs):
+            pair.merge(other_pair)
+
+    def to_dict(self, file_names: List[str]) -> Dict[str, Any]:
+        result: Dict[str, Any] = {
+            "files": {name: profile.to_dict() for name, profile in zip(file_names, self.files)},
+        }
+        if self.pairs:
+            result["pairs"] = [
+                {"src": file_names[2 * idx], "tgt": file_names[2 * idx + 1], **pair.to_dict()}
+                for idx, pair in enumerate(self.pairs)
+            ]
+        return result
+
+
+def profile_chunk(args: Tuple[List[Tuple[str, ...]], bool]) -> CorpusProfile:
+    """Profile a chunk of aligned lines. Each line tuple holds a line from every file."""
+    chunk, paired = args
+    profile: Optional[CorpusProfile] = None
+    for lines in chunk:
+        if profile is None:
+            profile = CorpusProfile.empty(len(lines), paired)
+        tags = [parse_ner_line(line) for line in lines]
+        for file_profile, file_tags in zip(profile.files, tags):
+            file_profile.update(file_tags)
+        for idx, pair in enumerate(profile.pairs):
+            pair.update(tags[2 * idx], tags[2 * idx + 1])
+    assert profile is not None, "Empty chunk"
+    return profile
+
+
+def count_entities_chunk(chunk: List[Tuple[str, str]], embedded: bool = False) -> Counter:
+    """Count the entity surface forms per normalized tag in a chunk of (original, ner) lines.
+    The keys are "entity\\ttag", or the entity embedded in its tag, "<tag>entity</tag>", as `mt embed` writes it."""
+    counts: Counter = Counter()
+    for original, ner_line in chunk:
+        sent = original.strip()
+        for tag, start_idx, end_idx in parse_ner_line(ner_line):
+            tag = normalize_tag(tag)
+            entity = sent[start_idx:end_idx]
+            counts[f"<{tag}>{entity}</{tag}>" if embedded else f"{entity}\t{tag}"] += 1
+    return counts
@@ -0,0 +1,76 @@
+import logging
+import os
+import time
+from typing import List, Optional, Set
+
+import torch
+
+from .ner import NER_MODEL
+
+log = logging.getLogger(__name__)
+
+
+def parse_cpu_list(cpu_list: str) -> Set[int]:
+    """Parse a list of CPUs as accepted by taskset, e.g. "0-3,8,10-11"."""
+    cpus: Set[int] = set()
+    for part in cpu_list.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def available_cpus() -> int:
+    """The number of CPUs the process may run on, which is less than os.cpu_count() when pinned, e.g. by taskset."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def configure_threads(
+    intra_op_threads: Optional[int], inter_op_threads: Optional[int], cpu_affinity: Optional[str]
+) -> None:
+    """Pin the process to CPUs and set the number of torch threads. Unset options keep the torch defaults.
+    Must be called before the model is loaded, since the inter-op threads cannot be changed once used."""
+    if cpu_affinity:
+        cpus = parse_cpu_list(cpu_affinity)
+        os.sched_setaffinity(0, cpus)
+        log.info(f"Pinned to {len(cpus)} CPUs: {cpu_affinity}")
+        if intra_op_threads is None:
+            # Otherwise torch would use a thread per core of the machine.
+            intra_op_threads = len(cpus)
+    if intra_op_threads is not None:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads is not None:
+        torch.set_num_interop_threads(inter_op_threads)
+    log.info(f"Using {torch.get_num_threads()} intra-op and {torch.get_num_interop_threads()} inter-op threads")
+
+
+def candidate_thread_counts(max_threads: int) -> List[int]:
+    """Powers of two up to max_threads, and max_threads."""
+    candidates = []
+    threads = 1
+    while threads < max_threads:
+        candidates.append(threads)
+        threads *= 2
+    candidates.append(max_threads)
+    return candidates
+
+
+def autotune_intra_op_threads(model: NER_MODEL, sample: List[str], candidates: List[int]) -> int:
+    """Tag the sample with each number of intra-op threads, set and return the fastest."""
+    # The first call may be slower due to lazy initialization.
+    model(sample)
+    seconds_per_candidate = {}
+    for threads in candidates:
+        torch.set_num_threads(threads)
+        start_time = time.perf_counter()
+        model(sample)
+        seconds_per_candidate[threads] = time.perf_counter() - start_time
+        log.info(f"{threads} threads: {len(sample) / seconds_per_candidate[threads]:.1f} lines/s")
+    best_threads = min(seconds_per_candidate, key=lambda threads: seconds_per_candidate[threads])
+    torch.set_num_threads(best_threads)
+    log.info(f"Using the fastest, {best_threads} intra-op threads")
+    return best_threads
@@ -0,0 +1,84 @@
+import logging
+import multiprocessing
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from tokenizer.tokenizer import split_into_sentences
+
+from .parallel import chunked
+from .profiling import Profiler
+
+log = logging.getLogger(__name__)
+
+
+def tokenize_is(lines: List[str]) -> Tuple[List[List[str]], float]:
+    """Split the lines into sentences and the sentences into tokens, as the IceBERT NER model expects them.
+    Return the tokens of each line and the time it took, since this may run in a worker process."""
+    start_time = time.perf_counter()
+    all_tokens = []
+    for line in lines:
+        tokens = []
+        for a_line in split_into_sentences(line):
+            tokens.extend(a_line.split(" "))
+        all_tokens.append(tokens)
+    return all_tokens, time.perf_counter() - start_time
+
+
+class IcelandicTokenizer:
+    """Tokenize lines in batches, optionally in worker processes so that tokenization overlaps with inference
+    on the previous batch. The tokens of the cache_lines most recently tokenized lines are cached."""
+
+    def __init__(
+        self, workers: int = 0, cache_lines: int = 100_000, batch_lines: int = 1000, profiler: Optional[Profiler] = None
+    ) -> None:
+        self.cache_lines = cache_lines
+        self.batch_lines = batch_lines
+        self.cache: "OrderedDict[str, List[str]]" = OrderedDict()
+        self.profiler = profiler if profiler else Profiler()
+        # Spawned, since forking a process which has started torch threads can deadlock.
+        self.pool = multiprocessing.get_context("spawn").Pool(workers) if workers > 0 else None
+
+    def tokenize_batches(self, lines: List[str]) -> Iterator[Tuple[List[str], List[List[str]]]]:
+        """Yield the lines in batches of batch_lines, with their tokens. Without workers there is nothing to overlap
+        with, so all lines are a single batch."""
+        batches = list(chunked(lines, self.batch_lines if self.pool is not None else max(len(lines), 1)))
+        # The cached tokens are looked up in advance, since the cache changes as the batches are tokenized.
+        tokens: Dict[str, List[str]] = {}
+        for line in dict.fromkeys(lines):
+            if line in self.cache:
+                self.cache.move_to_end(line)
+                tokens[line] = self.cache[line]
+        self.profiler.count("tokenization_cache_hits", sum(line in tokens for line in lines))
+        # Each distinct line is tokenized once, in the first batch it is in.
+        uncached_per_batch: List[List[str]] = []
+        dispatched = set(tokens)
+        for batch in batches:
+            uncached = [line for line in dict.fromkeys(batch) if line not in dispatched]
+            dispatched.update(uncached)
+            uncached_per_batch.append(uncached)
+        self.profiler.count("lines_tokenized", len(dispatched) - len(tokens))
+        if self.pool is not None:
+            results = self.pool.imap(tokenize_is, uncached_per_batch)
+        else:
+            results = map(tokenize_is, uncached_per_batch)
+        for batch, uncached in zip(batches, uncached_per_batch):
+            # Only the time spent waiting for the tokens, which the workers should hide.
+            with self.profiler.timer("tokenization"):
+                batch_tokens, seconds = next(results)
+            self.profiler.add_time("tokenization_cpu", seconds)
+            tokens.update(zip(uncached, batch_tokens))
+            self._cache(uncached, batch_tokens)
+            yield batch, [tokens[line] for line in batch]
+
+    def _cache(self, lines: List[str], all_tokens: List[List[str]]):
+        if self.cache_lines <= 0:
+            return
+        self.cache.update(zip(lines, all_tokens))
+        while len(self.cache) > self.cache_lines:
+            self.cache.popitem(last=False)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
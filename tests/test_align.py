@@ -0,0 +1,34 @@
+from mt_named_entity.align import align_markers_by_jaro_winkler, align_markers_by_tag, align_markers_greedily
+from mt_named_entity.ner import NERMarker
+
+EN = [NERMarker("P", 0, 4, "Anna"), NERMarker("L", 10, 19, "Reykjavik"), NERMarker("P", 20, 24, "Jón")]
+IS = [NERMarker("L", 0, 9, "Reykjavík"), NERMarker("P", 10, 14, "Jóni"), NERMarker("P", 20, 24, "Önnu")]
+
+
+def pairs(alignments):
+    return {(alignment.marker_1.named_entity, alignment.marker_2.named_entity) for alignment in alignments}
+
+
+def test_align_by_tag_only_aligns_same_tags():
+    alignments = align_markers_by_tag(EN, IS + [NERMarker("O", 30, 33, "RÚV")])
+    assert pairs(alignments) == {("Anna", "Önnu"), ("Reykjavik", "Reykjavík"), ("Jón", "Jóni")}
+    assert align_markers_by_tag(EN, []) == []
+
+
+def test_align_by_tag_greedy_above_threshold():
+    assert pairs(align_markers_by_tag(EN, IS, greedy_above=1)) == pairs(align_markers_by_tag(EN, IS))
+
+
+def test_greedy_pairs_as_many_as_optimal():
+    markers_1 = [NERMarker("P", 0, 4, "Anna"), NERMarker("P", 5, 8, "Jón"), NERMarker("P", 9, 13, "Páll")]
+    markers_2 = [NERMarker("P", 0, 3, "Jón"), NERMarker("P", 4, 8, "Pétur")]
+    greedy = align_markers_greedily(markers_1, markers_2)
+    assert len(greedy) == len(align_markers_by_jaro_winkler(markers_1, markers_2)) == 2
+    assert ("Jón", "Jón") in pairs(greedy)
+    assert ("Páll", "Pétur") in pairs(greedy)
+
+
+def test_greedy_compares_names_with_different_first_letters():
+    markers_1 = [NERMarker("P", 0, 8, "Kristján"), NERMarker("P", 9, 13, "Anna")]
+    markers_2 = [NERMarker("P", 0, 4, "Önnu"), NERMarker("P", 5, 14, "Christian")]
+    assert pairs(align_markers_greedily(markers_1, markers_2)) == {("Kristján", "Christian"), ("Anna", "Önnu")}
@@ -0,0 +1,81 @@
+import random
+from functools import partial
+
+from mt_named_entity.augment import (
+    augment_chunk,
+    augment_chunk_in_worker,
+    augment_pair,
+    person_markers,
+    replace_persons,
+    set_worker_table,
+)
+from mt_named_entity.declensions import DeclensionTable, detect_case
+from mt_named_entity.parallel import map_chunks
+
+NAMES = [("kk", "Páll"), ("kk", "Jón Pétursson"), ("kvk", "Anna"), ("kvk", "Sigríður Einarsdóttir")]
+
+
+def test_detect_case():
+    assert detect_case("Pétri") == ("ÞGF", {"kk"})
+    assert detect_case("Einars Jónssonar") == ("EF", {"kk"})
+    # Önnu can be ÞF, ÞGF or EF
+    assert detect_case("Önnu")[0] is None
+
+
+def test_declension_table(tmp_path):
+    table = DeclensionTable.build(NAMES)
+    assert ("Páll", "Pál", "Páli", "Páls") in table.names["kk"]
+    assert ("Anna", "Önnu", "Önnu", "Önnu") in table.names["kvk"]
+    table.save(str(tmp_path / "declensions.tsv"))
+    assert DeclensionTable.load(str(tmp_path / "declensions.tsv")).names == table.names
+
+
+def test_replace_persons():
+    assert replace_persons("<P>A</P> og <P>B</P>", ["C", "D"]) == "<P>C</P> og <P>D</P>"
+
+
+def test_augment_pair():
+    table = DeclensionTable.build(NAMES)
+    src = "Anna fékk gjöf frá <P>Pétri</P> ."
+    tgt = "Anna got a gift from <P>Pétur</P> ."
+    variants, reason = augment_pair(src, tgt, table, 3, random.Random(1))
+    assert reason == "augmented"
+    assert len(variants) == 3
+    for src_variant, tgt_variant in variants:
+        assert src_variant in {f"Anna fékk gjöf frá <P>{name}</P> ." for name in ("Páli", "Jóni Péturssyni", "Jóni")}
+        assert tgt_variant in {f"Anna got a gift from <P>{name}</P> ." for name in ("Páll", "Jón Pétursson", "Jón")}
+    assert augment_pair("<P>Alexei</P>", "<P>Alexei</P>", table, 1, random.Random(1)) == ([], "unknown_case")
+
+
+def test_augment_chunk_is_deterministic():
+    table = DeclensionTable.build(NAMES)
+    pairs = [(idx, ("<P>Pétri</P> .\n", "<P>Peter</P> .\n")) for idx in range(10)]
+    assert augment_chunk(pairs, table, 2, seed=3) == augment_chunk(pairs, table, 2, seed=3)
+    variants, reasons = augment_chunk(pairs[5:], table, 2, seed=3)
+    assert variants == augment_chunk(pairs, table, 2, seed=3)[0][10:]
+    assert reasons == {"augmented": 5}
+
+
+def test_augment_chunk_in_worker_uses_the_worker_table():
+    table = DeclensionTable.build(NAMES)
+    pairs = [(idx, ("<P>Pétri</P> .\n", "<P>Peter</P> .\n")) for idx in range(10)]
+    chunks = [pairs[:4], pairs[4:]]
+    augment = partial(augment_chunk_in_worker, num_variants=2, seed=3)
+    results = list(map_chunks(augment, chunks, 2, initializer=set_worker_table, initargs=(table,)))
+    assert results == [augment_chunk(chunk, table, 2, seed=3) for chunk in chunks]
+
+
+def test_augment_pair_aligns_persons():
+    table = DeclensionTable.build(NAMES)
+    src = "Bók <P>Páls</P> og <P>Sigríðar</P> ."
+    tgt = "<P>Sigridur</P>'s and <P>Paul</P>'s book ."
+    variants, reason = augment_pair(src, tgt, table, 5, random.Random(1))
+    assert reason == "augmented"
+    for src_variant, tgt_variant in variants:
+        src_names = [person.named_entity for person in person_markers(src_variant)]
+        tgt_names = [person.named_entity for person in person_markers(tgt_variant)]
+        # The name replacing Sigríðar comes first in tgt.
+        assert (src_names[1], tgt_names[0]) in {
+            (forms[3], forms[0]) for gender_names in table.names.values() for forms in gender_names
+        }
+    assert augment_pair("<P>Pétri</P> .", "<P>Mary</P> .", table, 1, random.Random(1)) == ([], "persons_not_aligned")
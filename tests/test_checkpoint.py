@@ -0,0 +1,49 @@
+import pytest
+
+from mt_named_entity.checkpoint import prepare_resume, read_checkpoint
+from mt_named_entity.ner import NERTag, tag_files
+
+LINES = [f"line {idx}\n" for idx in range(5)]
+
+
+class FailingModel:
+    def __init__(self, fail_after: int) -> None:
+        self.fail_after = fail_after
+
+    def __call__(self, lines):
+        self.fail_after -= len(lines)
+        if self.fail_after < 0:
+            raise RuntimeError("Preempted")
+        return [[NERTag("P", 0, len(line.strip()))] for line in lines]
+
+
+def test_resume_after_failure(tmp_path):
+    output_path = str(tmp_path / "out.ner")
+    with open(output_path, "w") as output:
+        with pytest.raises(RuntimeError):
+            tag_files(FailingModel(fail_after=2), [LINES], [output], chunk_size=2, checkpoint_paths=[output_path])
+        # A partial write after the checkpoint
+        output.write("P:0:6\nP:0")
+    assert read_checkpoint(output_path) == 2
+    skip_lines = [prepare_resume(output_path)]
+    assert skip_lines == [2]
+    with open(output_path, "a") as output:
+        throughputs = tag_files(FailingModel(fail_after=10), [LINES], [output], 2, skip_lines=skip_lines)
+    assert throughputs[0][0] == 3
+    with open(output_path) as f:
+        assert f.read() == "P:0:6\n" * len(LINES)
+
+
+def test_resume_without_checkpoint_keeps_complete_lines(tmp_path):
+    output_path = tmp_path / "out.ner"
+    output_path.write_text("P:0:1\n\nP:0")
+    assert prepare_resume(str(output_path)) == 2
+    assert output_path.read_text() == "P:0:1\n\n"
+
+
+def test_resume_fails_on_short_output(tmp_path):
+    output_path = tmp_path / "out.ner"
+    output_path.write_text("P:0:1\n")
+    (tmp_path / "out.ner.checkpoint").write_text('{"lines": 3}')
+    with pytest.raises(ValueError):
+        prepare_resume(str(output_path))
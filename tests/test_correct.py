@@ -31,7 +31,7 @@ def test_was_correct_hildur():
 
 def test_corrector_hluti():
     corrector = Corrector(should_correct_to_nomintaive_case=True)
-    result, _ = corrector._inflect_using_bin("Hólm")
+    result, _ = corrector.inflect_using_bin("Hólm")
     assert result == "Hólm"
 
 def test_foreign_name():
@@ -0,0 +1,16 @@
+from collections import Counter
+
+from mt_named_entity.counting import ExternalCounter
+
+
+def test_external_counter_spills_and_merges(tmp_path):
+    counter = ExternalCounter(max_keys=2, tmp_dir=str(tmp_path))
+    expected = Counter()
+    for chunk in (["a\tP", "b\tP", "c\tL"], ["a\tP", "d\tO"], ["c\tL", "a\tP", "e\tP"]):
+        counter.update(Counter(chunk))
+        expected.update(chunk)
+    assert len(counter.runs) > 0
+    assert list(counter.items()) == sorted(expected.items())
+    assert list(counter.most_common()) == sorted(expected.items(), key=lambda item: (-item[1], item[0]))
+    counter.close()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,34 @@
+from mt_named_entity.correct import CorrectionResult, Corrector
+from mt_named_entity.declensions import DeclensionTable
+
+NAMES = [("kk", "Jón Pétursson"), ("kvk", "Anna"), ("kvk", "Sigríður Einarsdóttir")]
+
+
+def test_first_names_are_declined():
+    table = DeclensionTable.build(NAMES)
+    assert ("Jón", "Jón", "Jóni", "Jóns") in table.names["kk"]
+    assert ("Sigríður", "Sigríði", "Sigríði", "Sigríðar") in table.names["kvk"]
+    assert len(table) == 5
+
+
+def test_lookups():
+    table = DeclensionTable.build(NAMES)
+    assert table.nominative("Jóni Péturssyni") == "Jón Pétursson"
+    assert table.nominative("Önnu") == "Anna"
+    assert table.nominative("Anna") == "Anna"
+    assert table.nominative("Alexei") is None
+    assert table.decline("Sigríður Einarsdóttir", "EF") == "Sigríðar Einarsdóttur"
+    assert table.decline("Jóni", "EF") is None
+
+
+def test_ambiguous_forms():
+    table = DeclensionTable({"kk": [("A", "B", "B", "C")], "kvk": [("D", "B", "B", "B")]})
+    assert table.nominative("B") is None
+    assert table.nominative("C") == "A"
+
+
+def test_corrector_uses_table():
+    table = DeclensionTable({"kk": [("Xón", "Xón", "Xóni", "Xóns")]})
+    corrector = Corrector(should_correct_to_nomintaive_case=True, declensions=table)
+    assert corrector.inflect_to_nominative_case("Xóni") == ("Xón", CorrectionResult.CORRECTED)
+    assert corrector.inflect_to_nominative_case("Xón") == ("Xón", CorrectionResult.WAS_CORRECT)
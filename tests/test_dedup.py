@@ -0,0 +1,88 @@
+import io
+
+import pytest
+
+from mt_named_entity.dedup import DeduplicatingTagger, ReusingTagger, read_previous_run
+from mt_named_entity.ner import NERTag, tag_files
+
+
+class RecordingModel:
+    def __init__(self) -> None:
+        self.lines = []
+
+    def __call__(self, lines):
+        self.lines.extend(lines)
+        return [[NERTag("P", 0, len(line))] for line in lines]
+
+
+def test_dedup_within_batch_and_across_batches():
+    model = RecordingModel()
+    tagger = DeduplicatingTagger(model, max_cache_lines=10)
+    assert tagger(["a", "bb", "a"]) == [[NERTag("P", 0, 1)], [NERTag("P", 0, 2)], [NERTag("P", 0, 1)]]
+    assert tagger(["bb", "ccc"]) == [[NERTag("P", 0, 2)], [NERTag("P", 0, 3)]]
+    assert model.lines == ["a", "bb", "ccc"]
+    assert tagger.profiler.counters["dedup_lines"] == 5
+    assert tagger.profiler.counters["dedup_lines_tagged"] == 3
+
+
+class StagedModel:
+    def __init__(self) -> None:
+        self.lines = []
+
+    def stages(self):
+        return [self.strip, lambda lines: [[NERTag("P", 0, len(line))] for line in lines]]
+
+    def strip(self, lines):
+        self.lines.extend(lines)
+        return [line.strip() for line in lines]
+
+
+def test_dedup_pipelines_the_model_stages():
+    model = StagedModel()
+    tagger = DeduplicatingTagger(model, max_cache_lines=10)
+    assert len(tagger.stages()) == 4
+    outputs = [io.StringIO()]
+    tag_files(tagger, [["a\n", "bb\n", "bb\n", "a\n", "a\n"]], outputs, chunk_size=3, queue_size=1)
+    assert outputs[0].getvalue() == "P:0:1\nP:0:2\nP:0:2\nP:0:1\nP:0:1\n"
+    # The second chunk may be selected before "a" is cached.
+    assert set(model.lines) == {"a\n", "bb\n"}
+
+
+def test_dedup_cache_is_bounded():
+    model = RecordingModel()
+    tagger = DeduplicatingTagger(model, max_cache_lines=1)
+    tagger(["a"])
+    tagger(["b"])
+    tagger(["a", "b"])
+    assert model.lines == ["a", "b", "a"]
+    assert len(tagger.cache) == 1
+
+
+def test_reuse_previous_run(tmp_path):
+    (tmp_path / "old.txt").write_text("a\nbb\n")
+    (tmp_path / "old.ner").write_text("P:0:1\n\n")
+    previous = read_previous_run([str(tmp_path / "old.txt")], [str(tmp_path / "old.ner")])
+    model = RecordingModel()
+    tagger = ReusingTagger(model, previous)
+    assert tagger(["bb\n", "ccc\n", "a"]) == [[], [NERTag("P", 0, 4)], [NERTag("P", 0, 1)]]
+    assert model.lines == ["ccc\n"]
+    assert tagger.profiler.counters["reuse_lines_tagged"] == 1
+
+
+def test_reuse_pipelines_the_model_stages(tmp_path):
+    (tmp_path / "old.is").write_text("a\nbb\n")
+    (tmp_path / "old.is.ner").write_text("P:0:9\n\n")
+    model = StagedModel()
+    tagger = ReusingTagger(model, read_previous_run([str(tmp_path / "old.is")], [str(tmp_path / "old.is.ner")]))
+    assert len(tagger.stages()) == 4
+    outputs = [io.StringIO()]
+    tag_files(tagger, [["a\n", "ccc\n", "bb\n", "dddd\n"]], outputs, chunk_size=2, queue_size=1)
+    assert outputs[0].getvalue() == "P:0:9\nP:0:3\n\nP:0:4\n"
+    assert model.lines == ["ccc\n", "dddd\n"]
+
+
+def test_previous_run_must_be_aligned(tmp_path):
+    (tmp_path / "old.txt").write_text("a\nbb\n")
+    (tmp_path / "old.ner").write_text("P:0:1\n")
+    with pytest.raises(ValueError):
+        read_previous_run([str(tmp_path / "old.txt")], [str(tmp_path / "old.ner")])
@@ -0,0 +1,29 @@
+from mt_named_entity.dictionary import CorrectionsIndex
+
+
+def test_find_longest_whole_words():
+    index = CorrectionsIndex.build({"Anna": "A", "Anna María": "AM", "Alexei": "Alexei Sergov"})
+    text = "Anna María og Annað hitti Alexei."
+    matches = [(text[start:end], index.values[key_idx]) for start, end, key_idx in index.find_longest(text)]
+    assert matches == [("Anna María", "AM"), ("Alexei", "Alexei Sergov")]
+
+
+def test_save_and_load(tmp_path):
+    index = CorrectionsIndex.build({"Alexei": "Alexei Sergov", "Pétri": "Pétur"})
+    path = str(tmp_path / "corrections.npz")
+    index.save(path)
+    loaded = CorrectionsIndex.load(path)
+    assert loaded.get("Alexei") == "Alexei Sergov"
+    assert loaded.get("Pétri") == "Pétur"
+    assert loaded.get("Alex") is None
+    assert loaded.find_all("Pétri og Alexei") == index.find_all("Pétri og Alexei")
+
+
+def test_save_and_load_empty(tmp_path):
+    path = str(tmp_path / "corrections.npz")
+    CorrectionsIndex.build({}).save(path)
+    loaded = CorrectionsIndex.load(path)
+    assert len(loaded) == 0
+    assert loaded.values == []
+    assert loaded.get("Alexei") is None
+    assert loaded.find_all("Alexei") == []
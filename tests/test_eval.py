@@ -0,0 +1,65 @@
+import pytest
+from click.testing import CliRunner
+
+from mt_named_entity.cli import cli
+from mt_named_entity.eval import (
+    ALIGNED,
+    MATCHES,
+    UPPER_BOUND,
+    SpanCounts,
+    empty_metrics,
+    evaluate_chunk,
+    merge_metrics,
+    span_counts_chunk,
+)
+
+
+def test_span_counts():
+    gold = ["Person:0:6 Location:10:16", "", "Person:0:4 Person:10:14"]
+    pred = ["Person:0:6 Location:10:15", "Person:2:4", "Person:0:4 Person:10:14"]
+    counts = span_counts_chunk((list(zip(gold, pred)), False))
+    assert counts.true_positives == {"Person": 3}
+    assert counts.false_positives == {"Location": 1, "Person": 1}
+    assert counts.false_negatives == {"Location": 1}
+    assert counts.precision_recall_f1(["Person"]) == (0.75, 1.0, 2 * 0.75 / 1.75)
+    assert counts.precision_recall_f1(["Location"]) == (0.0, 0.0, 0.0)
+    metrics = counts.to_dict()
+    assert metrics["all"]["gold"] == 4
+    assert metrics["all"]["pred"] == 5
+    assert list(metrics) == ["all", "Location", "Person"]
+
+
+def test_span_counts_merge_and_normalize():
+    lines = [("Person:0:6", "PER:0:6"), ("Location:3:9", "LOC:3:9"), ("Organization:1:2", "PER:1:2")]
+    counts = SpanCounts()
+    counts.merge(span_counts_chunk((lines[:1], True)))
+    counts.merge(span_counts_chunk((lines[1:], True)))
+    assert counts == span_counts_chunk((lines, True))
+    assert counts.true_positives == {"P": 1, "L": 1}
+    assert span_counts_chunk((lines, False)).true_positives == {}
+
+
+def test_evaluate_chunks_merge():
+    ref_text = ["Anna fékk gjöf frá Pétri .", "Jón fór til Reykjavíkur .", "Ekkert hér ."]
+    sys_text = ["Anna got a gift from Pétur .", "Jon went to Reykjavik .", "Nothing here ."]
+    ref_ner = ["P:0:4 P:19:24", "P:0:3 L:12:23", ""]
+    sys_ner = ["P:0:4 P:21:26", "P:0:3 L:12:21", ""]
+    chunk = list(zip(ref_text, sys_text, ref_ner, sys_ner))
+    metrics, profiler = evaluate_chunk((chunk, "all", "raw"))
+    assert profiler.counters["lines"] == 3
+    assert metrics["all"][ALIGNED] == 4
+    assert metrics["P"][UPPER_BOUND] == 3
+    assert metrics["P"][MATCHES] == 1
+    merged = empty_metrics()
+    for idx in range(len(chunk)):
+        merge_metrics(merged, evaluate_chunk((chunk[idx : idx + 1], "all", "raw"))[0])
+    for group in merged:
+        assert merged[group] == pytest.approx(metrics[group])
+
+
+def test_ner_f1_command(tmp_path):
+    (tmp_path / "gold.ner").write_text("P:0:4 L:5:9\n")
+    (tmp_path / "pred.ner").write_text("P:0:4\n")
+    result = CliRunner().invoke(cli, ["ner-f1", str(tmp_path / "gold.ner"), str(tmp_path / "pred.ner")])
+    assert result.exit_code == 0, result.output
+    assert "all\t1.0000\t0.5000\t0.6667\t2\t1" in result.output
@@ -0,0 +1,35 @@
+from mt_named_entity.cli import read_ner_tags
+from mt_named_entity.filter import (
+    filter_ner_pair,
+    filter_ner_pairs,
+    filter_same_number_of_entity_types,
+    filter_same_number_of_entity_types_batch,
+    to_columnar,
+)
+
+
+def test_batch_filter_same_as_per_line():
+    src = read_ner_tags(["P:0:6 P:15:31", "P:0:4 L:5:9 O:10:12", "", "O:0:3 O:4:6", "L:0:4"])
+    tgt = read_ner_tags(["P:0:6 P:26:42", "P:0:4 L:5:9 L:10:12", "P:0:2", "O:0:3", ""])
+    src_mask, tgt_mask = filter_same_number_of_entity_types_batch(*to_columnar(src), *to_columnar(tgt))
+    src_offsets = to_columnar(src)[1]
+    tgt_offsets = to_columnar(tgt)[1]
+    for idx, (src_line, tgt_line) in enumerate(zip(src, tgt)):
+        expected_src, expected_tgt = filter_same_number_of_entity_types(src_line, tgt_line)
+        line_src_mask = src_mask[src_offsets[idx] : src_offsets[idx + 1]]
+        line_tgt_mask = tgt_mask[tgt_offsets[idx] : tgt_offsets[idx + 1]]
+        assert [tag for tag, keep in zip(src_line, line_src_mask) if keep] == expected_src
+        assert [tag for tag, keep in zip(tgt_line, line_tgt_mask) if keep] == expected_tgt
+
+
+def test_batch_filter_empty():
+    src_mask, tgt_mask = filter_same_number_of_entity_types_batch(*to_columnar([]), *to_columnar([]))
+    assert len(src_mask) == 0
+    assert len(tgt_mask) == 0
+
+
+def test_filter_ner_pairs_same_as_per_pair():
+    src = read_ner_tags(["Person:0:6 Person:15:31", "PER:0:4 LOC:5:9 MISC:10:12", "", "ORG:0:3 ORG:4:6", "Date:0:4"])
+    tgt = read_ner_tags(["PER:0:6 PERSON:26:42", "Person:0:4 Location:5:9", "PER:0:2", "GPE:0:3", "DATE:0:4"])
+    src_NEs, tgt_NEs = filter_ner_pairs(src, tgt)
+    assert list(zip(src_NEs, tgt_NEs)) == [filter_ner_pair(src_line, tgt_line) for src_line, tgt_line in zip(src, tgt)]
@@ -0,0 +1,50 @@
+from mt_named_entity.ner import NERTag
+from mt_named_entity.ner_parallel import ParallelTagger
+
+
+class CountingModel:
+    """Tags capitalized words as persons, with the given tag."""
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.lines = []
+
+    def __call__(self, lines):
+        self.lines.extend(lines)
+        all_ner_tags = []
+        for line in lines:
+            ner_tags = []
+            start_idx = 0
+            for word in line.strip().split(" "):
+                if word[:1].isupper():
+                    ner_tags.append(NERTag(self.tag, start_idx, start_idx + len(word)))
+                start_idx += len(word) + 1
+            all_ner_tags.append(ner_tags)
+        return all_ner_tags
+
+
+PAIRS = [
+    ("Jón came\n", "Jón kom\n"),
+    ("nobody came\n", "Enginn kom\n"),
+    ("Jón and Anna\n", "Jón kom\n"),
+    ("Anna left\n", "Anna fór\n"),
+]
+
+
+def test_tag_and_filter_keeps_matching_pairs():
+    tagger = ParallelTagger(CountingModel("PER"), CountingModel("Person"))
+    kept = list(tagger.tag_and_filter(PAIRS, chunk_size=3))
+    assert kept == [
+        ("Jón came\n", "Jón kom\n", [NERTag("P", 0, 3)], [NERTag("P", 0, 3)]),
+        ("Anna left\n", "Anna fór\n", [NERTag("P", 0, 4)], [NERTag("P", 0, 4)]),
+    ]
+    # The tgt side of the line without src entities is not tagged
+    assert "Enginn kom\n" not in tagger.tgt_model.lines
+    assert tagger.profiler.counters["tgt_lines_skipped"] == 1
+
+
+def test_skipping_and_pipelining_do_not_change_the_result():
+    expected = list(ParallelTagger(CountingModel("PER"), CountingModel("Person")).tag_and_filter(PAIRS, 2))
+    tagger = ParallelTagger(CountingModel("PER"), CountingModel("Person"), skip_unmatched=False)
+    assert list(tagger.tag_and_filter(PAIRS, 2, queue_size=1)) == expected
+    assert len(tagger.tgt_model.lines) == len(PAIRS)
@@ -0,0 +1,33 @@
+from mt_named_entity.align import align_markers_by_jaro_winkler
+from mt_named_entity.ner import NERMarker
+from mt_named_entity.normalization import entity_key, fold, with_keys
+
+
+def test_fold():
+    assert fold("Jónsson") == "jonsson"
+    assert fold("Þórður Ægisson") == "thordur aegisson"
+    assert fold("ÖNNU") == "onnu"
+
+
+def test_entity_key():
+    assert entity_key("Jónssonar", "raw") == "Jónssonar"
+    assert entity_key("Einars Jónssonar", "lemmatized") == "einar jonsson"
+    # Unknown words are only folded
+    assert entity_key("Merkel", "lemmatized") == "merkel"
+
+
+def test_keys_do_not_change_equality():
+    marker = NERMarker("P", 0, 9, "Jónssonar")
+    keyed = with_keys([marker], "lemmatized")[0]
+    assert keyed.key == "jonsson"
+    assert keyed == marker
+    assert str(keyed) == "P:0:9:Jónssonar"
+    assert with_keys([marker], "raw")[0].key == ""
+
+
+def test_alignment_uses_keys():
+    en = [NERMarker("P", 0, 7, "Jonsson")]
+    is_ = [NERMarker("P", 0, 9, "Jónssonar")]
+    raw_distance = align_markers_by_jaro_winkler(en, is_)[0].distance
+    keyed = align_markers_by_jaro_winkler(with_keys(en, "lemmatized"), with_keys(is_, "lemmatized"))
+    assert keyed[0].distance == 0.0 < raw_distance
@@ -0,0 +1,29 @@
+import pytest
+
+from mt_named_entity.parallel import chunked, pipeline
+
+
+def test_chunked():
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_pipeline_is_ordered():
+    assert list(pipeline(range(100), [lambda x: x + 1, lambda x: x * 2], queue_size=2)) == [
+        (x + 1) * 2 for x in range(100)
+    ]
+
+
+def test_pipeline_raises_stage_errors():
+    def fail_on_three(x):
+        if x == 3:
+            raise ValueError("three")
+        return x
+
+    with pytest.raises(ValueError):
+        list(pipeline(range(10), [fail_on_three], queue_size=1))
+
+
+def test_pipeline_stops_early():
+    results = pipeline(range(1000), [lambda x: x], queue_size=1)
+    assert next(results) == 0
+    results.close()
@@ -0,0 +1,46 @@
+from mt_named_entity import pos
+from mt_named_entity.ner import NERMarker, NERTag
+from mt_named_entity.pos import IS_POS, aligned_persons, ifd_case, tags_at_entities
+
+
+class FakePOS:
+    """Tags each token with its length, and records the batches."""
+
+    def __init__(self, device, batch_size, show_progress, max_input_words_split):
+        self.batches = []
+
+    def infer(self, batch):
+        self.batches.append(batch)
+        return [[str(len(token)) for token in line.split(" ")] for line in batch]
+
+
+def test_ifd_case():
+    assert ifd_case("nkeþ-s") == "ÞGF"
+    assert ifd_case("nven-s") == "NF"
+    assert ifd_case("e") is None
+    assert ifd_case("sfg3en") is None
+
+
+def test_tags_at_entities():
+    line = "Ég hitti Jón Jónsson í gær"
+    tokens = line.split(" ")
+    pos_tags = ["fp1en", "sfg1eþ", "nkeo-s", "nkeo-s", "af", "nkeo"]
+    entities = [NERTag("P", 9, 20)]
+    assert tags_at_entities(line, tokens, pos_tags, entities) == ["nkeo-s"]
+
+
+def test_aligned_persons():
+    is_markers = [NERMarker("P", 9, 20, "Jóni Jónssyni"), NERMarker("L", 0, 4, "Ísafjörður")]
+    en_markers = [NERMarker("P", 0, 11, "Jón Jónsson"), NERMarker("L", 20, 25, "Paris")]
+    assert aligned_persons(is_markers, en_markers, max_distance=0.5) == [is_markers[0]]
+    assert aligned_persons(is_markers, en_markers, max_distance=0.0) == []
+
+
+def test_only_lines_with_entities_are_tagged_in_length_buckets(monkeypatch):
+    monkeypatch.setattr(pos, "POS", FakePOS)
+    model = IS_POS("cpu", batch_size=2)
+    lines = ["a bb ccc dddd", "Jón kom", "x", "Anna og Jón komu heim", "Páll"]
+    entities = [[NERTag("P", 0, 1)], [NERTag("P", 0, 3)], [], [NERTag("P", 8, 11)], [NERTag("P", 0, 4)]]
+    assert model.tag_entities(lines, entities) == [["1"], ["3"], [], ["3"], ["4"]]
+    # The shortest lines are batched together
+    assert model.model.batches == [["Páll", "Jón kom"], ["a bb ccc dddd", "Anna og Jón komu heim"]]
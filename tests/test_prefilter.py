@@ -0,0 +1,69 @@
+import io
+
+import pytest
+
+from mt_named_entity.ner import NERTag, tag_files
+from mt_named_entity.prefilter import DEFAULT_RULES, PrefilteringTagger, has_no_capitalized_after_first, parse_rules
+
+
+class RecordingModel:
+    def __init__(self) -> None:
+        self.lines = []
+
+    def __call__(self, lines):
+        self.lines.extend(lines)
+        return [[NERTag("P", 0, 3)] if line.startswith("Jón") else [] for line in lines]
+
+
+def test_parse_rules():
+    assert parse_rules("empty, lowercase") == ["empty", "lowercase"]
+    with pytest.raises(ValueError):
+        parse_rules("empty,unknown")
+
+
+def test_no_capitalized_after_first():
+    assert has_no_capitalized_after_first("Jón kom heim")
+    assert not has_no_capitalized_after_first("Þá kom Jón heim")
+
+
+def test_skipped_lines_are_not_tagged():
+    model = RecordingModel()
+    tagger = PrefilteringTagger(model, DEFAULT_RULES)
+    lines = ["\n", "12 , 3\n", "the end\n", "Jón kom\n"]
+    assert tagger(lines) == [[], [], [], [NERTag("P", 0, 3)]]
+    assert model.lines == ["Jón kom\n"]
+    assert tagger.profiler.counters["prefilter_skipped_empty"] == 1
+    assert tagger.profiler.counters["prefilter_skipped_no_letters"] == 1
+    assert tagger.profiler.counters["prefilter_skipped_lowercase"] == 1
+
+
+def test_check_lines():
+    model = RecordingModel()
+    tagger = PrefilteringTagger(model, ["no_capitalized_after_first"], check_lines=2)
+    # The checked lines are skipped all the same.
+    assert tagger(["Jón kom\n", "Hann kom\n", "Jón fór\n"]) == [[], [], []]
+    assert model.lines == ["Jón kom\n", "Hann kom\n"]
+    assert tagger.profiler.counters["prefilter_checked"] == 2
+    assert tagger.profiler.counters["prefilter_checked_with_entities"] == 1
+
+
+class StagedModel:
+    def __init__(self) -> None:
+        self.lines = []
+
+    def stages(self):
+        return [self.strip, lambda lines: [[NERTag("P", 0, 3)] if line.startswith("Jón") else [] for line in lines]]
+
+    def strip(self, lines):
+        self.lines.extend(lines)
+        return [line.strip() for line in lines]
+
+
+def test_prefilter_pipelines_the_model_stages():
+    model = StagedModel()
+    tagger = PrefilteringTagger(model, DEFAULT_RULES)
+    assert len(tagger.stages()) == 4
+    outputs = [io.StringIO()]
+    tag_files(tagger, [["Jón kom\n", "\n", "the end\n", "", "Jón fór\n"]], outputs, chunk_size=2, queue_size=1)
+    assert outputs[0].getvalue() == "P:0:3\n\n\n\nP:0:3\n"
+    assert model.lines == ["Jón kom\n", "Jón fór\n"]
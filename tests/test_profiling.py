@@ -0,0 +1,28 @@
+import pickle
+
+from mt_named_entity.profiling import Profiler
+
+
+def test_timer_and_counters():
+    profiler = Profiler()
+    with profiler.timer("inference"):
+        pass
+    with profiler.timer("inference"):
+        pass
+    profiler.count("lines", 10)
+    summary = profiler.to_dict()
+    assert summary["stages"]["inference"]["calls"] == 2
+    assert summary["counters"] == {"lines": 10}
+    assert summary["lines_per_sec"] > 0
+
+
+def test_merge_pickled():
+    profiler = Profiler()
+    worker = Profiler()
+    with worker.timer("alignment"):
+        pass
+    worker.count("lines", 3)
+    profiler.merge(pickle.loads(pickle.dumps(worker)))
+    profiler.count("lines", 2)
+    assert profiler.calls["alignment"] == 1
+    assert profiler.counters["lines"] == 5
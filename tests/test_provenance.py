@@ -0,0 +1,20 @@
+from mt_named_entity.provenance import ProvenanceIndex, preprocess_sentence
+
+
+def test_preprocess_sentence():
+    assert preprocess_sentence("Hæ, Jón!  Árið 2021.\n") == "hæjónárið0"
+
+
+def test_provenance_index(tmp_path):
+    index = ProvenanceIndex.build(
+        ["bible", "ees", "tatoeba"],
+        [["Í upphafi skapaði Guð.\n", "Hæ Jón!\n"], ["Hæ, Jón.\n"], ["Halló\n", "Halló\n"]],
+    )
+    assert len(index) == 3
+    index.save(str(tmp_path))
+    index = ProvenanceIndex.load(str(tmp_path))
+    assert index.lookup("hæ jón") == ["bible", "ees"]
+    assert index.lookup("Í upphafi skapaði Guð") == ["bible"]
+    assert index.lookup("Halló!") == ["tatoeba"]
+    assert index.lookup("Ekki til") == []
+    assert list(index.lookup_masks(["Halló", "Ekki til"])) == [4, 0]
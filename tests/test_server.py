@@ -0,0 +1,65 @@
+import asyncio
+import os
+import threading
+import time
+
+from mt_named_entity.ner import NERTag
+from mt_named_entity.server import BatchingTagger, NERClient, parse_address, serve
+
+
+class RecordingModel:
+    def __init__(self) -> None:
+        self.batches = []
+
+    def __call__(self, lines):
+        self.batches.append(list(lines))
+        return [[NERTag("P", 0, len(line))] for line in lines]
+
+
+def test_parse_address():
+    assert parse_address("localhost:8765") == ("localhost", 8765)
+    assert parse_address("unix:/tmp/ner.sock") == ("/tmp/ner.sock", -1)
+
+
+def test_batching_tagger_coalesces_requests():
+    model = RecordingModel()
+
+    async def run():
+        tagger = BatchingTagger(model, max_batch_lines=100, max_wait_ms=50)
+        worker = asyncio.create_task(tagger.run())
+        results = await asyncio.gather(tagger.tag(["a"]), tagger.tag(["bb", "ccc"]), tagger.tag(["dddd"]))
+        worker.cancel()
+        return results
+
+    results = asyncio.run(run())
+    assert model.batches == [["a", "bb", "ccc", "dddd"]]
+    assert results == [[[NERTag("P", 0, 1)]], [[NERTag("P", 0, 2)], [NERTag("P", 0, 3)]], [[NERTag("P", 0, 4)]]]
+
+
+def test_client_round_trip(tmp_path):
+    socket_path = str(tmp_path / "ner.sock")
+    model = RecordingModel()
+    thread = threading.Thread(
+        target=lambda: asyncio.run(serve({"is": model}, f"unix:{socket_path}", 100, 1)), daemon=True
+    )
+    thread.start()
+    while not os.path.exists(socket_path):
+        time.sleep(0.01)
+    client = NERClient(f"unix:{socket_path}", "is", request_lines=2)
+    assert client(["Jón\n", "Anna", ""]) == [[NERTag("P", 0, 3)], [NERTag("P", 0, 4)], [NERTag("P", 0, 0)]]
+    client.close()
+
+
+def test_client_requests_share_batches(tmp_path):
+    socket_path = str(tmp_path / "ner.sock")
+    model = RecordingModel()
+    thread = threading.Thread(
+        target=lambda: asyncio.run(serve({"is": model}, f"unix:{socket_path}", 100, 200)), daemon=True
+    )
+    thread.start()
+    while not os.path.exists(socket_path):
+        time.sleep(0.01)
+    client = NERClient(f"unix:{socket_path}", "is", request_lines=1)
+    assert client(["a", "bb", "ccc"]) == [[NERTag("P", 0, 1)], [NERTag("P", 0, 2)], [NERTag("P", 0, 3)]]
+    client.close()
+    assert model.batches == [["a", "bb", "ccc"]]
@@ -0,0 +1,46 @@
+from click.testing import CliRunner
+
+from mt_named_entity.cli import cli
+from mt_named_entity.stats import CorpusProfile, count_entities_chunk, profile_chunk
+
+
+def test_profile_chunks_merge():
+    is_ner = [
+        "Person:0:6 Person:26:42",
+        "Person:0:4 Person:19:25 Person:27:32 Person:36:40",
+        "",
+        "Organization:9:20 Person:27:30",
+    ]
+    en_ner = ["PER:0:6 PER:15:31", "PER:0:4 PER:21:26 PER:28:32 PER:37:43", "", "MISC:9:20 PER:29:32"]
+    lines = list(zip(is_ner, en_ner))
+    profile = CorpusProfile.empty(2, paired=True)
+    profile.merge(profile_chunk((lines[:2], True)))
+    profile.merge(profile_chunk((lines[2:], True)))
+    assert profile.to_dict(["is", "en"]) == profile_chunk((lines, True)).to_dict(["is", "en"])
+    is_profile = profile.files[0]
+    assert is_profile.lines == 4
+    assert is_profile.lines_without_entities == 1
+    assert is_profile.tag_counts == {"Person": 7, "Organization": 1}
+    pair = profile.pairs[0]
+    assert pair.lines_same_tag_counts == 3
+    # The last line keeps its single P after filtering, like filter-text-by-ner.
+    assert pair.lines_kept_by_filter == 3
+    assert pair.entities_kept_by_filter == 7
+
+
+def test_count_entities_chunk_keeps_unknown_tags():
+    chunk = [("Jón fór til Reykjavíkur\n", "Person:0:3 Location:12:23"), ("Jón og NATO\n", "PER:0:3 X:7:11")]
+    assert count_entities_chunk(chunk) == {"Jón\tP": 2, "Reykjavíkur\tL": 1, "NATO\tX": 1}
+    assert count_entities_chunk(chunk, embedded=True) == {"<P>Jón</P>": 2, "<L>Reykjavíkur</L>": 1, "<X>NATO</X>": 1}
+
+
+def test_unique_ner_entities_formats(tmp_path):
+    (tmp_path / "text").write_text("Jón fór til Reykjavíkur\nJón og Anna\n")
+    (tmp_path / "ner").write_text("Person:0:3 Location:12:23\nPerson:0:3 Person:7:11\n")
+    args = ["unique-ner-entities", str(tmp_path / "text"), str(tmp_path / "ner"), str(tmp_path / "out")]
+    result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "out").read_text() == "<L>Reykjavíkur</L>\n<P>Anna</P>\n<P>Jón</P>\n"
+    result = CliRunner().invoke(cli, args + ["--counts"])
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "out").read_text() == "Jón\tP\t2\nAnna\tP\t1\nReykjavíkur\tL\t1\n"
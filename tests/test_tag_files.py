@@ -0,0 +1,90 @@
+import io
+
+from click.testing import CliRunner
+
+from mt_named_entity import cli
+from mt_named_entity.cli import LazyFile
+from mt_named_entity.ner import NERTag, close_model, tag_files
+
+
+def test_tag_files_shares_chunks_between_files():
+    batches = []
+
+    def model(lines):
+        batches.append(len(lines))
+        return [[NERTag("P", 0, len(line.strip()))] if line.strip() else [] for line in lines]
+
+    outputs = [io.StringIO(), io.StringIO()]
+    throughputs = tag_files(model, [["Jón\n", "\n"], ["Anna\n"]], outputs, chunk_size=2)
+    assert batches == [2, 1]
+    assert outputs[0].getvalue() == "P:0:3\n\n"
+    assert outputs[1].getvalue() == "P:0:4\n"
+    assert [num_lines for num_lines, _ in throughputs] == [2, 1]
+
+
+class StagedModel:
+    def stages(self):
+        return [
+            lambda lines: [line.strip() for line in lines],
+            lambda lines: [[NERTag("P", 0, len(line))] for line in lines],
+        ]
+
+
+def test_tag_files_pipelined_keeps_order():
+    inputs = [[f"{'x' * idx}\n" for idx in range(50)], ["a\n", "bb\n"]]
+    sequential = [io.StringIO(), io.StringIO()]
+    pipelined = [io.StringIO(), io.StringIO()]
+    tag_files(StagedModel(), inputs, sequential, chunk_size=3)
+    throughputs = tag_files(StagedModel(), inputs, pipelined, chunk_size=3, queue_size=1)
+    assert [output.getvalue() for output in pipelined] == [output.getvalue() for output in sequential]
+    assert [num_lines for num_lines, _ in throughputs] == [50, 2]
+
+
+def test_close_model():
+    closed = []
+
+    class ClosableModel:
+        def close(self):
+            closed.append(True)
+
+    close_model(ClosableModel())
+    close_model(lambda lines: [[] for _ in lines])
+    assert closed == [True]
+
+
+def test_ner_closes_model_on_error(tmp_path, monkeypatch):
+    closed = []
+
+    class FailingModel:
+        def __call__(self, lines):
+            raise RuntimeError("inference failed")
+
+        def close(self):
+            closed.append(True)
+
+    monkeypatch.setattr(cli, "load_ner_model", lambda *args, **kwargs: FailingModel())
+    (tmp_path / "inp").write_text("Jón\n")
+    result = CliRunner().invoke(cli.cli, ["ner", str(tmp_path / "inp"), str(tmp_path / "out"), "--queue_size", "0"])
+    assert isinstance(result.exception, RuntimeError)
+    assert closed == [True]
+
+
+def test_tag_files_closes_each_file_when_done(tmp_path):
+    paths = [str(tmp_path / f"{idx}.ner") for idx in range(3)]
+    outputs = [LazyFile(path, "w") for path in paths]
+    done = []
+
+    def file_done(file_idx):
+        # At most the done file and the file being written are open.
+        assert sum(not output.closed for output in outputs) <= 2
+        outputs[file_idx].close()
+        done.append(file_idx)
+
+    def model(lines):
+        return [[NERTag("P", 0, len(line.strip()))] for line in lines]
+
+    tag_files(
+        model, [["Jón\n"], [], ["Anna\n", "Ari\n"]], outputs, chunk_size=1, checkpoint_paths=paths, file_done=file_done
+    )
+    assert done == [0, 1, 2]
+    assert [open(path).read() for path in paths] == ["P:0:3\n", "", "P:0:4\nP:0:3\n"]
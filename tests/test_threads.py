@@ -0,0 +1,18 @@
+import os
+
+from mt_named_entity.threads import available_cpus, candidate_thread_counts, parse_cpu_list
+
+
+def test_parse_cpu_list():
+    assert parse_cpu_list("0-3,8,10-11") == {0, 1, 2, 3, 8, 10, 11}
+    assert parse_cpu_list("5") == {5}
+
+
+def test_candidate_thread_counts():
+    assert candidate_thread_counts(1) == [1]
+    assert candidate_thread_counts(8) == [1, 2, 4, 8]
+    assert candidate_thread_counts(12) == [1, 2, 4, 8, 12]
+
+
+def test_available_cpus():
+    assert 1 <= available_cpus() <= (os.cpu_count() or 1)
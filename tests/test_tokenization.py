@@ -0,0 +1,25 @@
+from mt_named_entity.tokenization import IcelandicTokenizer
+
+LINES = ["Guðrún fór í heimsókn til Einars Jónssonar.", "Ha?", "Ha?", ""]
+
+
+def tokenize(tokenizer, lines):
+    return [tokens for _, batch_tokens in tokenizer.tokenize_batches(lines) for tokens in batch_tokens]
+
+
+def test_tokenization_cache():
+    tokenizer = IcelandicTokenizer(workers=0, cache_lines=10)
+    tokens = tokenize(tokenizer, LINES)
+    assert tokens[1] == tokens[2]
+    assert tokenize(tokenizer, LINES) == tokens
+    assert tokenizer.profiler.counters["tokenization_cache_hits"] == len(LINES)
+    assert tokenizer.profiler.counters["lines_tokenized"] == 3
+
+
+def test_tokenization_workers_match():
+    tokenizer = IcelandicTokenizer(workers=1, cache_lines=0, batch_lines=1)
+    assert tokenize(tokenizer, LINES) == tokenize(IcelandicTokenizer(workers=0), LINES)
+    assert len(list(tokenizer.tokenize_batches(LINES))) == len(LINES)
+    # The line repeated in the next batch is tokenized once per call.
+    assert tokenizer.profiler.counters["lines_tokenized"] == 2 * 3
+    tokenizer.close()